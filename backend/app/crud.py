@@ -1,19 +1,60 @@
 
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, bindparam, or_, case, delete, func, insert, select, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, timedelta, date
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import os
+import uuid
 import app.models as models
 import app.schemas as schemas
-from passlib.context import CryptContext
+from app.utils.seat_allocator import build_free_runs, ranked_blocks, seat_is_free
+from app.utils.seat_layout import SeatLayout, default_layout_rows, layout_json, seat_layouts
+from app.utils.tracing import trace_functions
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PAYMENT_BATCH_CHUNK_SIZE = int(os.getenv("PAYMENT_BATCH_CHUNK_SIZE", "1000"))
+BOOKING_PENDING_TIMEOUT_MINUTES = int(os.getenv("BOOKING_PENDING_TIMEOUT_MINUTES", "15"))
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "1000"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "100"))  # shows per archive transaction
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "500"))  # shows recounted per transaction
+BEST_AVAILABLE_ATTEMPTS = 3  # re-reads of the seat map before giving up
+BEST_AVAILABLE_BLOCKS_PER_SCAN = 5  # blocks tried against one read of the seat map
+
+_pwd_context = None
+
+def password_context():
+    """bcrypt context, built on first use so importing crud does not load passlib"""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
+
+# Outbox events, written in the same transaction as the state change they describe
+def new_transaction_id(db: Session) -> str:
+    """Sessions of a shard prefix their transaction ids, so gateway callbacks can be routed"""
+    return db.info.get("transaction_prefix", "") + str(uuid.uuid4())
+
+def outbox_event(aggregate: str, aggregate_id, event_type: str, payload: dict, show_id: Optional[int] = None) -> dict:
+    return {
+        "aggregate": aggregate,
+        "aggregate_id": str(aggregate_id),
+        "event_type": event_type,
+        "show_id": show_id,
+        "payload": json.dumps(payload, default=str),
+        "created_at": datetime.utcnow()
+    }
+
+def add_outbox_events(db: Session, events: List[dict]):
+    if events:
+        db.execute(insert(models.OutboxEvent), events)
 
 # Movie CRUD
 def get_movies(db: Session, skip: int = 0, limit: int = 100):
@@ -33,8 +74,23 @@ def create_movie(db: Session, movie: schemas.MovieCreate):
 def get_theatres_by_city(db: Session, city: str):
     return db.query(models.Theatre).filter(models.Theatre.city == city).all()
 
+def get_theatre(db: Session, theatre_id: int):
+    return db.query(models.Theatre).filter(models.Theatre.id == theatre_id).first()
+
+def get_or_create_layout(db: Session, rows: List[dict]) -> models.TheatreLayout:
+    """Theatres with the same seat plan share one layout row"""
+    rows_json = layout_json(rows)
+    layout = db.query(models.TheatreLayout).filter(models.TheatreLayout.rows == rows_json).first()
+    if layout is None:
+        layout = models.TheatreLayout(rows=rows_json, seat_count=sum(len(row["seats"]) for row in rows))
+        db.add(layout)
+        db.flush()
+    return layout
+
 def create_theatre(db: Session, theatre: schemas.TheatreCreate):
-    db_theatre = models.Theatre(**theatre.dict())
+    rows = [row.dict() for row in theatre.layout] if theatre.layout else default_layout_rows(theatre.total_seats)
+    layout = get_or_create_layout(db, rows)
+    db_theatre = models.Theatre(**theatre.dict(exclude={"layout", "total_seats"}), total_seats=layout.seat_count, layout_id=layout.id)
     db.add(db_theatre)
     db.commit()
     db.refresh(db_theatre)
@@ -52,51 +108,155 @@ def get_shows_by_movie(db: Session, movie_id: int, city: Optional[str] = None, s
     
     return query.all()
 
+def get_theatre_schedule_rows(db: Session, theatre_id: int, from_date: date, to_date: date):
+    """A theatre's shows between two dates (inclusive) with their movie and seat counters, in one query"""
+    return (
+        db.query(
+            models.Show.show_date, models.Show.id, models.Show.show_time, models.Show.price,
+            models.Show.available_count, models.Show.held_count, models.TheatreLayout.seat_count,
+            models.Movie.id, models.Movie.title, models.Movie.duration, models.Movie.rating, models.Movie.poster_url
+        )
+        .join(models.Movie, models.Movie.id == models.Show.movie_id)
+        .outerjoin(models.TheatreLayout, models.TheatreLayout.id == models.Show.layout_id)
+        .filter(models.Show.theatre_id == theatre_id, models.Show.show_date.between(from_date, to_date))
+        .order_by(models.Show.show_date, models.Movie.title, models.Movie.id, models.Show.show_time)
+        .all()
+    )
+
 def get_show(db: Session, show_id: int):
     return db.query(models.Show).filter(models.Show.id == show_id).first()
 
 def create_show(db: Session, show: schemas.ShowCreate):
-    db_show = models.Show(**show.dict())
+    # The show keeps the layout its theatre had when it was scheduled; no per-seat rows are created
+    layout_id = db.query(models.Theatre.layout_id).filter(models.Theatre.id == show.theatre_id).scalar()
+    layout = seat_layouts.get(db, layout_id)
+    db_show = models.Show(**show.dict(), layout_id=layout_id, available_count=layout.seat_count if layout else 0, held_count=0)
     db.add(db_show)
     db.commit()
     db.refresh(db_show)
-    
-    # Create seats for the show
-    theatre = db.query(models.Theatre).filter(models.Theatre.id == show.theatre_id).first()
-    if theatre:
-        for row in ['A', 'B', 'C', 'D', 'E']:
-            for seat_num in range(1, 21):  # 20 seats per row
-                seat = models.Seat(
-                    show_id=db_show.id,
-                    seat_number=str(seat_num),
-                    row=row
-                )
-                db.add(seat)
-        db.commit()
-    
     return db_show
 
 # Seat CRUD
-def get_seats_by_show(db: Session, show_id: int):
-    return db.query(models.Seat).filter(models.Seat.show_id == show_id).all()
+# A show's seats come from its layout; show_seats only has rows for held and sold seats
+def show_layout(db: Session, show_id: int) -> Optional[SeatLayout]:
+    layout_id = db.query(models.Show.layout_id).filter(models.Show.id == show_id).scalar()
+    return seat_layouts.get(db, layout_id)
 
-def lock_seats(db: Session, show_id: int, seat_ids: List[int], user_session: str) -> schemas.SeatLockResponse:
-    expires_at = datetime.utcnow() + timedelta(minutes=5)
-    
-    # Check if seats are available
-    seats = db.query(models.Seat).filter(
-        and_(
-            models.Seat.show_id == show_id,
-            models.Seat.id.in_(seat_ids),
-            models.Seat.is_booked == False,
-            or_(
-                models.Seat.is_locked == False,
-                models.Seat.locked_until < datetime.utcnow()
-            )
+def get_seat_states(db: Session, show_id: int):
+    """(seat_id, is_booked, locked_until, locked_by) of the show's held and sold seats"""
+    return db.query(
+        models.ShowSeat.seat_id, models.ShowSeat.is_booked, models.ShowSeat.locked_until, models.ShowSeat.locked_by
+    ).filter(models.ShowSeat.show_id == show_id).all()
+
+def get_seats_by_show(db: Session, show_id: int) -> List[schemas.Seat]:
+    """Seat map synthesized from the show's layout and its held/sold seat rows"""
+    layout = show_layout(db, show_id)
+    if layout is None:
+        return []
+    now = datetime.utcnow()
+    states = {state.seat_id: state for state in get_seat_states(db, show_id)}
+    seats = []
+    for seat in layout.seats:
+        state = states.get(seat.id)
+        is_booked = state is not None and state.is_booked
+        # An expired hold still has its row until release_expired_locks runs, but the seat is free
+        is_locked = state is not None and not is_booked and state.locked_until is not None and state.locked_until >= now
+        seats.append(schemas.Seat(
+            id=seat.id,
+            show_id=show_id,
+            row=seat.row,
+            seat_number=seat.seat_number,
+            category=seat.category,
+            is_booked=is_booked,
+            is_locked=is_locked,
+            locked_until=state.locked_until if is_locked else None
+        ))
+    return seats
+
+def adjust_seat_counts(db: Session, deltas: Dict[int, Tuple[int, int]]):
+    """Apply show_id -> (available, held) deltas to the shows' counters, in the caller's transaction"""
+    rows = [
+        {"target_id": show_id, "available_delta": available, "held_delta": held}
+        for show_id, (available, held) in sorted(deltas.items()) if available or held
+    ]
+    if rows:
+        # Relative updates, in show id order so transactions touching several shows lock them consistently
+        shows = models.Show.__table__
+        db.execute(
+            update(shows).where(shows.c.id == bindparam("target_id")).values(
+                available_count=shows.c.available_count + bindparam("available_delta"),
+                held_count=shows.c.held_count + bindparam("held_delta")
+            ),
+            rows
         )
-    ).all()
+
+def insert_ignoring_conflicts(db: Session, model, rows: List[dict]) -> int:
+    """Multi-row INSERT that skips rows whose key already exists; returns how many were inserted"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return db.execute(dialect_insert(model).values(rows).on_conflict_do_nothing()).rowcount
+
+def hold_seats(db: Session, show_id: int, seat_ids: List[int], user_session: str, now: datetime, expires_at: datetime) -> bool:
+    """Hold every seat or report failure (the caller rolls back); does not commit"""
+    # An expired hold is as good as a free seat: drop its row, then claim each seat by inserting one.
+    # The primary key makes the insert the arbiter, so two sessions can never both win a seat.
+    released = db.execute(
+        delete(models.ShowSeat).where(
+            models.ShowSeat.show_id == show_id,
+            models.ShowSeat.seat_id.in_(seat_ids),
+            models.ShowSeat.is_booked == False,
+            models.ShowSeat.locked_until < now
+        ),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+    inserted = insert_ignoring_conflicts(db, models.ShowSeat, [
+        {"show_id": show_id, "seat_id": seat_id, "is_booked": False, "locked_until": expires_at, "locked_by": user_session}
+        for seat_id in seat_ids
+    ])
+    if inserted != len(seat_ids):
+        return False
+    adjust_seat_counts(db, {show_id: (released - inserted, inserted - released)})
+    return True
+
+def book_seats(db: Session, show_id: int, seat_ids: List[int], user_session: Optional[str], now: datetime) -> bool:
+    """Mark every seat sold if each is free or held by user_session, or report failure; does not commit"""
+    held = [models.ShowSeat.locked_until < now]
+    if user_session:
+        held.append(models.ShowSeat.locked_by == user_session)
+    converted = db.execute(
+        update(models.ShowSeat)
+        .where(
+            models.ShowSeat.show_id == show_id,
+            models.ShowSeat.seat_id.in_(seat_ids),
+            models.ShowSeat.is_booked == False,
+            or_(*held)
+        )
+        .values(is_booked=True, locked_until=None, locked_by=None),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+    # Seats nobody held have no row yet; rows just converted above conflict and are skipped
+    inserted = insert_ignoring_conflicts(db, models.ShowSeat, [
+        {"show_id": show_id, "seat_id": seat_id, "is_booked": True, "locked_until": None, "locked_by": None}
+        for seat_id in seat_ids
+    ])
+    if converted + inserted != len(seat_ids):
+        return False
+    adjust_seat_counts(db, {show_id: (-inserted, -converted)})
+    return True
+
+def lock_seats(db: Session, show_id: int, seat_ids: List[int], user_session: str) -> schemas.SeatLockResponse:
+    now = datetime.utcnow()
+    expires_at = now + timedelta(minutes=5)
+    seat_ids = list(dict.fromkeys(seat_ids))
+    layout = show_layout(db, show_id)
     
-    if len(seats) != len(seat_ids):
+    if (
+        not seat_ids or layout is None or not layout.has_all(seat_ids)
+        or not hold_seats(db, show_id, seat_ids, user_session, now, expires_at)
+    ):
+        db.rollback()
         return schemas.SeatLockResponse(
             success=False,
             locked_seats=[],
@@ -104,35 +264,81 @@ def lock_seats(db: Session, show_id: int, seat_ids: List[int], user_session: str
             message="Some seats are not available"
         )
     
-    # Lock the seats
-    for seat in seats:
-        seat.is_locked = True
-        seat.locked_until = expires_at
-        seat.locked_by = user_session
-    
+    add_outbox_events(db, [outbox_event(
+        "seat", show_id, "seats_locked",
+        {"seat_ids": seat_ids, "locked_by": user_session, "expires_at": expires_at},
+        show_id=show_id
+    )])
     db.commit()
     
     return schemas.SeatLockResponse(
         success=True,
-        locked_seats=[seat.id for seat in seats],
+        locked_seats=seat_ids,
         expires_at=expires_at,
         message="Seats locked successfully"
     )
 
+def lock_best_available(db: Session, show_id: int, count: int, user_session: str) -> schemas.BestAvailableResponse:
+    """Find the best block of count adjacent free seats and lock it in one conditional UPDATE"""
+    for _ in range(BEST_AVAILABLE_ATTEMPTS):
+        now = datetime.utcnow()
+        expires_at = now + timedelta(minutes=5)
+        free_runs = build_free_runs(get_seats_by_show(db, show_id), seat_is_free(now))
+        
+        found_any = False
+        for tried, block in enumerate(ranked_blocks(free_runs, count)):
+            if tried >= BEST_AVAILABLE_BLOCKS_PER_SCAN:
+                break
+            found_any = True
+            seat_ids = [seat.id for seat in block]
+            if not hold_seats(db, show_id, seat_ids, user_session, now, expires_at):
+                # Someone took part of the block since we read it
+                db.rollback()
+                continue
+            
+            add_outbox_events(db, [outbox_event(
+                "seat", show_id, "seats_locked",
+                {"seat_ids": seat_ids, "locked_by": user_session, "expires_at": expires_at},
+                show_id=show_id
+            )])
+            db.commit()
+            return schemas.BestAvailableResponse(
+                success=True,
+                locked_seats=seat_ids,
+                expires_at=expires_at,
+                message="Seats locked successfully",
+                seats=[schemas.AllocatedSeat(id=seat.id, row=seat.row, seat_number=seat.seat_number) for seat in block]
+            )
+        
+        if not found_any:
+            break
+    
+    return schemas.BestAvailableResponse(
+        success=False,
+        locked_seats=[],
+        expires_at=datetime.utcnow() + timedelta(minutes=5),
+        message=f"No block of {count} adjacent seats is available"
+    )
+
 def release_expired_locks(db: Session):
     """Release seats that have expired locks"""
-    expired_seats = db.query(models.Seat).filter(
-        and_(
-            models.Seat.is_locked == True,
-            models.Seat.locked_until < datetime.utcnow()
-        )
+    # Conditional on the lock still being expired, so a seat re-locked meanwhile keeps its new lock
+    expired_seats = db.execute(
+        delete(models.ShowSeat)
+        .where(models.ShowSeat.is_booked == False, models.ShowSeat.locked_until < datetime.utcnow())
+        .returning(models.ShowSeat.seat_id, models.ShowSeat.show_id),
+        execution_options={"synchronize_session": False}
     ).all()
     
-    for seat in expired_seats:
-        seat.is_locked = False
-        seat.locked_until = None
-        seat.locked_by = None
+    by_show = {}
+    for seat_id, show_id in expired_seats:
+        by_show.setdefault(show_id, []).append(seat_id)
+    adjust_seat_counts(db, {show_id: (len(seat_ids), -len(seat_ids)) for show_id, seat_ids in by_show.items()})
     
+    add_outbox_events(db, [
+        outbox_event("seat", show_id, "seats_unlocked", {"seat_ids": seat_ids, "reason": "expired"}, show_id=show_id)
+        for show_id, seat_ids in by_show.items()
+    ])
     db.commit()
 
 # User CRUD
@@ -168,21 +374,22 @@ def create_booking(db: Session, booking_data: schemas.BookingCreate):
     if not user:
         return None
     
-    # Check if seats are still locked by this session or available
-    seats = db.query(models.Seat).filter(
-        and_(
-            models.Seat.show_id == booking_data.show_id,
-            models.Seat.id.in_(booking_data.seat_ids),
-            models.Seat.is_booked == False
-        )
-    ).all()
+    seat_ids = list(dict.fromkeys(booking_data.seat_ids))
+    if not seat_ids:
+        return None
     
-    if len(seats) != len(booking_data.seat_ids):
+    # Seats must be free or locked by this booking's session
+    layout = show_layout(db, booking_data.show_id)
+    if (
+        layout is None or not layout.has_all(seat_ids)
+        or not book_seats(db, booking_data.show_id, seat_ids, booking_data.user_session, datetime.utcnow())
+    ):
+        db.rollback()
         return None
     
     # Calculate total amount
     show = get_show(db, booking_data.show_id)
-    total_amount = len(seats) * show.price
+    total_amount = len(seat_ids) * show.price
     
     # Create booking
     db_booking = models.Booking(
@@ -194,33 +401,413 @@ def create_booking(db: Session, booking_data: schemas.BookingCreate):
     db.add(db_booking)
     db.flush()
     
-    # Mark seats as booked and create booking_seats
-    for seat in seats:
-        seat.is_booked = True
-        seat.is_locked = False
-        seat.locked_until = None
-        seat.locked_by = None
-        
-        booking_seat = models.BookingSeat(
-            booking_id=db_booking.id,
-            seat_id=seat.id
-        )
-        db.add(booking_seat)
+    db.execute(insert(models.BookingSeat), [
+        {"booking_id": db_booking.id, "seat_id": seat_id} for seat_id in seat_ids
+    ])
     
+    add_outbox_events(db, [outbox_event(
+        "booking", db_booking.id, "booking_created",
+        {"user_id": user.id, "seat_ids": seat_ids, "total_amount": total_amount, "status": "pending"},
+        show_id=booking_data.show_id
+    )])
     db.commit()
     db.refresh(db_booking)
     return db_booking
 
 def get_booking(db: Session, booking_id: int):
-    return db.query(models.Booking).filter(models.Booking.id == booking_id).first()
+    booking = db.query(models.Booking).filter(models.Booking.id == booking_id).first()
+    return with_archived_shows(db, [booking])[0] if booking is not None else None
 
 def get_user_bookings(db: Session, user_id: int):
-    return db.query(models.Booking).filter(models.Booking.user_id == user_id).all()
+    return with_archived_shows(
+        db,
+        db.query(models.Booking).filter(models.Booking.user_id == user_id).order_by(models.Booking.created_at, models.Booking.id).all()
+    )
+
+def expire_pending_bookings(db: Session, older_than: datetime, batch_size: int = REAPER_BATCH_SIZE) -> int:
+    """
+    Cancel one batch of pending bookings created before older_than, and fail their pending payments.
+    A booking whose payment (direct or through its basket) was initiated after older_than is still
+    waiting on the gateway and is left alone until that payment is as old.
+    """
+    recent_payment = (
+        select(models.Payment.id)
+        .where(
+            models.Payment.status == "pending",
+            models.Payment.created_at >= older_than,
+            or_(
+                models.Payment.booking_id == models.Booking.id,
+                models.Payment.transaction_id.in_(
+                    select(models.Basket.transaction_id)
+                    .join(models.BasketBooking, models.BasketBooking.basket_id == models.Basket.id)
+                    .where(models.BasketBooking.booking_id == models.Booking.id)
+                )
+            )
+        )
+        .correlate(models.Booking)
+        .exists()
+    )
+    rows = (
+        db.query(models.Booking.id, models.Booking.show_id)
+        .filter(models.Booking.status == "pending", models.Booking.created_at < older_than, ~recent_payment)
+        .order_by(models.Booking.id)
+        .limit(batch_size)
+        .all()
+    )
+    if not rows:
+        return 0
+    booking_ids = [booking_id for booking_id, _ in rows]
+    
+    db.execute(
+        update(models.Booking)
+        .where(models.Booking.id.in_(booking_ids), models.Booking.status == "pending")
+        .values(status="cancelled"),
+        execution_options={"synchronize_session": False}
+    )
+    db.execute(
+        update(models.Payment)
+        .where(models.Payment.booking_id.in_(booking_ids), models.Payment.status == "pending")
+        .values(status="failed"),
+        execution_options={"synchronize_session": False}
+    )
+    db.execute(
+        update(models.Basket)
+        .where(
+            models.Basket.status == "pending",
+            models.Basket.id.in_(
+                select(models.BasketBooking.basket_id).where(models.BasketBooking.booking_id.in_(booking_ids))
+            )
+        )
+        .values(status="cancelled"),
+        execution_options={"synchronize_session": False}
+    )
+    db.execute(
+        update(models.Payment)
+        .where(
+            models.Payment.status == "pending",
+            models.Payment.transaction_id.in_(
+                select(models.Basket.transaction_id)
+                .join(models.BasketBooking, models.BasketBooking.basket_id == models.Basket.id)
+                .where(models.BasketBooking.booking_id.in_(booking_ids))
+            )
+        )
+        .values(status="failed"),
+        execution_options={"synchronize_session": False}
+    )
+    add_outbox_events(db, [
+        outbox_event("booking", booking_id, "booking_cancelled", {"status": "cancelled", "reason": "expired"}, show_id=show_id)
+        for booking_id, show_id in rows
+    ])
+    db.commit()
+    return len(booking_ids)
+
+def release_cancelled_booking_seats(db: Session, batch_size: int = REAPER_BATCH_SIZE) -> dict:
+    """Free one batch of seats still marked booked by cancelled bookings; returns show_id -> seat ids"""
+    active_seat = aliased(models.BookingSeat)
+    active_booking = aliased(models.Booking)
+    active_link = (
+        select(active_seat.id)
+        .join(active_booking, active_booking.id == active_seat.booking_id)
+        .where(
+            active_seat.seat_id == models.ShowSeat.seat_id,
+            active_booking.show_id == models.ShowSeat.show_id,
+            active_booking.status.in_(["pending", "confirmed"])
+        )
+        .correlate(models.ShowSeat)
+        .exists()
+    )
+    
+    rows = (
+        db.query(models.ShowSeat.seat_id, models.ShowSeat.show_id)
+        .join(models.Booking, models.Booking.show_id == models.ShowSeat.show_id)
+        .join(models.BookingSeat, and_(
+            models.BookingSeat.booking_id == models.Booking.id, models.BookingSeat.seat_id == models.ShowSeat.seat_id
+        ))
+        .filter(models.Booking.status == "cancelled", models.ShowSeat.is_booked == True, ~active_link)
+        .distinct()
+        .limit(batch_size)
+        .all()
+    )
+    if not rows:
+        return {}
+    
+    # A freed seat has no row at all. Conditional on the seat still being sold, and counted from the
+    # rows actually deleted, so a seat freed (and re-held) meanwhile is neither freed nor counted twice
+    freed = db.execute(
+        delete(models.ShowSeat)
+        .where(
+            tuple_(models.ShowSeat.show_id, models.ShowSeat.seat_id).in_([(show_id, seat_id) for seat_id, show_id in rows]),
+            models.ShowSeat.is_booked == True
+        )
+        .returning(models.ShowSeat.seat_id, models.ShowSeat.show_id),
+        execution_options={"synchronize_session": False}
+    ).all()
+    
+    released = {}
+    for seat_id, show_id in freed:
+        released.setdefault(show_id, []).append(seat_id)
+    adjust_seat_counts(db, {show_id: (len(seat_ids), 0) for show_id, seat_ids in released.items()})
+    add_outbox_events(db, [
+        outbox_event("seat", show_id, "seats_released", {"seat_ids": seat_ids, "reason": "booking_cancelled"}, show_id=show_id)
+        for show_id, seat_ids in released.items()
+    ])
+    db.commit()
+    return released
+
+# Basket CRUD (seats across several shows, one payment)
+def basket_seats_by_show(items: List[schemas.BasketItem]) -> Dict[int, List[int]]:
+    """Seat ids per show, shows and seats ascending, so concurrent baskets claim seat rows in the same order"""
+    seats_by_show = {}
+    for item in items:
+        seats_by_show.setdefault(item.show_id, set()).update(item.seat_ids)
+    return {show_id: sorted(seats_by_show[show_id]) for show_id in sorted(seats_by_show)}
+
+def claim_basket_seats(db: Session, items: List[schemas.BasketItem], claim: Callable[[int, List[int]], bool]) -> Optional[Dict[int, List[int]]]:
+    """Apply claim to every show's basket seats, all or nothing; returns show_id -> seat ids"""
+    seats_by_show = basket_seats_by_show(items)
+    layout_ids = dict(db.query(models.Show.id, models.Show.layout_id).filter(models.Show.id.in_(seats_by_show)).all())
+    for show_id, seat_ids in seats_by_show.items():
+        layout = seat_layouts.get(db, layout_ids.get(show_id))
+        if not seat_ids or layout is None or not layout.has_all(seat_ids) or not claim(show_id, seat_ids):
+            db.rollback()
+            return None
+    return seats_by_show
+
+def lock_basket(db: Session, basket: schemas.BasketLockRequest) -> schemas.BasketLockResponse:
+    now = datetime.utcnow()
+    expires_at = now + timedelta(minutes=5)
+    
+    seats_by_show = claim_basket_seats(
+        db, basket.items,
+        lambda show_id, seat_ids: hold_seats(db, show_id, seat_ids, basket.user_session, now, expires_at)
+    )
+    if seats_by_show is None:
+        return schemas.BasketLockResponse(
+            success=False,
+            items=[],
+            expires_at=expires_at,
+            message="Some seats are not available"
+        )
+    
+    add_outbox_events(db, [
+        outbox_event(
+            "seat", item.show_id, "seats_locked",
+            {"seat_ids": item.seat_ids, "locked_by": basket.user_session, "expires_at": expires_at},
+            show_id=item.show_id
+        )
+        for item in basket.items
+    ])
+    db.commit()
+    
+    return schemas.BasketLockResponse(
+        success=True,
+        items=basket.items,
+        expires_at=expires_at,
+        message="Seats locked successfully"
+    )
+
+def create_basket(db: Session, basket_data: schemas.BasketCreate):
+    """Book every basket item and create its single payment in one transaction"""
+    
+    release_expired_locks(db)
+    
+    user = get_user_by_email(db, basket_data.user_email)
+    if not user:
+        return None
+    
+    show_prices = dict(
+        db.query(models.Show.id, models.Show.price)
+        .filter(models.Show.id.in_([item.show_id for item in basket_data.items]))
+        .all()
+    )
+    if len(show_prices) != len({item.show_id for item in basket_data.items}):
+        return None
+    
+    # Seats must be free or held by this basket's session
+    now = datetime.utcnow()
+    seats_by_show = claim_basket_seats(
+        db, basket_data.items,
+        lambda show_id, seat_ids: book_seats(db, show_id, seat_ids, basket_data.user_session, now)
+    )
+    if seats_by_show is None:
+        return None
+    
+    transaction_id = new_transaction_id(db)
+    total_amount = sum(len(seat_ids) * show_prices[show_id] for show_id, seat_ids in seats_by_show.items())
+    db_basket = models.Basket(user_id=user.id, total_amount=total_amount, status="pending", transaction_id=transaction_id)
+    db.add(db_basket)
+    
+    bookings = [
+        models.Booking(
+            user_id=user.id,
+            show_id=show_id,
+            total_amount=len(seat_ids) * show_prices[show_id],
+            status="pending"
+        )
+        for show_id, seat_ids in seats_by_show.items()
+    ]
+    db.add_all(bookings)
+    db.flush()
+    
+    db.execute(insert(models.BookingSeat), [
+        {"booking_id": booking.id, "seat_id": seat_id}
+        for booking in bookings for seat_id in seats_by_show[booking.show_id]
+    ])
+    db.execute(insert(models.BasketBooking), [
+        {"basket_id": db_basket.id, "booking_id": booking.id} for booking in bookings
+    ])
+    db.add(models.Payment(
+        booking_id=None,
+        amount=total_amount,
+        payment_method=basket_data.payment_method,
+        transaction_id=transaction_id,
+        status="pending"
+    ))
+    
+    add_outbox_events(db, [
+        outbox_event(
+            "booking", booking.id, "booking_created",
+            {"user_id": user.id, "seat_ids": seats_by_show[booking.show_id], "total_amount": booking.total_amount,
+             "status": "pending", "basket_id": db_basket.id},
+            show_id=booking.show_id
+        )
+        for booking in bookings
+    ])
+    db.commit()
+    db.refresh(db_basket)
+    return db_basket
+
+def get_basket(db: Session, basket_id: int):
+    return db.query(models.Basket).filter(models.Basket.id == basket_id).first()
+
+def reconcile_seat_counts(db: Session, after_id: int = 0, batch_size: int = RECONCILE_BATCH_SIZE) -> dict:
+    """
+    Recount one batch of shows (ids after after_id) from show_seats and repair drifted counters.
+    Returns the last show id checked (None when done) and how many shows were checked and repaired.
+    """
+    # Locking the show rows first makes the recount consistent: a claim that has already bumped a
+    # counter is waited for, and one that has not yet bumped it is not counted either
+    shows = (
+        db.query(models.Show.id, models.Show.available_count, models.Show.held_count, models.TheatreLayout.seat_count)
+        .outerjoin(models.TheatreLayout, models.TheatreLayout.id == models.Show.layout_id)
+        .filter(models.Show.id > after_id)
+        .order_by(models.Show.id)
+        .limit(batch_size)
+        .with_for_update(of=models.Show)
+        .all()
+    )
+    if not shows:
+        db.rollback()
+        return {"last_id": None, "checked": 0, "repaired": 0}
+    
+    counts = {
+        show_id: (rows, held)
+        for show_id, rows, held in db.query(
+            models.ShowSeat.show_id,
+            func.count(),
+            func.sum(case((models.ShowSeat.is_booked == False, 1), else_=0))
+        )
+        .filter(models.ShowSeat.show_id.in_([show.id for show in shows]))
+        .group_by(models.ShowSeat.show_id)
+    }
+    deltas = {}
+    for show in shows:
+        rows, held = counts.get(show.id, (0, 0))
+        available = (show.seat_count or 0) - rows
+        if (show.available_count, show.held_count) != (available, held):
+            deltas[show.id] = (available - (show.available_count or 0), held - (show.held_count or 0))
+    adjust_seat_counts(db, deltas)
+    db.commit()
+    return {"last_id": shows[-1].id, "checked": len(shows), "repaired": len(deltas)}
+
+# Archive CRUD (finished shows moved out of the hot tables; bookings and payments stay)
+def archive_past_shows(db: Session, before: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> dict:
+    """Move one batch of shows dated before `before`, their sold seats and booking seat links, to the archive"""
+    show_ids = [
+        show_id for show_id, in db.query(models.Show.id)
+        .filter(models.Show.show_date < before)
+        .order_by(models.Show.id)
+        .limit(batch_size)
+    ]
+    if not show_ids:
+        return {"shows": 0, "seats": 0, "booking_seats": 0}
+    booking_ids = select(models.Booking.id).where(models.Booking.show_id.in_(show_ids))
+    
+    show_columns = ["id", "movie_id", "theatre_id", "show_date", "show_time", "price", "layout_id", "created_at"]
+    db.execute(insert(models.ArchivedShow).from_select(
+        show_columns,
+        select(*[getattr(models.Show, column) for column in show_columns]).where(models.Show.id.in_(show_ids))
+    ))
+    # Holds on a finished show mean nothing; only sold seats are kept
+    seats = db.execute(insert(models.ArchivedShowSeat).from_select(
+        ["show_id", "seat_id"],
+        select(models.ShowSeat.show_id, models.ShowSeat.seat_id)
+        .where(models.ShowSeat.show_id.in_(show_ids), models.ShowSeat.is_booked == True)
+    )).rowcount
+    booking_seats = db.execute(insert(models.ArchivedBookingSeat).from_select(
+        ["id", "booking_id", "seat_id"],
+        select(models.BookingSeat.id, models.BookingSeat.booking_id, models.BookingSeat.seat_id)
+        .where(models.BookingSeat.booking_id.in_(booking_ids))
+    )).rowcount
+    
+    for statement in (
+        delete(models.BookingSeat).where(models.BookingSeat.booking_id.in_(booking_ids)),
+        delete(models.ShowSeat).where(models.ShowSeat.show_id.in_(show_ids)),
+        delete(models.Show).where(models.Show.id.in_(show_ids)),
+    ):
+        db.execute(statement, execution_options={"synchronize_session": False})
+    db.commit()
+    return {"shows": len(show_ids), "seats": seats, "booking_seats": booking_seats}
+
+def get_archived_show(db: Session, show_id: int):
+    return db.query(models.ArchivedShow).filter(models.ArchivedShow.id == show_id).first()
+
+def with_archived_shows(db: Session, bookings: List[models.Booking]) -> list:
+    """
+    Bookings as loaded, except those whose show was archived: their show and seats are read
+    from the archive tables instead (one query each for the whole list).
+    """
+    show_ids = {booking.show_id for booking in bookings}
+    live = {show_id for show_id, in db.query(models.Show.id).filter(models.Show.id.in_(show_ids))} if show_ids else set()
+    if live == show_ids:
+        return bookings
+    
+    shows = {show.id: show for show in db.query(models.ArchivedShow).filter(models.ArchivedShow.id.in_(show_ids - live))}
+    archived_bookings = [booking for booking in bookings if booking.show_id in shows]
+    seat_ids = {}
+    for booking_id, seat_id in (
+        db.query(models.ArchivedBookingSeat.booking_id, models.ArchivedBookingSeat.seat_id)
+        .filter(models.ArchivedBookingSeat.booking_id.in_([booking.id for booking in archived_bookings]))
+        .order_by(models.ArchivedBookingSeat.id)
+    ):
+        seat_ids.setdefault(booking_id, []).append(seat_id)
+    
+    result = []
+    for booking in bookings:
+        show = shows.get(booking.show_id)
+        if show is None:
+            result.append(booking)
+            continue
+        seats = []
+        for seat_id in seat_ids.get(booking.id, []):
+            row, seat_number = seat_layouts.label(db, show.layout_id, seat_id)
+            seats.append(schemas.BookingSeat(seat_id=seat_id, seat_number=seat_number, row=row))
+        result.append(schemas.Booking(
+            id=booking.id,
+            user_id=booking.user_id,
+            show_id=booking.show_id,
+            total_amount=booking.total_amount,
+            status=booking.status,
+            payment_id=booking.payment_id,
+            created_at=booking.created_at,
+            booking_seats=seats,
+            show=schemas.Show.model_validate(show)
+        ))
+    return result
 
 # Payment CRUD
 def create_payment(db: Session, payment_data: schemas.PaymentInitiate):
-    import uuid
-    transaction_id = str(uuid.uuid4())
+    transaction_id = new_transaction_id(db)
     
     db_payment = models.Payment(
         booking_id=payment_data.booking_id,
@@ -235,17 +822,156 @@ def create_payment(db: Session, payment_data: schemas.PaymentInitiate):
     return db_payment
 
 def confirm_payment(db: Session, transaction_id: str, status: str):
-    payment = db.query(models.Payment).filter(models.Payment.transaction_id == transaction_id).first()
-    if payment:
-        payment.status = status
+    found = apply_payment_confirmations(db, [schemas.PaymentConfirm(transaction_id=transaction_id, status=status)])
+    if not found:
+        return None
+    
+    db.commit()
+    return db.query(models.Payment).filter(models.Payment.transaction_id == transaction_id).first()
+
+def apply_payment_confirmations(db: Session, confirmations: List[schemas.PaymentConfirm]) -> Dict[str, str]:
+    """
+    Set-based payment/booking updates without committing; returns transaction_id -> outcome for payments found.
+    Only pending payments move (updated). A success reported for a payment already failed (its booking expired)
+    marks it refund_required; any other result for a settled payment is ignored (unchanged).
+    """
+    # Later entries for the same transaction win, as with sequential confirm_payment calls
+    latest_status = {item.transaction_id: item.status for item in confirmations}
+    
+    payments = (
+        db.query(models.Payment.transaction_id, models.Payment.booking_id, models.Payment.status)
+        .filter(models.Payment.transaction_id.in_(latest_status.keys()))
+        .with_for_update()
+        .all()
+    )
+    booking_ids = {transaction_id: booking_id for transaction_id, booking_id, _ in payments}
+    refunds = [
+        transaction_id for transaction_id, _, status in payments
+        if status == "failed" and latest_status[transaction_id] == "success"
+    ]
+    if refunds:
+        db.execute(
+            update(models.Payment)
+            .where(models.Payment.transaction_id.in_(refunds), models.Payment.status == "failed")
+            .values(status="refund_required"),
+            execution_options={"synchronize_session": False}
+        )
+    
+    by_status = {}
+    for transaction_id, _, status in payments:
+        if status == "pending":
+            by_status.setdefault(latest_status[transaction_id], []).append(transaction_id)
+    for status, transaction_ids in by_status.items():
+        db.execute(
+            update(models.Payment)
+            .where(models.Payment.transaction_id.in_(transaction_ids), models.Payment.status == "pending")
+            .values(status=status),
+            execution_options={"synchronize_session": False}
+        )
+    # Bookings and baskets follow only the payments that moved
+    moved = {transaction_id for transaction_ids in by_status.values() for transaction_id in transaction_ids}
+    
+    # A basket payment covers every booking in its basket
+    payment_bookings = {
+        transaction_id: [booking_id] for transaction_id, booking_id in booking_ids.items()
+        if booking_id is not None and transaction_id in moved
+    }
+    basket_payments = [
+        transaction_id for transaction_id, booking_id in booking_ids.items() if booking_id is None and transaction_id in moved
+    ]
+    if basket_payments:
+        basket_rows = (
+            db.query(models.Basket.transaction_id, models.BasketBooking.booking_id)
+            .join(models.BasketBooking, models.BasketBooking.basket_id == models.Basket.id)
+            .filter(models.Basket.transaction_id.in_(basket_payments))
+            .all()
+        )
+        for transaction_id, booking_id in basket_rows:
+            payment_bookings.setdefault(transaction_id, []).append(booking_id)
+        for basket_status, transaction_ids in (
+            ("confirmed", [t for t in basket_payments if latest_status[t] == "success"]),
+            ("cancelled", [t for t in basket_payments if latest_status[t] != "success"])
+        ):
+            if transaction_ids:
+                db.execute(
+                    update(models.Basket)
+                    .where(models.Basket.transaction_id.in_(transaction_ids), models.Basket.status == "pending")
+                    .values(status=basket_status),
+                    execution_options={"synchronize_session": False}
+                )
+    
+    # Last payment per booking decides its status and payment_id
+    booking_payment = {}
+    for item in confirmations:
+        for booking_id in payment_bookings.get(item.transaction_id, []):
+            booking_payment[booking_id] = item.transaction_id
+    
+    pending_shows = dict(
+        db.query(models.Booking.id, models.Booking.show_id)
+        .filter(models.Booking.id.in_(booking_payment.keys()), models.Booking.status == "pending")
+        .all()
+    ) if booking_payment else {}
+    
+    events = [
+        outbox_event("payment", transaction_id, "payment_updated", {
+            "booking_ids": payment_bookings.get(transaction_id, []), "status": latest_status[transaction_id]
+        })
+        for transaction_id in booking_ids if transaction_id in moved
+    ] + [
+        outbox_event("payment", transaction_id, "payment_updated", {"booking_ids": [], "status": "refund_required"})
+        for transaction_id in refunds
+    ]
+    by_booking_status = {}
+    for booking_id, transaction_id in booking_payment.items():
+        if booking_id not in pending_shows:
+            continue
+        booking_status = "confirmed" if latest_status[transaction_id] == "success" else "cancelled"
+        by_booking_status.setdefault(booking_status, {})[booking_id] = transaction_id
+        events.append(outbox_event(
+            "booking", booking_id, f"booking_{booking_status}",
+            {"status": booking_status, "payment_id": transaction_id}, show_id=pending_shows[booking_id]
+        ))
+    add_outbox_events(db, events)
+    for booking_status, payment_ids in by_booking_status.items():
+        db.execute(
+            update(models.Booking)
+            .where(models.Booking.id.in_(payment_ids.keys()), models.Booking.status == "pending")
+            .values(status=booking_status, payment_id=case(payment_ids, value=models.Booking.id)),
+            execution_options={"synchronize_session": False}
+        )
+    
+    return {
+        transaction_id: "updated" if transaction_id in moved else "refund_required" if transaction_id in refunds else "unchanged"
+        for transaction_id in booking_ids
+    }
+
+def confirm_payments_batch(db: Session, confirmations: List[schemas.PaymentConfirm], chunk_size: int = PAYMENT_BATCH_CHUNK_SIZE) -> List[schemas.PaymentConfirmResult]:
+    """Apply gateway settlement results with set-based updates, one transaction per chunk"""
+    results = []
+    for start in range(0, len(confirmations), chunk_size):
+        chunk = confirmations[start:start + chunk_size]
         
-        # Update booking status
-        booking = db.query(models.Booking).filter(models.Booking.id == payment.booking_id).first()
-        if booking:
-            booking.status = "confirmed" if status == "success" else "cancelled"
-            booking.payment_id = transaction_id
+        try:
+            outcomes = apply_payment_confirmations(db, chunk)
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            results.extend(
+                schemas.PaymentConfirmResult(transaction_id=item.transaction_id, status=item.status, outcome="error")
+                for item in chunk
+            )
+            continue
         
-        db.commit()
-        db.refresh(payment)
+        results.extend(
+            schemas.PaymentConfirmResult(
+                transaction_id=item.transaction_id,
+                status=item.status,
+                outcome=outcomes.get(item.transaction_id, "not_found")
+            )
+            for item in chunk
+        )
     
-    return payment
+    return results
+
+# Every public crud function gets a tracing span (a no-op outside sampled requests)
+trace_functions(globals(), "crud")
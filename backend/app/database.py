@@ -1,29 +1,49 @@
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
 import logging
+from app.utils.metrics import install_query_hooks
+from app.utils.slow_query import install_slow_query_log
+from app.utils.tracing import install_sql_spans
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "3"))  # seconds to wait for a pooled connection before failing
 
 if not DATABASE_URL:
     # Default to SQLite for development if no DATABASE_URL is set
     DATABASE_URL = "sqlite:///./movie_booking.db"
     logger.warning("No DATABASE_URL found, using SQLite database")
 
-logger.info(f"Using database: {DATABASE_URL.split('@')[0] if '@' in DATABASE_URL else DATABASE_URL}")
+def redacted_database_url() -> str:
+    """DATABASE_URL with the password masked, for logs"""
+    return make_url(DATABASE_URL).render_as_string(hide_password=True)
 
-# Handle different database configurations
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    # For PostgreSQL and other databases
-    engine = create_engine(DATABASE_URL, pool_pre_ping=True, pool_recycle=300)
+def create_db_engine(url: str):
+    """Engine for the primary database or a shard (create_engine does not connect until first use)"""
+    if url.startswith("sqlite"):
+        db_engine = create_engine(url, connect_args={"check_same_thread": False})
+    else:
+        # For PostgreSQL and other databases
+        db_engine = create_engine(
+            url, pool_pre_ping=True, pool_recycle=300,
+            pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT
+        )
+    # Per-request statement counts and timings for /metrics, and the slow-query log
+    install_query_hooks(db_engine)
+    install_slow_query_log(db_engine)
+    install_sql_spans(db_engine)
+    return db_engine
+
+engine = create_db_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -31,6 +51,9 @@ Base = declarative_base()
 def get_db():
     db = SessionLocal()
     try:
+        # Check out the connection up front so a saturated pool surfaces as sqlalchemy TimeoutError
+        # (a 503) here rather than as a generic failure inside the endpoint
+        db.connection()
         yield db
     finally:
         db.close()
@@ -42,5 +65,5 @@ def test_db_connection():
             logger.info("Database connection successful")
             return True
     except Exception as e:
-        logger.error(f"Database connection failed: {e}")
+        logger.error("Database connection failed: %s", e)
         return False
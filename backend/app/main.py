@@ -1,27 +1,81 @@
 
-from fastapi import FastAPI
+from app.utils.startup import StartupTimingMiddleware, WARMUP_ON_STARTUP, startup_timer, warm_up, worker_slot  # first, to time the imports below
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
-from app.routes import movies, shows, bookings, payments, users, theatres
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app.database import engine, redacted_database_url
+from app.sharding import ensure_shard_schemas, shard_router
+from app.routes import movies, shows, bookings, payments, users, theatres, changes, waiting_room, baskets, admin
+from app.utils.payment_queue import payment_callback_queue, ASYNC_PAYMENT_CALLBACKS
+from app.utils.reaper import booking_reaper, REAPER_ENABLED
+from app.utils.archiver import show_archiver, ARCHIVE_ENABLED
+from app.utils.seat_counters import seat_count_reconciler, RECONCILE_ENABLED
+from app.utils.metrics import MetricsMiddleware, metrics_registry, pool_metrics, render_samples
+from app.utils.seat_lock import seat_lock_manager
+from app.utils.idempotency import idempotency_store
+from app.utils.schedule_cache import schedule_cache
+from app.utils.flash_sale import flash_sale_manager
+from app.utils.tracing import TracingMiddleware, span_exporter
+from app.utils.logging_config import log_pipeline
+from app.utils.load_shedding import LoadSheddingMiddleware, LOAD_SHEDDING_ENABLED, load_shedder
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Set up logging (structured records written by a background thread)
+log_pipeline.configure()
 logger = logging.getLogger(__name__)
 
-# Create database tables
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created successfully")
-except Exception as e:
-    logger.error(f"Error creating database tables: {e}")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_timer.mark("lifespan_started")
+    logger.info("Starting Movie Booking API using database %s", redacted_database_url())
+    if len(shard_router.shards) > 1:
+        logger.info("City shards: %s", shard_router.describe())
+    try:
+        # Schema creation is a migration step (python migrate.py), not an import side effect
+        ensure_shard_schemas()
+    except Exception as e:
+        logger.error("Database schema check failed: %s", e)
+    if WARMUP_ON_STARTUP:
+        try:
+            warm_up(engine)
+            startup_timer.mark("warmed_up")
+        except Exception as e:
+            logger.warning("Warm-up failed: %s", e)
+    # Background jobs run in one worker only (serve.py slot 0, replaced in the same slot when it recycles)
+    if worker_slot() == 0:
+        if ASYNC_PAYMENT_CALLBACKS:
+            payment_callback_queue.start()
+        if REAPER_ENABLED:
+            booking_reaper.start()
+        if ARCHIVE_ENABLED:
+            show_archiver.start()
+        if RECONCILE_ENABLED:
+            seat_count_reconciler.start()
+    else:
+        logger.info("Background jobs run in worker slot 0, not in slot %d", worker_slot())
+    startup_timer.mark("ready")
+    logger.info("Startup timings (ms since process start): %s", startup_timer.report())
+    yield
+    payment_callback_queue.stop()
+    booking_reaper.stop()
+    show_archiver.stop()
+    seat_count_reconciler.stop()
+    span_exporter.flush()
+    log_pipeline.stop()
 
 app = FastAPI(
     title="Movie Booking API",
     description="A complete movie ticket booking platform API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Per-route-class admission limits; inside CORS so 503s still carry CORS headers
+if LOAD_SHEDDING_ENABLED:
+    app.add_middleware(LoadSheddingMiddleware)
+
 # CORS middleware - Allow all origins during development
 app.add_middleware(
     CORSMiddleware,
@@ -31,13 +85,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency and DB cost per route, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Request-scoped tracing spans, sampled at TRACE_SAMPLE_RATE
+app.add_middleware(TracingMiddleware)
+
+# Time to first request, for the startup report
+app.add_middleware(StartupTimingMiddleware)
+
 # Include routers
 app.include_router(movies.router, prefix="/api", tags=["movies"])
 app.include_router(shows.router, prefix="/api", tags=["shows"])
 app.include_router(bookings.router, prefix="/api", tags=["bookings"])
+app.include_router(baskets.router, prefix="/api", tags=["baskets"])
 app.include_router(payments.router, prefix="/api", tags=["payments"])
 app.include_router(users.router, prefix="/api", tags=["users"])
 app.include_router(theatres.router, prefix="/api", tags=["theatres"])
+app.include_router(changes.router, prefix="/api", tags=["changes"])
+app.include_router(waiting_room.router, prefix="/api", tags=["waiting-room"])
+app.include_router(admin.router, prefix="/api", tags=["admin"])
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    """No pooled connection within DB_POOL_TIMEOUT: fail fast instead of tying up a thread"""
+    logger.warning("Connection pool exhausted on %s %s", request.method, request.url.path)
+    return JSONResponse(status_code=503, content={"detail": "Server is busy, please retry"}, headers={"Retry-After": "1"})
 
 @app.get("/")
 def root():
@@ -45,10 +118,42 @@ def root():
 
 @app.get("/health")
 def health_check():
-    logger.info("Health check endpoint called")
+    logger.debug("Health check endpoint called")
     return {"status": "healthy", "message": "API is running"}
 
-@app.on_event("startup")
-async def startup_event():
-    logger.info("Starting Movie Booking API...")
-    logger.info("Database connection initialized")
+def app_state_metrics():
+    flash_shows = list(flash_sale_manager.shows.values())
+    return (
+        render_samples("seat_locks_held", "Live locks in the in-memory seat lock", "gauge",
+                       [((), len(seat_lock_manager.locks))])
+        + render_samples("seat_lock_manager_results_total", "In-memory seat lock attempts by result", "counter",
+                         [(("granted",), seat_lock_manager.granted), (("conflict",), seat_lock_manager.conflicts)], ("result",))
+        + render_samples("idempotency_cache_entries", "Responses in the idempotency LRU", "gauge",
+                         [((), len(idempotency_store.cache))])
+        + render_samples("idempotency_lookups_total", "Idempotency key lookups by result", "counter",
+                         [(("hit",), idempotency_store.hits), (("miss",), idempotency_store.misses)], ("result",))
+        + render_samples("schedule_cache_lookups_total", "Theatre-day schedule cache lookups by result", "counter",
+                         [(("hit",), schedule_cache.hits), (("miss",), schedule_cache.misses)], ("result",))
+        + render_samples("payment_callbacks_total", "Payment callbacks handled by this process", "counter", [
+            (("enqueued",), payment_callback_queue.enqueued_total),
+            (("duplicate",), payment_callback_queue.duplicates_total),
+            (("processed",), payment_callback_queue.processed_total),
+            (("not_found",), payment_callback_queue.not_found_total),
+        ], ("event",))
+        + render_samples("flash_sale_shows_active", "Shows in flash-sale mode", "gauge", [((), len(flash_shows))])
+        + render_samples("flash_sale_claims_total", "Claims decided by flash-sale writers still active", "counter",
+                         [((), sum(flash_show.claims_total for flash_show in flash_shows))])
+        + render_samples("log_records_dropped_total", "Log records dropped because the log queue was full", "counter",
+                         [((), log_pipeline.dropped)])
+    )
+
+metrics_registry.add_collector(lambda: pool_metrics(shard_router.engines))
+metrics_registry.add_collector(app_state_metrics)
+metrics_registry.add_collector(load_shedder.metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Prometheus text-format metrics"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+startup_timer.mark("app_imported")
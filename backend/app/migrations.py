@@ -0,0 +1,238 @@
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+import logging
+import os
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, and_, bindparam, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# Apply pending migrations when the app starts; otherwise run `python migrate.py` as a deploy step
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false").lower() == "true"
+
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, description: str):
+    """Register a schema or data migration; versions must increase in file order"""
+    def register(fn: Callable[[Connection], None]):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"Migration {version} registered after {MIGRATIONS[-1].version}")
+        MIGRATIONS.append(Migration(version, description, fn))
+        return fn
+    return register
+
+@migration(1, "Initial schema")
+def initial_schema(connection: Connection):
+    import app.models as models
+    # checkfirst: databases created before migrations existed already have these tables
+    models.Base.metadata.create_all(bind=connection)
+
+@migration(2, "Theatre seat layouts; show seat rows only for held and sold seats")
+def theatre_seat_layouts(connection: Connection):
+    """
+    Replaces the per-show clone of every seat (the old seats table) with shared theatre layouts.
+    Each show gets a layout matching its old seats; held and sold seats become show_seats rows
+    and booking_seats.seat_id is rewritten from the old seat id to the seat's layout position.
+    """
+    import app.models as models
+    from app.utils.seat_layout import SeatLayout, default_layout_rows, layout_json, layout_rows_from_seats
+
+    models.Base.metadata.create_all(bind=connection)  # theatre_layouts and show_seats
+    inspector = inspect(connection)
+    if not inspector.has_table("seats"):
+        return  # created with layouts already
+    for table in ("theatres", "shows"):
+        if "layout_id" not in {column["name"] for column in inspector.get_columns(table)}:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN layout_id INTEGER REFERENCES theatre_layouts (id)"))
+    # SQLite does not name (or, by default, enforce) the old foreign key; it is left in place there
+    for foreign_key in inspector.get_foreign_keys("booking_seats"):
+        if foreign_key["referred_table"] == "seats" and foreign_key.get("name"):
+            connection.execute(text(f"ALTER TABLE booking_seats DROP CONSTRAINT {foreign_key['name']}"))
+
+    legacy_seats = Table(
+        "seats", MetaData(),
+        Column("id", Integer), Column("show_id", Integer), Column("row", String), Column("seat_number", String),
+        Column("is_booked", Boolean), Column("is_locked", Boolean),
+        Column("locked_until", DateTime(timezone=True)), Column("locked_by", String),
+    )
+    layouts = models.TheatreLayout.__table__
+    shows = models.Show.__table__
+    theatres = models.Theatre.__table__
+    booking_seats = models.BookingSeat.__table__
+
+    layout_ids = {rows: layout_id for layout_id, rows in connection.execute(select(layouts.c.id, layouts.c.rows))}
+
+    def layout_for(rows: List[dict]) -> int:
+        rows_json = layout_json(rows)
+        if rows_json not in layout_ids:
+            layout_ids[rows_json] = connection.execute(layouts.insert().values(
+                rows=rows_json, seat_count=sum(len(row["seats"]) for row in rows), created_at=datetime.utcnow()
+            )).inserted_primary_key[0]
+        return layout_ids[rows_json]
+
+    now = datetime.utcnow()
+    converted = 0
+    # One show at a time keeps memory flat on large tables
+    for show_id in connection.execute(select(shows.c.id).order_by(shows.c.id)).scalars().all():
+        seats = connection.execute(
+            select(
+                legacy_seats.c.id, legacy_seats.c.row, legacy_seats.c.seat_number, legacy_seats.c.is_booked,
+                and_(legacy_seats.c.is_locked == True, legacy_seats.c.locked_until >= now).label("held"),
+                legacy_seats.c.locked_until, legacy_seats.c.locked_by
+            ).where(legacy_seats.c.show_id == show_id)
+        ).all()
+        if not seats:
+            continue
+        rows = layout_rows_from_seats((seat.row, seat.seat_number) for seat in seats)
+        layout_id = layout_for(rows)
+        positions = {(seat.row, seat.seat_number): seat.id for seat in SeatLayout(layout_id, rows).seats}
+        new_ids = {seat.id: positions[(seat.row, seat.seat_number)] for seat in seats}
+
+        connection.execute(update(shows).where(shows.c.id == show_id).values(layout_id=layout_id))
+        states = [
+            {"show_id": show_id, "seat_id": new_ids[seat.id], "is_booked": bool(seat.is_booked),
+             "locked_until": None if seat.is_booked else seat.locked_until,
+             "locked_by": None if seat.is_booked else seat.locked_by}
+            for seat in seats if seat.is_booked or seat.held
+        ]
+        if states:
+            connection.execute(models.ShowSeat.__table__.insert(), states)
+
+        # Matched through the booking's show too: rows already rewritten hold small ids that may
+        # collide with another show's old seat ids
+        links = connection.execute(
+            select(booking_seats.c.id, booking_seats.c.seat_id)
+            .join(models.Booking.__table__, models.Booking.__table__.c.id == booking_seats.c.booking_id)
+            .join(legacy_seats, legacy_seats.c.id == booking_seats.c.seat_id)
+            .where(models.Booking.__table__.c.show_id == show_id, legacy_seats.c.show_id == show_id)
+        ).all()
+        if links:
+            connection.execute(
+                update(booking_seats).where(booking_seats.c.id == bindparam("link_id")).values(seat_id=bindparam("position")),
+                [{"link_id": link_id, "position": new_ids[seat_id]} for link_id, seat_id in links]
+            )
+        converted += 1
+
+    # Theatres take the layout of their latest show; theatres without shows get the default plan
+    latest_layout = (
+        select(shows.c.layout_id)
+        .where(shows.c.theatre_id == theatres.c.id, shows.c.layout_id.isnot(None))
+        .order_by(shows.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    connection.execute(update(theatres).where(theatres.c.layout_id.is_(None)).values(layout_id=latest_layout))
+    for theatre_id, total_seats in connection.execute(
+        select(theatres.c.id, theatres.c.total_seats).where(theatres.c.layout_id.is_(None))
+    ).all():
+        connection.execute(update(theatres).where(theatres.c.id == theatre_id).values(
+            layout_id=layout_for(default_layout_rows(total_seats or 100))
+        ))
+    connection.execute(update(theatres).values(
+        total_seats=select(layouts.c.seat_count).where(layouts.c.id == theatres.c.layout_id).scalar_subquery()
+    ))
+    # Shows that never had seats get their theatre's layout
+    connection.execute(
+        update(shows).where(shows.c.layout_id.is_(None)).values(
+            layout_id=select(theatres.c.layout_id).where(theatres.c.id == shows.c.theatre_id).scalar_subquery()
+        )
+    )
+
+    connection.execute(text("DROP TABLE seats"))
+    logger.info("Converted seats of %d shows to %d layouts", converted, len(layout_ids))
+
+@migration(3, "Archive tables for past shows")
+def archive_tables(connection: Connection):
+    import app.models as models
+
+    models.Base.metadata.create_all(bind=connection)  # archived_shows, archived_show_seats, archived_booking_seats
+    # The archiver looks up past shows by date and their bookings by show
+    for index in models.Show.__table__.indexes | models.Booking.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    # A booking outlives its show's move to archived_shows, so bookings.show_id stops being a foreign key
+    # (SQLite leaves the unnamed, unenforced constraint in place)
+    for foreign_key in inspect(connection).get_foreign_keys("bookings"):
+        if foreign_key["referred_table"] == "shows" and foreign_key.get("name"):
+            connection.execute(text(f"ALTER TABLE bookings DROP CONSTRAINT {foreign_key['name']}"))
+
+@migration(4, "Per-show available and held seat counters")
+def show_seat_counters(connection: Connection):
+    import app.models as models
+    from sqlalchemy import func
+
+    columns = {column["name"] for column in inspect(connection).get_columns("shows")}
+    for name in ("available_count", "held_count"):
+        if name not in columns:
+            connection.execute(text(f"ALTER TABLE shows ADD COLUMN {name} INTEGER DEFAULT 0"))
+
+    shows = models.Show.__table__
+    layouts = models.TheatreLayout.__table__
+    show_seats = models.ShowSeat.__table__
+    seat_count = select(layouts.c.seat_count).where(layouts.c.id == shows.c.layout_id).scalar_subquery()
+    taken = select(func.count()).where(show_seats.c.show_id == shows.c.id).scalar_subquery()
+    held = select(func.count()).where(show_seats.c.show_id == shows.c.id, show_seats.c.is_booked == False).scalar_subquery()
+    connection.execute(update(shows).values(
+        available_count=func.coalesce(seat_count, 0) - taken,
+        held_count=held
+    ))
+
+@migration(5, "Index shows by theatre and date")
+def theatre_schedule_index(connection: Connection):
+    import app.models as models
+
+    for index in models.Show.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+def current_version(connection: Connection) -> int:
+    if not inspect(connection).has_table("schema_migrations"):
+        return 0
+    versions = connection.execute(select(schema_migrations.c.version)).scalars().all()
+    return max(versions, default=0)
+
+def pending_migrations(engine: Engine) -> List[Migration]:
+    with engine.connect() as connection:
+        version = current_version(connection)
+    return [item for item in MIGRATIONS if item.version > version]
+
+def migrate(engine: Engine, target: Optional[int] = None) -> List[Migration]:
+    """Apply pending migrations in order, each in its own transaction; returns the ones applied"""
+    migration_metadata.create_all(bind=engine)
+    applied = []
+    for item in pending_migrations(engine):
+        if target is not None and item.version > target:
+            break
+        logger.info("Applying migration %s: %s", item.version, item.description)
+        with engine.begin() as connection:
+            item.apply(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=item.version, description=item.description, applied_at=datetime.utcnow()
+            ))
+        applied.append(item)
+    return applied
+
+def ensure_schema(engine: Engine, auto_migrate: bool = AUTO_MIGRATE) -> bool:
+    """Startup check: migrate when allowed, otherwise report pending migrations; True when up to date"""
+    pending = pending_migrations(engine)
+    if pending and auto_migrate:
+        migrate(engine)
+        return True
+    if pending:
+        logger.warning(
+            "Database schema is missing migrations %s; run `python migrate.py` (or set AUTO_MIGRATE=true)",
+            [item.version for item in pending]
+        )
+        return False
+    return True
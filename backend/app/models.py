@@ -1,6 +1,6 @@
 
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Text, Time, Date
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Text, Time, Date, Index
+from sqlalchemy.orm import object_session, relationship
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -19,6 +19,16 @@ class Movie(Base):
     
     shows = relationship("Show", back_populates="movie")
 
+class TheatreLayout(Base):
+    __tablename__ = "theatre_layouts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # JSON list of {"row": "A", "category": "standard", "seats": ["1", "2", ...]}, front row first.
+    # Never edited once shows reference it: seat ids are positions in this list.
+    rows = Column(Text)
+    seat_count = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class Theatre(Base):
     __tablename__ = "theatres"
     
@@ -27,9 +37,11 @@ class Theatre(Base):
     city = Column(String, index=True)
     address = Column(String)
     total_seats = Column(Integer, default=100)
+    layout_id = Column(Integer, ForeignKey("theatre_layouts.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     shows = relationship("Show", back_populates="theatre")
+    layout = relationship("TheatreLayout")
 
 class Show(Base):
     __tablename__ = "shows"
@@ -37,30 +49,35 @@ class Show(Base):
     id = Column(Integer, primary_key=True, index=True)
     movie_id = Column(Integer, ForeignKey("movies.id"))
     theatre_id = Column(Integer, ForeignKey("theatres.id"))
-    show_date = Column(Date)
+    show_date = Column(Date, index=True)
     show_time = Column(Time)
     price = Column(Float)
+    layout_id = Column(Integer, ForeignKey("theatre_layouts.id"), nullable=True)  # the theatre's layout when the show was created
+    # Maintained in the same transaction as every show_seats change; see crud.adjust_seat_counts
+    available_count = Column(Integer, default=0)  # seats without a show_seats row
+    held_count = Column(Integer, default=0)  # unsold show_seats rows, including expired holds not yet released
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     movie = relationship("Movie", back_populates="shows")
     theatre = relationship("Theatre", back_populates="shows")
-    seats = relationship("Seat", back_populates="show")
-    bookings = relationship("Booking", back_populates="show")
+    bookings = relationship("Booking", back_populates="show", primaryjoin="Show.id == foreign(Booking.show_id)")
+
+    __table_args__ = (Index("ix_shows_theatre_date", "theatre_id", "show_date"),)  # theatre schedules
 
-class Seat(Base):
-    __tablename__ = "seats"
+class ShowSeat(Base):
+    """
+    Held or sold seat of a show; seats without a row are free. seat_id is the seat's
+    1-based position in the show's layout.
+    """
+    __tablename__ = "show_seats"
     
-    id = Column(Integer, primary_key=True, index=True)
-    show_id = Column(Integer, ForeignKey("shows.id"))
-    seat_number = Column(String)
-    row = Column(String)
+    show_id = Column(Integer, ForeignKey("shows.id"), primary_key=True)
+    seat_id = Column(Integer, primary_key=True, autoincrement=False)
     is_booked = Column(Boolean, default=False)
-    is_locked = Column(Boolean, default=False)
     locked_until = Column(DateTime(timezone=True), nullable=True)
     locked_by = Column(String, nullable=True)  # session or user identifier
     
-    show = relationship("Show", back_populates="seats")
-    booking_seats = relationship("BookingSeat", back_populates="seat")
+    __table_args__ = (Index("ix_show_seats_locked_until", "locked_until"),)
 
 class User(Base):
     __tablename__ = "users"
@@ -79,14 +96,14 @@ class Booking(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    show_id = Column(Integer, ForeignKey("shows.id"))
+    show_id = Column(Integer, index=True)  # a row in shows, or in archived_shows once the show is archived
     total_amount = Column(Float)
     status = Column(String, default="pending")  # pending, confirmed, cancelled
     payment_id = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User", back_populates="bookings")
-    show = relationship("Show", back_populates="bookings")
+    show = relationship("Show", back_populates="bookings", primaryjoin="Show.id == foreign(Booking.show_id)")
     booking_seats = relationship("BookingSeat", back_populates="booking")
 
 class BookingSeat(Base):
@@ -94,10 +111,52 @@ class BookingSeat(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     booking_id = Column(Integer, ForeignKey("bookings.id"))
-    seat_id = Column(Integer, ForeignKey("seats.id"))
+    seat_id = Column(Integer)  # position in the booked show's layout
     
     booking = relationship("Booking", back_populates="booking_seats")
-    seat = relationship("Seat", back_populates="booking_seats")
+
+    def _label(self):
+        from app.utils.seat_layout import seat_layouts
+        return seat_layouts.label(object_session(self), self.booking.show.layout_id, self.seat_id)
+
+    @property
+    def seat_number(self):
+        return self._label()[1]
+
+    @property
+    def row(self):
+        return self._label()[0]
+
+# Archive: shows past their date, with their sold seats and booking seat links, moved out of the hot
+# tables in batches by app.utils.archiver. Rows keep their original ids.
+class ArchivedShow(Base):
+    __tablename__ = "archived_shows"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    movie_id = Column(Integer, ForeignKey("movies.id"))
+    theatre_id = Column(Integer, ForeignKey("theatres.id"))
+    show_date = Column(Date, index=True)
+    show_time = Column(Time)
+    price = Column(Float)
+    layout_id = Column(Integer, ForeignKey("theatre_layouts.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    movie = relationship("Movie")
+    theatre = relationship("Theatre")
+
+class ArchivedShowSeat(Base):
+    __tablename__ = "archived_show_seats"
+    
+    show_id = Column(Integer, ForeignKey("archived_shows.id"), primary_key=True)
+    seat_id = Column(Integer, primary_key=True, autoincrement=False)
+
+class ArchivedBookingSeat(Base):
+    __tablename__ = "archived_booking_seats"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    booking_id = Column(Integer, ForeignKey("bookings.id"), index=True)
+    seat_id = Column(Integer)
 
 class Payment(Base):
     __tablename__ = "payments"
@@ -105,7 +164,69 @@ class Payment(Base):
     id = Column(Integer, primary_key=True, index=True)
     booking_id = Column(Integer, ForeignKey("bookings.id"))
     amount = Column(Float)
-    status = Column(String, default="pending")  # pending, success, failed
+    status = Column(String, default="pending")  # pending, success, failed, refund_required
     payment_method = Column(String, default="card")
     transaction_id = Column(String, unique=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, index=True)  # scope:client key
+    request_hash = Column(String)
+    status_code = Column(Integer)  # NULL while the request is in progress
+    response_body = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+class PaymentCallback(Base):
+    __tablename__ = "payment_callbacks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    transaction_id = Column(String, unique=True, index=True)  # one applied callback per transaction
+    status = Column(String)  # success or failed, as reported by the gateway
+    state = Column(String, default="queued", index=True)  # queued, processing, done, not_found
+    claimed_by = Column(String, nullable=True, index=True)
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+    enqueued_at = Column(DateTime(timezone=True))
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+    
+    id = Column(Integer, primary_key=True, index=True)  # change feed cursor
+    aggregate = Column(String, index=True)  # seat, booking, payment
+    aggregate_id = Column(String)
+    event_type = Column(String)
+    show_id = Column(Integer, nullable=True, index=True)
+    payload = Column(Text)  # JSON
+    created_at = Column(DateTime(timezone=True))
+
+class Basket(Base):
+    __tablename__ = "baskets"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    total_amount = Column(Float)
+    status = Column(String, default="pending")  # pending, confirmed, cancelled
+    transaction_id = Column(String, unique=True, nullable=True, index=True)  # the basket's single payment
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    basket_bookings = relationship("BasketBooking", back_populates="basket")
+    bookings = relationship("Booking", secondary="basket_bookings", viewonly=True)
+
+class BasketBooking(Base):
+    __tablename__ = "basket_bookings"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    basket_id = Column(Integer, ForeignKey("baskets.id"), index=True)
+    booking_id = Column(Integer, ForeignKey("bookings.id"), index=True)
+    
+    basket = relationship("Basket", back_populates="basket_bookings")
+    booking = relationship("Booking")
+
+# Each shard allocates ids from its own range (see app.sharding). SQLite only honours a raised
+# starting point through AUTOINCREMENT's sqlite_sequence; existing tables are unaffected.
+for _table in Base.metadata.tables.values():
+    if _table.autoincrement_column is not None:
+        _table.dialect_options["sqlite"]["autoincrement"] = True
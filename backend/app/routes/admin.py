@@ -0,0 +1,55 @@
+from datetime import date
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import app.schemas as schemas
+from app.sharding import get_shard_db, shard_router
+from app.utils.archiver import show_archiver
+from app.utils.seat_counters import seat_count_reconciler
+from app.utils.slow_query import slow_query_log
+
+router = APIRouter()
+
+@router.get("/admin/slow-queries", response_model=List[schemas.SlowQuery])
+def get_slow_queries(limit: int = Query(20, ge=1, le=200)):
+    """Slowest statements by total time, grouped by normalized SQL"""
+    return slow_query_log.top(limit)
+
+@router.delete("/admin/slow-queries")
+def reset_slow_queries():
+    """Clear the slow-query log"""
+    slow_query_log.reset()
+    return {"message": "Slow-query log cleared"}
+
+@router.post("/admin/archive", response_model=schemas.ArchiveReport)
+def archive_shows(before: Optional[date] = None, db: Session = Depends(get_shard_db)):
+    """Archive finished shows of one shard now (default: dated more than ARCHIVE_AFTER_DAYS ago)"""
+    return show_archiver.run_once(db, before=before)
+
+@router.get("/admin/archive/runs", response_model=List[schemas.ArchiveReport])
+def get_archive_runs():
+    """Recent archive runs, newest last"""
+    return show_archiver.history
+
+@router.post("/admin/seat-counts/reconcile", response_model=schemas.SeatCountReconcileReport)
+def reconcile_seat_counts(db: Session = Depends(get_shard_db)):
+    """Recount the available and held seats of one shard's shows now and repair any drift"""
+    return seat_count_reconciler.run_once(db)
+
+@router.get("/admin/seat-counts/runs", response_model=List[schemas.SeatCountReconcileReport])
+def get_seat_count_runs():
+    """Recent seat counter reconciliation runs, newest last"""
+    return seat_count_reconciler.history
+
+@router.get("/admin/shards", response_model=List[schemas.ShardInfo])
+def get_shards():
+    """Configured shards and the cities each one owns"""
+    return [
+        schemas.ShardInfo(
+            shard=shard,
+            database=database,
+            cities=sorted(city for city, owner in shard_router.cities.items() if owner == shard),
+            id_range_start=shard * shard_router.id_span
+        )
+        for shard, database in shard_router.describe().items()
+    ]
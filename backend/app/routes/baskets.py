@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy.orm import Session
+from typing import Optional
+import app.crud as crud
+import app.schemas as schemas
+from app.sharding import get_basket_db, routed_session, shard_router
+from app.utils.flash_sale import flash_sale_manager
+from app.utils.idempotency import idempotency_store
+from app.utils.waiting_room import optional_bearer, waiting_room_manager
+
+router = APIRouter()
+
+def basket_shard(items) -> int:
+    shards = {shard_router.for_id(item.show_id) for item in items}
+    if len(shards) > 1:
+        raise HTTPException(status_code=400, detail="A basket can only hold shows from one city")
+    return shards.pop() if shards else 0
+
+def get_basket_lock_db(basket: schemas.BasketLockRequest):
+    yield from routed_session(basket_shard(basket.items))
+
+def get_new_basket_db(basket: schemas.BasketCreate):
+    yield from routed_session(basket_shard(basket.items))
+
+def check_basket_shows(db: Session, items, x_admission_token: Optional[str], credentials: Optional[HTTPAuthorizationCredentials]):
+    if not items:
+        raise HTTPException(status_code=400, detail="Basket is empty")
+    for show_id in sorted({item.show_id for item in items}):
+        waiting_room_manager.require_admission(db, show_id, x_admission_token, credentials)
+        if flash_sale_manager.is_active(show_id):
+            raise HTTPException(status_code=409, detail=f"Show {show_id} is in flash-sale mode; book it on its own")
+
+@router.post("/baskets/lock", response_model=schemas.BasketLockResponse)
+def lock_basket(
+    basket: schemas.BasketLockRequest,
+    x_admission_token: Optional[str] = Header(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer),
+    db: Session = Depends(get_basket_lock_db)
+):
+    """Lock seats across several shows, all or nothing"""
+    check_basket_shows(db, basket.items, x_admission_token, credentials)
+    return crud.lock_basket(db=db, basket=basket)
+
+@router.post("/baskets", response_model=schemas.Basket)
+def create_basket(
+    basket: schemas.BasketCreate,
+    idempotency_key: Optional[str] = Header(None),
+    x_admission_token: Optional[str] = Header(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer),
+    db: Session = Depends(get_new_basket_db)
+):
+    """Book a locked basket in one transaction with a single payment"""
+    check_basket_shows(db, basket.items, x_admission_token, credentials)
+    
+    with idempotency_store.guard(db, "baskets", idempotency_key, basket.model_dump(mode="json")) as guard:
+        if guard.replay is not None:
+            return guard.replay
+        
+        shard_router.copy_user(db, basket.user_email)
+        db_basket = crud.create_basket(db=db, basket_data=basket)
+        if db_basket is None:
+            raise HTTPException(status_code=400, detail="Unable to book basket. Seats may not be available.")
+        
+        return guard.save(200, schemas.Basket.model_validate(db_basket).model_dump(mode="json"))
+
+@router.get("/baskets/{basket_id}", response_model=schemas.Basket)
+def get_basket(basket_id: int, db: Session = Depends(get_basket_db)):
+    """Get basket details"""
+    basket = crud.get_basket(db, basket_id=basket_id)
+    if basket is None:
+        raise HTTPException(status_code=404, detail="Basket not found")
+    return basket
@@ -1,25 +1,57 @@
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import app.crud as crud
 import app.schemas as schemas
-from app.database import get_db
+from app.sharding import get_booking_db, get_shard_db, routed_session, shard_router
+from app.utils.idempotency import idempotency_store
+from app.utils.reaper import booking_reaper
+from app.utils.flash_sale import flash_sale_manager
+from app.utils.waiting_room import optional_bearer, waiting_room_manager
 
 router = APIRouter()
 
+def get_new_booking_db(booking: schemas.BookingCreate):
+    yield from routed_session(shard_router.for_id(booking.show_id))
+
 @router.post("/bookings", response_model=schemas.Booking)
-def create_booking(booking: schemas.BookingCreate, db: Session = Depends(get_db)):
+def create_booking(
+    booking: schemas.BookingCreate,
+    idempotency_key: Optional[str] = Header(None),
+    x_admission_token: Optional[str] = Header(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer),
+    db: Session = Depends(get_new_booking_db)
+):
     """Book selected seats (must be locked)"""
-    db_booking = crud.create_booking(db=db, booking_data=booking)
-    if db_booking is None:
-        raise HTTPException(status_code=400, detail="Unable to create booking. Seats may not be available.")
-    return db_booking
+    waiting_room_manager.require_admission(db, booking.show_id, x_admission_token, credentials)
+    
+    with idempotency_store.guard(db, "bookings", idempotency_key, booking.model_dump(mode="json")) as guard:
+        if guard.replay is not None:
+            return guard.replay
+        
+        shard_router.copy_user(db, booking.user_email)
+        db_booking = flash_sale_manager.create_booking(db=db, booking_data=booking)
+        if db_booking is None:
+            raise HTTPException(status_code=400, detail="Unable to create booking. Seats may not be available.")
+        
+        return guard.save(200, schemas.Booking.model_validate(db_booking).model_dump(mode="json"))
 
 @router.get("/bookings/{booking_id}", response_model=schemas.Booking)
-def get_booking(booking_id: int, db: Session = Depends(get_db)):
+def get_booking(booking_id: int, db: Session = Depends(get_booking_db)):
     """Get booking details"""
     booking = crud.get_booking(db, booking_id=booking_id)
     if booking is None:
         raise HTTPException(status_code=404, detail="Booking not found")
     return booking
+
+@router.post("/bookings/reap", response_model=schemas.ReaperReport)
+def reap_bookings(db: Session = Depends(get_shard_db)):
+    """Run the abandoned-booking reaper now on one shard"""
+    return booking_reaper.run_once(db)
+
+@router.get("/bookings/reaper/runs", response_model=List[schemas.ReaperReport])
+def get_reaper_runs():
+    """Recent reaper runs, newest last"""
+    return booking_reaper.history
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+import app.schemas as schemas
+from app.sharding import PRIMARY_SHARD, routed_session, shard_router
+from app.utils.change_feed import read_changes, tail_changes, CHANGE_FEED_BATCH_SIZE
+
+router = APIRouter()
+
+def feed_shard(show_id: Optional[int], shard: int) -> int:
+    """A show's events are on its shard; otherwise read the shard asked for"""
+    if show_id is not None:
+        return shard_router.for_id(show_id)
+    if shard not in shard_router.engines:
+        raise HTTPException(status_code=404, detail="Shard not found")
+    return shard
+
+def get_feed_db(show_id: Optional[int] = None, shard: int = PRIMARY_SHARD):
+    yield from routed_session(feed_shard(show_id, shard))
+
+@router.get("/changes", response_model=schemas.ChangeBatch)
+def get_changes(
+    after: int = 0,
+    limit: int = Query(CHANGE_FEED_BATCH_SIZE, ge=1, le=5000),
+    aggregate: Optional[str] = None,
+    show_id: Optional[int] = None,
+    db: Session = Depends(get_feed_db)
+):
+    """Read one batch of seat/booking/payment changes after a cursor (each shard has its own feed)"""
+    return read_changes(db, after_id=after, limit=limit, aggregate=aggregate, show_id=show_id)
+
+@router.get("/changes/stream")
+def stream_changes(
+    after: int = 0,
+    aggregate: Optional[str] = None,
+    show_id: Optional[int] = None,
+    shard: int = PRIMARY_SHARD,
+    last_event_id: Optional[int] = Header(None)
+):
+    """Follow the change feed as server-sent events; reconnects resume from Last-Event-ID"""
+    cursor = last_event_id if last_event_id is not None else after
+    feed = feed_shard(show_id, shard)
+
+    def events():
+        for event in tail_changes(after_id=cursor, aggregate=aggregate, show_id=show_id, shard=feed):
+            yield f"id: {event.id}\nevent: {event.event_type}\ndata: {event.model_dump_json()}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
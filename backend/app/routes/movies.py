@@ -6,6 +6,7 @@ from datetime import date
 import app.crud as crud
 import app.schemas as schemas
 from app.database import get_db
+from app.sharding import shard_router
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,29 +16,29 @@ router = APIRouter()
 def get_movies(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get list of all movies"""
     try:
-        logger.info(f"Fetching movies with skip={skip}, limit={limit}")
+        logger.debug("Fetching movies with skip=%s, limit=%s", skip, limit)
         movies = crud.get_movies(db, skip=skip, limit=limit)
-        logger.info(f"Successfully fetched {len(movies)} movies")
+        logger.info("Successfully fetched %d movies", len(movies))
         return movies
     except Exception as e:
-        logger.error(f"Error fetching movies: {e}")
+        logger.error("Error fetching movies: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to fetch movies: {str(e)}")
 
 @router.get("/movies/{movie_id}", response_model=schemas.Movie)
 def get_movie(movie_id: int, db: Session = Depends(get_db)):
     """Get details of a specific movie"""
     try:
-        logger.info(f"Fetching movie with id={movie_id}")
+        logger.debug("Fetching movie with id=%s", movie_id)
         movie = crud.get_movie(db, movie_id=movie_id)
         if movie is None:
-            logger.warning(f"Movie with id={movie_id} not found")
+            logger.warning("Movie with id=%s not found", movie_id)
             raise HTTPException(status_code=404, detail="Movie not found")
-        logger.info(f"Successfully fetched movie: {movie.title}")
+        logger.info("Successfully fetched movie: %s", movie.title)
         return movie
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching movie {movie_id}: {e}")
+        logger.error("Error fetching movie %s: %s", movie_id, e)
         raise HTTPException(status_code=500, detail=f"Failed to fetch movie: {str(e)}")
 
 @router.get("/movies/{movie_id}/shows", response_model=List[schemas.Show])
@@ -49,29 +50,36 @@ def get_movie_shows(
 ):
     """Get all shows of a movie in a city on a specific date"""
     try:
-        logger.info(f"Fetching shows for movie_id={movie_id}, city={city}, date={date}")
+        logger.debug("Fetching shows for movie_id=%s, city=%s, date=%s", movie_id, city, date)
         movie = crud.get_movie(db, movie_id=movie_id)
         if movie is None:
-            logger.warning(f"Movie with id={movie_id} not found")
+            logger.warning("Movie with id=%s not found", movie_id)
             raise HTTPException(status_code=404, detail="Movie not found")
         
-        shows = crud.get_shows_by_movie(db, movie_id=movie_id, city=city, show_date=date)
-        logger.info(f"Successfully fetched {len(shows)} shows")
+        # Shows live on their city's shard; without a city every shard is asked
+        shows = shard_router.gather(
+            lambda shard_db: [
+                schemas.Show.model_validate(show)
+                for show in crud.get_shows_by_movie(shard_db, movie_id=movie_id, city=city, show_date=date)
+            ],
+            shards=[shard_router.for_city(city)] if city else None
+        )
+        logger.info("Successfully fetched %d shows", len(shows))
         return shows
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching shows for movie {movie_id}: {e}")
+        logger.error("Error fetching shows for movie %s: %s", movie_id, e)
         raise HTTPException(status_code=500, detail=f"Failed to fetch shows: {str(e)}")
 
 @router.post("/movies", response_model=schemas.Movie)
 def create_movie(movie: schemas.MovieCreate, db: Session = Depends(get_db)):
     """Create a new movie (for seeding data)"""
     try:
-        logger.info(f"Creating new movie: {movie.title}")
+        logger.debug("Creating new movie: %s", movie.title)
         created_movie = crud.create_movie(db=db, movie=movie)
-        logger.info(f"Successfully created movie with id={created_movie.id}")
+        logger.info("Successfully created movie with id=%s", created_movie.id)
         return created_movie
     except Exception as e:
-        logger.error(f"Error creating movie: {e}")
+        logger.error("Error creating movie: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to create movie: {str(e)}")
@@ -1,30 +1,60 @@
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
 from sqlalchemy.orm import Session
+from typing import Optional, Union
 import app.crud as crud
 import app.schemas as schemas
-from app.database import get_db
+from app.sharding import get_shard_db, get_transaction_db, routed_session, shard_router
+from app.utils.idempotency import idempotency_store
+from app.utils.payment_queue import payment_callback_queue, ASYNC_PAYMENT_CALLBACKS
 import random
 
 router = APIRouter()
 
+def get_payment_db(payment_data: schemas.PaymentInitiate):
+    yield from routed_session(shard_router.for_id(payment_data.booking_id))
+
+def get_confirm_db(payment_confirm: schemas.PaymentConfirm):
+    yield from routed_session(shard_router.for_transaction(payment_confirm.transaction_id))
+
 @router.post("/payments/initiate", response_model=schemas.Payment)
-def initiate_payment(payment_data: schemas.PaymentInitiate, db: Session = Depends(get_db)):
+def initiate_payment(
+    payment_data: schemas.PaymentInitiate,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_payment_db)
+):
     """Start a mock payment flow"""
-    # Check if booking exists
-    booking = crud.get_booking(db, booking_id=payment_data.booking_id)
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
-    
-    if booking.status != "pending":
-        raise HTTPException(status_code=400, detail="Booking is not in pending status")
-    
-    payment = crud.create_payment(db=db, payment_data=payment_data)
-    return payment
+    with idempotency_store.guard(db, "payments", idempotency_key, payment_data.model_dump(mode="json")) as guard:
+        if guard.replay is not None:
+            return guard.replay
+        
+        # Check if booking exists
+        booking = crud.get_booking(db, booking_id=payment_data.booking_id)
+        if not booking:
+            raise HTTPException(status_code=404, detail="Booking not found")
+        
+        if booking.status != "pending":
+            raise HTTPException(status_code=400, detail="Booking is not in pending status")
+        
+        payment = crud.create_payment(db=db, payment_data=payment_data)
+        return guard.save(200, schemas.Payment.model_validate(payment).model_dump(mode="json"))
+
+def enqueue_callback(db: Session, transaction_id: str, status: str, response: Response) -> schemas.PaymentCallbackAck:
+    queued = payment_callback_queue.enqueue(db, transaction_id=transaction_id, status=status)
+    response.status_code = 202
+    return schemas.PaymentCallbackAck(
+        transaction_id=transaction_id,
+        status=status,
+        queued=queued,
+        duplicate=not queued
+    )
 
-@router.post("/payments/confirm", response_model=schemas.Payment)
-def confirm_payment(payment_confirm: schemas.PaymentConfirm, db: Session = Depends(get_db)):
-    """Confirm or fail payment (mock callback logic)"""
+@router.post("/payments/confirm", response_model=Union[schemas.Payment, schemas.PaymentCallbackAck])
+def confirm_payment(payment_confirm: schemas.PaymentConfirm, response: Response, db: Session = Depends(get_confirm_db)):
+    """Confirm or fail payment (mock callback logic); queued for the callback workers when async"""
+    if ASYNC_PAYMENT_CALLBACKS:
+        return enqueue_callback(db, payment_confirm.transaction_id, payment_confirm.status, response)
+    
     payment = crud.confirm_payment(
         db=db, 
         transaction_id=payment_confirm.transaction_id, 
@@ -36,15 +66,48 @@ def confirm_payment(payment_confirm: schemas.PaymentConfirm, db: Session = Depen
     
     return payment
 
+@router.post("/payments/confirm/batch", response_model=schemas.PaymentConfirmBatchResponse)
+def confirm_payments_batch(batch: schemas.PaymentConfirmBatch):
+    """Confirm or fail many payments at once (gateway settlement reconciliation)"""
+    by_shard = {}
+    for index, confirmation in enumerate(batch.confirmations):
+        by_shard.setdefault(shard_router.for_transaction(confirmation.transaction_id), []).append((index, confirmation))
+
+    def confirm_on_shard(db: Session):
+        items = by_shard[shard_router.shard_of(db)]
+        results = crud.confirm_payments_batch(db=db, confirmations=[confirmation for _, confirmation in items])
+        return [(index, result) for (index, _), result in zip(items, results)]
+
+    # Each shard applies its own confirmations; results are put back in request order
+    results = [result for _, result in sorted(shard_router.gather(confirm_on_shard, shards=by_shard), key=lambda pair: pair[0])]
+    
+    return schemas.PaymentConfirmBatchResponse(
+        updated=sum(1 for result in results if result.outcome == "updated"),
+        unchanged=sum(1 for result in results if result.outcome == "unchanged"),
+        refund_required=sum(1 for result in results if result.outcome == "refund_required"),
+        not_found=sum(1 for result in results if result.outcome == "not_found"),
+        errors=sum(1 for result in results if result.outcome == "error"),
+        results=results
+    )
+
 @router.post("/payments/mock-callback")
-def mock_payment_callback(transaction_id: str, db: Session = Depends(get_db)):
+def mock_payment_callback(transaction_id: str, response: Response, db: Session = Depends(get_transaction_db)):
     """Mock payment gateway callback - randomly succeeds or fails"""
     # Simulate 80% success rate
     status = "success" if random.random() > 0.2 else "failed"
     
+    if ASYNC_PAYMENT_CALLBACKS:
+        ack = enqueue_callback(db, transaction_id, status, response)
+        return {"status": status, "transaction_id": transaction_id, "queued": ack.queued}
+    
     payment = crud.confirm_payment(db=db, transaction_id=transaction_id, status=status)
     
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     
     return {"status": status, "transaction_id": transaction_id}
+
+@router.get("/payments/callbacks/metrics", response_model=schemas.PaymentQueueMetrics)
+def payment_callback_metrics(db: Session = Depends(get_shard_db)):
+    """Queue depth and lag of asynchronous payment callbacks on one shard"""
+    return payment_callback_queue.metrics(db)
@@ -1,24 +1,44 @@
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import app.crud as crud
+import app.models as models
 import app.schemas as schemas
-from app.database import get_db
+from app.sharding import get_show_db, routed_session, shard_router
+from app.utils.flash_sale import flash_sale_manager
+from app.utils.metrics import metrics_registry
+from app.utils.schedule_cache import schedule_cache
+from app.utils.startup import worker_count
+from app.utils.waiting_room import optional_bearer, waiting_room_manager
 
 router = APIRouter()
 
+def get_new_show_db(show: schemas.ShowCreate):
+    yield from routed_session(shard_router.for_id(show.theatre_id))
+
+def get_lock_db(lock_request: schemas.SeatLockRequest):
+    yield from routed_session(shard_router.for_id(lock_request.show_id))
+
 @router.get("/shows/{show_id}", response_model=schemas.Show)
-def get_show(show_id: int, db: Session = Depends(get_db)):
-    """Get show details"""
-    show = crud.get_show(db, show_id=show_id)
+def get_show(show_id: int, db: Session = Depends(get_show_db)):
+    """Get show details (finished shows are read from the archive)"""
+    show = crud.get_show(db, show_id=show_id) or crud.get_archived_show(db, show_id=show_id)
     if show is None:
         raise HTTPException(status_code=404, detail="Show not found")
     return show
 
 @router.get("/shows/{show_id}/seats", response_model=List[schemas.Seat])
-def get_show_seats(show_id: int, db: Session = Depends(get_db)):
+def get_show_seats(
+    show_id: int,
+    x_admission_token: Optional[str] = Header(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer),
+    db: Session = Depends(get_show_db)
+):
     """Get seat layout and availability for a show"""
+    waiting_room_manager.require_admission(db, show_id, x_admission_token, credentials)
+    
     show = crud.get_show(db, show_id=show_id)
     if show is None:
         raise HTTPException(status_code=404, detail="Show not found")
@@ -29,17 +49,80 @@ def get_show_seats(show_id: int, db: Session = Depends(get_db)):
     seats = crud.get_seats_by_show(db, show_id=show_id)
     return seats
 
+@router.post("/shows/{show_id}/seats/best-available", response_model=schemas.BestAvailableResponse)
+def lock_best_available_seats(
+    show_id: int,
+    request: schemas.BestAvailableRequest,
+    count: int = Query(..., ge=1, le=20),
+    x_admission_token: Optional[str] = Header(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer),
+    db: Session = Depends(get_show_db)
+):
+    """Find and lock the best block of adjacent seats in one request"""
+    waiting_room_manager.require_admission(db, show_id, x_admission_token, credentials)
+    
+    result = flash_sale_manager.lock_best_available(db, show_id=show_id, count=count, user_session=request.user_session)
+    if result is not None:
+        return result
+    
+    if crud.get_show(db, show_id=show_id) is None:
+        raise HTTPException(status_code=404, detail="Show not found")
+    
+    return crud.lock_best_available(db, show_id=show_id, count=count, user_session=request.user_session)
+
 @router.post("/shows", response_model=schemas.Show)
-def create_show(show: schemas.ShowCreate, db: Session = Depends(get_db)):
-    """Create a new show (for seeding data)"""
-    return crud.create_show(db=db, show=show)
+def create_show(show: schemas.ShowCreate, db: Session = Depends(get_new_show_db)):
+    """Create a new show (for seeding data); it lives on its theatre's shard"""
+    shard_router.copy_reference(db, models.Movie, show.movie_id)
+    db_show = crud.create_show(db=db, show=show)
+    schedule_cache.invalidate(db_show.theatre_id, db_show.show_date)
+    return db_show
 
 @router.post("/seats/lock", response_model=schemas.SeatLockResponse)
-def lock_seats(lock_request: schemas.SeatLockRequest, db: Session = Depends(get_db)):
+def lock_seats(
+    lock_request: schemas.SeatLockRequest,
+    x_admission_token: Optional[str] = Header(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer),
+    db: Session = Depends(get_lock_db)
+):
     """Lock selected seats for a short time"""
-    return crud.lock_seats(
-        db=db, 
-        show_id=lock_request.show_id, 
-        seat_ids=lock_request.seat_ids, 
+    waiting_room_manager.require_admission(db, lock_request.show_id, x_admission_token, credentials)
+    
+    mode = "flash_sale"
+    result = flash_sale_manager.lock_seats(
+        show_id=lock_request.show_id,
+        seat_ids=lock_request.seat_ids,
         user_session=lock_request.user_session
     )
+    if result is None:
+        mode = "database"
+        result = crud.lock_seats(
+            db=db, 
+            show_id=lock_request.show_id, 
+            seat_ids=lock_request.seat_ids, 
+            user_session=lock_request.user_session
+        )
+    
+    metrics_registry.seat_locks.inc((mode, "locked" if result.success else "conflict"))
+    return result
+
+@router.post("/shows/{show_id}/flash-sale", response_model=schemas.FlashSaleStatus)
+def enable_flash_sale(show_id: int, db: Session = Depends(get_show_db)):
+    """Serialize seat claims for this show through an in-memory single writer"""
+    if worker_count() > 1:
+        # Other workers would keep claiming seats through the database, around the writer
+        raise HTTPException(status_code=409, detail="Flash-sale mode needs a single worker (serve.py --workers 1)")
+    if not flash_sale_manager.enable(db, show_id):
+        raise HTTPException(status_code=404, detail="Show not found")
+    return flash_sale_manager.status(show_id)
+
+@router.delete("/shows/{show_id}/flash-sale", response_model=schemas.FlashSaleStatus)
+def disable_flash_sale(show_id: int):
+    """Return the show to regular per-request transactions"""
+    flash_sale_manager.disable(show_id)
+    return flash_sale_manager.status(show_id)
+
+@router.get("/shows/{show_id}/flash-sale", response_model=schemas.FlashSaleStatus)
+def get_flash_sale(show_id: int):
+    """Flash-sale state and claim counters for a show"""
+    return flash_sale_manager.status(show_id)
@@ -1,20 +1,48 @@
 
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import app.crud as crud
 import app.schemas as schemas
-from app.database import get_db
+from app.sharding import get_theatre_db, routed_session, shard_router
+from app.utils.schedule_cache import SCHEDULE_MAX_DAYS, schedule_cache
 
 router = APIRouter()
 
+def get_city_db(city: str):
+    yield from routed_session(shard_router.for_city(city))
+
+def get_new_theatre_db(theatre: schemas.TheatreCreate):
+    yield from routed_session(shard_router.for_city(theatre.city))
+
 @router.get("/theatres", response_model=List[schemas.Theatre])
-def get_theatres(city: str, db: Session = Depends(get_db)):
+def get_theatres(city: str, db: Session = Depends(get_city_db)):
     """List all theatres in a given city"""
     theatres = crud.get_theatres_by_city(db, city=city)
     return theatres
 
 @router.post("/theatres", response_model=schemas.Theatre)
-def create_theatre(theatre: schemas.TheatreCreate, db: Session = Depends(get_db)):
-    """Create a new theatre (for seeding data)"""
+def create_theatre(theatre: schemas.TheatreCreate, db: Session = Depends(get_new_theatre_db)):
+    """Create a new theatre (for seeding data) on its city's shard"""
     return crud.create_theatre(db=db, theatre=theatre)
+
+@router.get("/theatres/{theatre_id}/schedule", response_model=schemas.TheatreSchedule)
+def get_theatre_schedule(
+    theatre_id: int,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_theatre_db)
+):
+    """Shows at a theatre grouped by date and movie, with seat availability (default: the next 7 days)"""
+    from_date = from_date or date.today()
+    to_date = to_date or from_date + timedelta(days=6)
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (to_date - from_date).days >= SCHEDULE_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"A schedule covers at most {SCHEDULE_MAX_DAYS} days")
+    schedule = schedule_cache.get(db, theatre_id, from_date, to_date)
+    # Only an empty schedule needs the extra lookup to tell an idle theatre from an unknown one
+    if not schedule.days and crud.get_theatre(db, theatre_id=theatre_id) is None:
+        raise HTTPException(status_code=404, detail="Theatre not found")
+    return schedule
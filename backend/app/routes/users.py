@@ -3,13 +3,13 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import List
-from jose import JWTError, jwt
 from datetime import datetime, timedelta
 import os
 import logging
 import app.crud as crud
 import app.schemas as schemas
 from app.database import get_db
+from app.sharding import shard_router
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -20,6 +20,7 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
 def create_access_token(data: dict):
+    from jose import jwt  # deferred: python-jose pulls in cryptography
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
@@ -32,6 +33,7 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -49,19 +51,19 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
 def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """Register a new user"""
     try:
-        logger.info(f"Registration attempt for email: {user.email}")
+        logger.debug("Registration attempt for email: %s", user.email)
         
         # Check if user already exists
         db_user = crud.get_user_by_email(db, email=user.email)
         if db_user:
-            logger.warning(f"User with email {user.email} already exists")
+            logger.warning("User with email %s already exists", user.email)
             raise HTTPException(
                 status_code=400, 
                 detail="Email already registered"
             )
         
         created_user = crud.create_user(db=db, user=user)
-        logger.info(f"User created successfully: {created_user.email}")
+        logger.info("User created successfully: %s", created_user.email)
         
         access_token = create_access_token(data={"sub": created_user.email})
         
@@ -73,7 +75,7 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating user: {str(e)}")
+        logger.error("Error creating user: %s", e)
         db.rollback()
         raise HTTPException(
             status_code=500,
@@ -84,18 +86,18 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 def login_user(login_data: schemas.UserLogin, db: Session = Depends(get_db)):
     """Login user"""
     try:
-        logger.info(f"Login attempt for email: {login_data.email}")
+        logger.debug("Login attempt for email: %s", login_data.email)
         
         user = crud.authenticate_user(db, login_data.email, login_data.password)
         if not user:
-            logger.warning(f"Authentication failed for email: {login_data.email}")
+            logger.warning("Authentication failed for email: %s", login_data.email)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        logger.info(f"User authenticated successfully: {user.email}")
+        logger.info("User authenticated successfully: %s", user.email)
         access_token = create_access_token(data={"sub": user.email})
         return {
             "access_token": access_token,
@@ -105,30 +107,36 @@ def login_user(login_data: schemas.UserLogin, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error during login: {str(e)}")
+        logger.error("Error during login: %s", e)
         raise HTTPException(
             status_code=500,
             detail="Login failed"
         )
 
 @router.get("/users/{user_id}/bookings", response_model=List[schemas.Booking])
-def get_user_bookings(user_id: int, current_user: schemas.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get all bookings for a user"""
+def get_user_bookings(user_id: int, current_user: schemas.User = Depends(get_current_user)):
+    """Get all bookings for a user, oldest first"""
     try:
         if current_user.id != user_id:
             raise HTTPException(status_code=403, detail="Not authorized to access these bookings")
         
-        bookings = crud.get_user_bookings(db, user_id=user_id)
-        logger.info(f"Fetched {len(bookings)} bookings for user {user_id}")
+        # A user books in any city, so every shard is asked and the results merged
+        bookings = sorted(
+            shard_router.gather(lambda db: [
+                schemas.Booking.model_validate(booking) for booking in crud.get_user_bookings(db, user_id=user_id)
+            ]),
+            key=lambda booking: (booking.created_at, booking.id)
+        )
+        logger.info("Fetched %d bookings for user %s", len(bookings), user_id)
         return bookings
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching bookings for user {user_id}: {e}")
+        logger.error("Error fetching bookings for user %s: %s", user_id, e)
         raise HTTPException(status_code=500, detail="Failed to fetch bookings")
 
 @router.get("/users/me", response_model=schemas.User)
 def get_current_user_info(current_user: schemas.User = Depends(get_current_user)):
     """Get current user information"""
-    logger.info(f"Getting current user info for: {current_user.email}")
+    logger.debug("Getting current user info for: %s", current_user.email)
     return current_user
@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+import app.crud as crud
+import app.models as models
+import app.schemas as schemas
+from app.database import get_db
+from app.routes.users import get_current_user
+from app.sharding import shard_router
+from app.utils.startup import worker_count
+from app.utils.waiting_room import waiting_room_manager
+
+router = APIRouter()
+
+def get_room(scope: str, target_id: int):
+    room = waiting_room_manager.get(scope, target_id)
+    if room is None:
+        raise HTTPException(status_code=404, detail="No active waiting room")
+    return room
+
+@router.post("/waiting-rooms", response_model=schemas.WaitingRoomStatus)
+def open_waiting_room(room_data: schemas.WaitingRoomCreate, db: Session = Depends(get_db)):
+    """Put a show or every show of a movie behind a waiting room"""
+    if worker_count() > 1:
+        # Rooms and queue positions live in this process; other workers would not enforce them
+        raise HTTPException(status_code=409, detail="Waiting rooms need a single worker (serve.py --workers 1)")
+    if room_data.scope == "show":
+        show_db = shard_router.session(shard_router.for_id(room_data.target_id))
+        try:
+            exists = crud.get_show(show_db, show_id=room_data.target_id) is not None
+        finally:
+            show_db.close()
+    elif room_data.scope == "movie":
+        exists = crud.get_movie(db, movie_id=room_data.target_id) is not None
+    else:
+        raise HTTPException(status_code=400, detail="scope must be 'show' or 'movie'")
+    if not exists:
+        raise HTTPException(status_code=404, detail=f"{room_data.scope.title()} not found")
+    
+    room = waiting_room_manager.open(room_data.scope, room_data.target_id, room_data.admit_per_second, room_data.burst)
+    return waiting_room_manager.status(room)
+
+@router.get("/waiting-rooms/{scope}/{target_id}", response_model=schemas.WaitingRoomStatus)
+def get_waiting_room(scope: str, target_id: int):
+    """Waiting room settings and progress"""
+    return waiting_room_manager.status(get_room(scope, target_id))
+
+@router.delete("/waiting-rooms/{scope}/{target_id}")
+def close_waiting_room(scope: str, target_id: int):
+    """Let everyone in again"""
+    if not waiting_room_manager.close(scope, target_id):
+        raise HTTPException(status_code=404, detail="No active waiting room")
+    return {"closed": f"{scope}:{target_id}"}
+
+@router.post("/waiting-rooms/{scope}/{target_id}/join", response_model=schemas.WaitingRoomTicket)
+def join_waiting_room(scope: str, target_id: int, current_user: models.User = Depends(get_current_user)):
+    """Take a queue position (the tokens issued only work for this user)"""
+    return waiting_room_manager.join(get_room(scope, target_id), current_user.id)
+
+@router.get("/waiting-rooms/position", response_model=schemas.WaitingRoomPosition)
+def get_position(queue_token: str):
+    """Check a queue position; includes an admission token once admitted"""
+    position = waiting_room_manager.position(queue_token)
+    if position is None:
+        raise HTTPException(status_code=404, detail="Queue token is invalid or its waiting room has closed")
+    return position
@@ -1,7 +1,7 @@
 
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, date, time
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 # Movie schemas
 class MovieBase(BaseModel):
@@ -30,11 +30,17 @@ class TheatreBase(BaseModel):
     address: str
     total_seats: int = 100
 
+class SeatRow(BaseModel):
+    row: str
+    seats: List[str]  # seat labels, left to right
+    category: str = "standard"
+
 class TheatreCreate(TheatreBase):
-    pass
+    layout: Optional[List[SeatRow]] = None  # front row first; defaults to rows of 20 seats holding total_seats
 
 class Theatre(TheatreBase):
     id: int
+    layout_id: Optional[int] = None
     created_at: datetime
     
     class Config:
@@ -53,6 +59,8 @@ class ShowCreate(ShowBase):
 
 class Show(ShowBase):
     id: int
+    available_count: Optional[int] = None  # None for archived shows
+    held_count: Optional[int] = None
     created_at: datetime
     movie: Optional[Movie] = None
     theatre: Optional[Theatre] = None
@@ -60,14 +68,43 @@ class Show(ShowBase):
     class Config:
         from_attributes = True
 
+# Theatre schedule schemas
+class ScheduleShow(BaseModel):
+    show_id: int
+    show_time: time
+    price: float
+    total_seats: int
+    available_count: int
+    held_count: int
+
+class ScheduleMovie(BaseModel):
+    movie_id: int
+    title: str
+    duration: int
+    rating: str
+    poster_url: Optional[str] = None
+    available_count: int  # across this movie's shows on the day
+    shows: List[ScheduleShow]
+
+class ScheduleDay(BaseModel):
+    show_date: date
+    movies: List[ScheduleMovie]
+
+class TheatreSchedule(BaseModel):
+    theatre_id: int
+    from_date: date
+    to_date: date
+    days: List[ScheduleDay]  # only days with shows
+
 # Seat schemas
 class SeatBase(BaseModel):
     seat_number: str
     row: str
 
 class Seat(SeatBase):
-    id: int
+    id: int  # position in the show's layout
     show_id: int
+    category: str = "standard"
     is_booked: bool
     is_locked: bool
     locked_until: Optional[datetime] = None
@@ -75,6 +112,44 @@ class Seat(SeatBase):
     class Config:
         from_attributes = True
 
+class FlashSaleStatus(BaseModel):
+    show_id: int
+    active: bool
+    queued_claims: int = 0
+    claims_total: int = 0
+    commits_total: int = 0
+    seats_available: Optional[int] = None
+
+# Waiting room schemas
+class WaitingRoomCreate(BaseModel):
+    scope: str  # show or movie
+    target_id: int
+    admit_per_second: float = 10.0
+    burst: int = 100
+
+class WaitingRoomStatus(BaseModel):
+    room: str
+    scope: str
+    target_id: int
+    admit_per_second: float
+    burst: int
+    joined: int
+    admitted_through: int
+
+class WaitingRoomTicket(BaseModel):
+    room: str
+    position: int
+    queue_token: str
+
+class WaitingRoomPosition(BaseModel):
+    room: str
+    position: int
+    admitted_through: int
+    ahead: int
+    estimated_wait_seconds: Optional[float] = None
+    admitted: bool
+    admission_token: Optional[str] = None
+
 # User schemas
 class UserBase(BaseModel):
     email: EmailStr
@@ -96,6 +171,7 @@ class BookingCreate(BaseModel):
     show_id: int
     seat_ids: List[int]
     user_email: str
+    user_session: Optional[str] = None  # session holding the seat locks
 
 class BookingSeat(BaseModel):
     seat_id: int
@@ -119,6 +195,39 @@ class Booking(BaseModel):
     class Config:
         from_attributes = True
 
+# Basket schemas
+class BasketItem(BaseModel):
+    show_id: int
+    seat_ids: List[int]
+
+class BasketLockRequest(BaseModel):
+    items: List[BasketItem]
+    user_session: str
+
+class BasketLockResponse(BaseModel):
+    success: bool
+    items: List[BasketItem]
+    expires_at: datetime
+    message: str
+
+class BasketCreate(BaseModel):
+    items: List[BasketItem]
+    user_email: str
+    user_session: str
+    payment_method: str = "card"
+
+class Basket(BaseModel):
+    id: int
+    user_id: int
+    total_amount: float
+    status: str
+    transaction_id: Optional[str] = None
+    created_at: datetime
+    bookings: List[Booking] = []
+    
+    class Config:
+        from_attributes = True
+
 # Seat lock schemas
 class SeatLockRequest(BaseModel):
     show_id: int
@@ -131,6 +240,72 @@ class SeatLockResponse(BaseModel):
     expires_at: datetime
     message: str
 
+class BestAvailableRequest(BaseModel):
+    user_session: str
+
+class AllocatedSeat(SeatBase):
+    id: int
+    
+    class Config:
+        from_attributes = True
+
+class BestAvailableResponse(SeatLockResponse):
+    seats: List[AllocatedSeat] = []
+
+class ReaperReport(BaseModel):
+    started_at: datetime
+    duration_ms: float
+    expired_bookings: int
+    seats_reclaimed: int
+    shows_affected: int
+    batches: int
+
+class ArchiveReport(BaseModel):
+    started_at: datetime
+    duration_ms: float
+    before: date  # shows dated before this were archived
+    shows_archived: int
+    seats_archived: int
+    booking_seats_archived: int
+    batches: int
+
+class SeatCountReconcileReport(BaseModel):
+    started_at: datetime
+    duration_ms: float
+    shows_checked: int
+    shows_repaired: int  # shows whose counters had drifted from their show_seats rows
+
+class ShardInfo(BaseModel):
+    shard: int  # 0 is the primary
+    database: str  # URL with the password masked
+    cities: List[str]  # lower-cased; unlisted cities live on the primary
+    id_range_start: int
+
+class SlowQuery(BaseModel):
+    statement: str  # normalized SQL
+    count: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    last_seen: datetime
+    parameter_shape: str
+    origins: Dict[str, int]
+    plan: Optional[List[str]] = None
+
+# Change feed schemas
+class ChangeEvent(BaseModel):
+    id: int
+    aggregate: str
+    aggregate_id: str
+    event_type: str
+    show_id: Optional[int] = None
+    payload: dict
+    created_at: datetime
+
+class ChangeBatch(BaseModel):
+    events: List[ChangeEvent]
+    next_cursor: int
+
 # Payment schemas
 class PaymentInitiate(BaseModel):
     booking_id: int
@@ -141,9 +316,42 @@ class PaymentConfirm(BaseModel):
     transaction_id: str
     status: str  # success or failed
 
+class PaymentConfirmBatch(BaseModel):
+    confirmations: List[PaymentConfirm]
+
+class PaymentConfirmResult(BaseModel):
+    transaction_id: str
+    status: str
+    outcome: str  # updated, unchanged (already settled), refund_required, not_found, error
+
+class PaymentConfirmBatchResponse(BaseModel):
+    updated: int
+    unchanged: int
+    refund_required: int
+    not_found: int
+    errors: int
+    results: List[PaymentConfirmResult]
+
+class PaymentCallbackAck(BaseModel):
+    transaction_id: str
+    status: str
+    queued: bool
+    duplicate: bool = False
+
+class PaymentQueueMetrics(BaseModel):
+    depth: int
+    processing: int
+    lag_seconds: float
+    workers: int
+    enqueued_total: int
+    duplicates_total: int
+    processed_total: int
+    not_found_total: int
+    batches_total: int
+
 class Payment(BaseModel):
     id: int
-    booking_id: int
+    booking_id: Optional[int] = None  # None for basket payments
     amount: float
     status: str
     payment_method: str
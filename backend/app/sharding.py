@@ -0,0 +1,229 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, TypeVar
+import os
+from fastapi import HTTPException, Query
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+import app.crud as crud
+import app.models as models
+from app.database import Base, SessionLocal, create_db_engine, engine, redacted_database_url
+from app.utils import tracing
+
+PRIMARY_SHARD = 0  # DATABASE_URL: users, movies, and every city without a shard of its own
+# shard=url pairs, e.g. "1=postgresql://db-west/booking,2=sqlite:///./shard2.db"
+SHARD_URLS = os.getenv("SHARD_URLS", "")
+# city=shard pairs, e.g. "Mumbai=1,Pune=1,Delhi=2"; unlisted cities stay on the primary
+SHARD_CITIES = os.getenv("SHARD_CITIES", "")
+# Shard N allocates ids from N * SHARD_ID_SPAN up, so any theatre, show, booking, basket or payment id
+# names its shard. 21 shards fit in a 32-bit id column.
+SHARD_ID_SPAN = int(os.getenv("SHARD_ID_SPAN", "100000000"))
+TRANSACTION_ID_PREFIX = "s"  # transaction ids of shard N > 0 read "sN-<uuid>"
+
+T = TypeVar("T")
+
+def parse_pairs(value: str) -> Dict[str, str]:
+    pairs = {}
+    for item in value.split(","):
+        key, _, setting = item.partition("=")
+        if key.strip() and setting.strip():
+            pairs[key.strip()] = setting.strip()
+    return pairs
+
+class ShardRouter:
+    """
+    Routes city-partitioned data (theatres, shows, seats, bookings, baskets, payments) to the
+    database owning the city. Users and movies live on the primary; a shard gets a reference
+    copy of a row when one of its rows needs it (a show's movie, a booking's user).
+    """
+
+    def __init__(self, urls: Dict[int, str], cities: Dict[str, int], id_span: int = SHARD_ID_SPAN):
+        self.id_span = id_span
+        self.engines: Dict[int, Engine] = {PRIMARY_SHARD: engine}
+        self.sessionmakers: Dict[int, sessionmaker] = {PRIMARY_SHARD: SessionLocal}
+        for shard, url in sorted(urls.items()):
+            if shard != PRIMARY_SHARD:
+                self.engines[shard] = create_db_engine(url)
+                self.sessionmakers[shard] = sessionmaker(
+                    autocommit=False, autoflush=False, bind=self.engines[shard],
+                    info={"shard": shard, "transaction_prefix": self.transaction_prefix(shard)}
+                )
+        unknown = {city: shard for city, shard in cities.items() if shard not in self.engines}
+        if unknown:
+            raise ValueError(f"SHARD_CITIES names shards without a SHARD_URLS entry: {unknown}")
+        self.cities = {city.casefold(): shard for city, shard in cities.items()}
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def shards(self) -> List[int]:
+        return list(self.engines)
+
+    def for_city(self, city: str) -> int:
+        return self.cities.get(city.casefold(), PRIMARY_SHARD)
+
+    def for_id(self, entity_id: int) -> int:
+        """Shard whose id range holds entity_id (ids outside every configured range fall to the primary)"""
+        shard = entity_id // self.id_span if entity_id > 0 else PRIMARY_SHARD
+        return shard if shard in self.engines else PRIMARY_SHARD
+
+    def for_transaction(self, transaction_id: str) -> int:
+        prefix, _, rest = transaction_id.partition("-")
+        if rest and prefix.startswith(TRANSACTION_ID_PREFIX) and prefix[1:].isdigit() and int(prefix[1:]) in self.engines:
+            return int(prefix[1:])
+        return PRIMARY_SHARD
+
+    def transaction_prefix(self, shard: int) -> str:
+        return f"{TRANSACTION_ID_PREFIX}{shard}-" if shard != PRIMARY_SHARD else ""
+
+    def session(self, shard: int = PRIMARY_SHARD) -> Session:
+        return self.sessionmakers[shard]()
+
+    @staticmethod
+    def shard_of(db: Session) -> int:
+        return db.info.get("shard", PRIMARY_SHARD)
+
+    def gather(self, fn: Callable[[Session], List[T]], shards: Optional[Iterable[int]] = None) -> List[T]:
+        """
+        Scatter fn over shards (in parallel when there are several) and concatenate the results.
+        fn gets its own session, closed afterwards, so it must return detached values (schemas).
+        Worker threads run in a copy of the caller's context, keeping its trace and query stats.
+        """
+        shards = list(self.shards if shards is None else shards)
+
+        def run(shard: int) -> List[T]:
+            db = self.session(shard)
+            try:
+                return fn(db)
+            finally:
+                db.close()
+
+        if len(shards) == 1:
+            return run(shards[0])
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=len(self.engines), thread_name_prefix="shard-gather")
+        # One context copy per call: a copy cannot be entered by two threads at once
+        futures = [self.executor.submit(tracing.bind_context(run), shard) for shard in shards]
+        return [item for future in futures for item in future.result()]
+
+    def copy_reference(self, db: Session, model, row_id: int):
+        """Copy a primary-owned row (same id) into db's shard unless it is already there"""
+        if self.shard_of(db) == PRIMARY_SHARD:
+            return
+        primary = self.session(PRIMARY_SHARD)
+        try:
+            row = primary.get(model, row_id)
+            values = {column.key: getattr(row, column.key) for column in model.__table__.columns} if row else None
+        finally:
+            primary.close()
+        if values is None:
+            return
+        if model is models.User:
+            values["hashed_password"] = ""  # shards never authenticate
+        crud.insert_ignoring_conflicts(db, model, [values])
+        db.commit()
+
+    def copy_user(self, db: Session, email: str):
+        if self.shard_of(db) == PRIMARY_SHARD:
+            return
+        primary = self.session(PRIMARY_SHARD)
+        try:
+            user = crud.get_user_by_email(primary, email=email)
+            user_id = user.id if user else None
+        finally:
+            primary.close()
+        if user_id is not None:
+            self.copy_reference(db, models.User, user_id)
+
+    def reserve_id_ranges(self):
+        """Move every shard's id counters to the start of its range (idempotent)"""
+        for shard, shard_engine in self.engines.items():
+            if shard != PRIMARY_SHARD:
+                reserve_id_range(shard_engine, shard * self.id_span)
+
+    def describe(self) -> Dict[int, str]:
+        return {
+            shard: redacted_database_url() if shard == PRIMARY_SHARD else shard_engine.url.render_as_string(hide_password=True)
+            for shard, shard_engine in self.engines.items()
+        }
+
+def reserve_id_range(shard_engine: Engine, base: int):
+    tables = [table for table in Base.metadata.sorted_tables if table.autoincrement_column is not None]
+    with shard_engine.begin() as connection:
+        existing = set(inspect(connection).get_table_names())
+        for table in tables:
+            if table.name not in existing:
+                continue
+            if shard_engine.dialect.name == "sqlite":
+                ddl = connection.execute(
+                    text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name}
+                ).scalar()
+                if "AUTOINCREMENT" not in ddl.upper():
+                    raise RuntimeError(f"Shard table {table.name} was created without AUTOINCREMENT; "
+                                       "create shard databases with python migrate.py")
+                current = connection.execute(
+                    text("SELECT seq FROM sqlite_sequence WHERE name = :name"), {"name": table.name}
+                ).scalar()
+                if current is None:
+                    connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :base)"),
+                                       {"name": table.name, "base": base})
+                elif current < base:
+                    connection.execute(text("UPDATE sqlite_sequence SET seq = :base WHERE name = :name"),
+                                       {"name": table.name, "base": base})
+            elif shard_engine.dialect.name == "postgresql":
+                sequence = connection.execute(
+                    text("SELECT pg_get_serial_sequence(:table, :column)"),
+                    {"table": table.name, "column": table.autoincrement_column.name}
+                ).scalar()
+                if sequence and connection.execute(text(f"SELECT last_value FROM {sequence}")).scalar() < base:
+                    connection.execute(text("SELECT setval(:sequence, :base)"), {"sequence": sequence, "base": base})
+
+def migrate_shards(target: Optional[int] = None) -> Dict[int, list]:
+    """Apply pending migrations on the primary and every shard, then reserve the shards' id ranges"""
+    from app.migrations import migrate
+    applied = {shard: migrate(shard_engine, target) for shard, shard_engine in shard_router.engines.items()}
+    shard_router.reserve_id_ranges()
+    return applied
+
+def ensure_shard_schemas() -> bool:
+    """Startup check (see migrations.ensure_schema) on the primary and every shard"""
+    from app.migrations import ensure_schema
+    ready = all([ensure_schema(shard_engine) for shard_engine in shard_router.engines.values()])
+    if ready:
+        shard_router.reserve_id_ranges()
+    return ready
+
+def routed_session(shard: int):
+    db = shard_router.session(shard)
+    try:
+        # As get_db: surface a saturated pool here, as a 503
+        db.connection()
+        yield db
+    finally:
+        db.close()
+
+# FastAPI dependencies: a session on the shard owning the request's entity
+def get_show_db(show_id: int):
+    yield from routed_session(shard_router.for_id(show_id))
+
+def get_booking_db(booking_id: int):
+    yield from routed_session(shard_router.for_id(booking_id))
+
+def get_basket_db(basket_id: int):
+    yield from routed_session(shard_router.for_id(basket_id))
+
+def get_theatre_db(theatre_id: int):
+    yield from routed_session(shard_router.for_id(theatre_id))
+
+def get_transaction_db(transaction_id: str):
+    yield from routed_session(shard_router.for_transaction(transaction_id))
+
+def get_shard_db(shard: int = Query(PRIMARY_SHARD, description="Shard to operate on (0 is the primary)")):
+    if shard not in shard_router.engines:
+        raise HTTPException(status_code=404, detail="Shard not found")
+    yield from routed_session(shard)
+
+# Global instance for the application
+shard_router = ShardRouter(
+    {int(shard): url for shard, url in parse_pairs(SHARD_URLS).items()},
+    {city: int(shard) for city, shard in parse_pairs(SHARD_CITIES).items()}
+)
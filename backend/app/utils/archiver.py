@@ -0,0 +1,65 @@
+from datetime import date, datetime, timedelta
+from typing import Optional
+import logging
+import os
+import time
+from sqlalchemy.orm import Session
+import app.crud as crud
+import app.schemas as schemas
+from app.utils.periodic_job import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "1"))  # days a show stays in the hot tables after its date
+ARCHIVE_MAX_BATCHES = int(os.getenv("ARCHIVE_MAX_BATCHES", "50"))  # per run
+
+class ShowArchiver(PeriodicJob[schemas.ArchiveReport]):
+    """
+    Periodically moves finished shows, their sold seats and booking seat links into the
+    archive tables, one bounded batch of shows per transaction. Another worker archiving
+    the same batch loses on the archive primary keys and rolls back.
+    """
+
+    name = "show-archiver"
+
+    def __init__(self, interval_seconds: int = ARCHIVE_INTERVAL_SECONDS, after_days: int = ARCHIVE_AFTER_DAYS,
+                 batch_size: int = crud.ARCHIVE_BATCH_SIZE, max_batches: int = ARCHIVE_MAX_BATCHES):
+        super().__init__(interval_seconds)
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+
+    def run_once(self, db: Session, before: Optional[date] = None) -> schemas.ArchiveReport:
+        started_at = datetime.utcnow()
+        start = time.perf_counter()
+        before = before or started_at.date() - timedelta(days=self.after_days)
+
+        totals = {"shows": 0, "seats": 0, "booking_seats": 0}
+        batches = 0
+        for _ in range(self.max_batches):
+            moved = crud.archive_past_shows(db, before=before, batch_size=self.batch_size)
+            if not moved["shows"]:
+                break
+            for key in totals:
+                totals[key] += moved[key]
+            batches += 1
+
+        report = schemas.ArchiveReport(
+            started_at=started_at,
+            duration_ms=(time.perf_counter() - start) * 1000,
+            before=before,
+            shows_archived=totals["shows"],
+            seats_archived=totals["seats"],
+            booking_seats_archived=totals["booking_seats"],
+            batches=batches
+        )
+        self.record(report)
+        if totals["shows"]:
+            logger.info("Archived %d shows dated before %s (%d seats, %d booking seats) in %d batches",
+                        totals["shows"], before, totals["seats"], totals["booking_seats"], batches)
+        return report
+
+# Global instance for the application
+show_archiver = ShowArchiver()
@@ -0,0 +1,115 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+import json
+import os
+import threading
+import time
+from sqlalchemy import exists
+from sqlalchemy.orm import Session, aliased
+import app.models as models
+import app.schemas as schemas
+from app.sharding import PRIMARY_SHARD, shard_router
+
+CHANGE_FEED_BATCH_SIZE = int(os.getenv("CHANGE_FEED_BATCH_SIZE", "500"))
+CHANGE_FEED_POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "0.5"))
+# Ids can commit out of order; hold back at a gap for this long after this process first saw it
+CHANGE_FEED_GAP_GRACE_SECONDS = float(os.getenv("CHANGE_FEED_GAP_GRACE_SECONDS", "2"))
+CHANGE_FEED_MAX_TRACKED_GAPS = 10000
+
+class GapTracker:
+    """
+    When this process first saw each id gap, per shard. A gap is timed from that first sighting,
+    not from the neighbouring rows' created_at (set before their commit, so a slow transaction
+    could outlive its grace before any reader saw it).
+    """
+
+    def __init__(self, grace_seconds: float = CHANGE_FEED_GAP_GRACE_SECONDS):
+        self.grace_seconds = grace_seconds
+        self.first_seen: Dict[Tuple[int, int], float] = {}
+        self.lock = threading.Lock()
+
+    def expired(self, shard: int, missing_id: int) -> bool:
+        """True once the gap at missing_id has been open for the grace period"""
+        now = time.monotonic()
+        with self.lock:
+            first_seen = self.first_seen.setdefault((shard, missing_id), now)
+            if len(self.first_seen) > CHANGE_FEED_MAX_TRACKED_GAPS:
+                # Long-expired gaps are skipped by every cursor; forget them
+                horizon = now - max(60.0, 10 * self.grace_seconds)
+                self.first_seen = {key: seen for key, seen in self.first_seen.items() if seen >= horizon}
+        return now - first_seen >= self.grace_seconds
+
+def to_change_event(event: models.OutboxEvent) -> schemas.ChangeEvent:
+    return schemas.ChangeEvent(
+        id=event.id,
+        aggregate=event.aggregate,
+        aggregate_id=event.aggregate_id,
+        event_type=event.event_type,
+        show_id=event.show_id,
+        payload=json.loads(event.payload),
+        created_at=event.created_at
+    )
+
+def read_changes(db: Session, after_id: int = 0, limit: int = CHANGE_FEED_BATCH_SIZE,
+                 aggregate: Optional[str] = None, show_id: Optional[int] = None) -> schemas.ChangeBatch:
+    """One batch of outbox events with id > after_id, in id order"""
+    query = db.query(models.OutboxEvent).filter(models.OutboxEvent.id > after_id)
+    if aggregate:
+        query = query.filter(models.OutboxEvent.aggregate == aggregate)
+    if show_id is not None:
+        query = query.filter(models.OutboxEvent.show_id == show_id)
+    rows = query.order_by(models.OutboxEvent.id).limit(limit).all()
+
+    # Stop before a recent gap in ids: a concurrent transaction may still commit the missing row
+    events: List[models.OutboxEvent] = rows
+    shard = shard_router.shard_of(db)
+    for missing_id in find_gaps(db, after_id, rows, filtered=bool(aggregate) or show_id is not None):
+        if not gap_tracker.expired(shard, missing_id):
+            events = [row for row in rows if row.id < missing_id]
+            break
+
+    next_cursor = events[-1].id if events else after_id
+    return schemas.ChangeBatch(events=[to_change_event(event) for event in events], next_cursor=next_cursor)
+
+def find_gaps(db: Session, after_id: int, rows: List[models.OutboxEvent], filtered: bool) -> List[int]:
+    """First missing id of each gap in (after_id, last row], in order"""
+    if not rows:
+        return []
+    if not filtered:
+        gaps, expected = [], after_id + 1
+        for row in rows:
+            if row.id != expected:
+                gaps.append(expected)
+            expected = row.id + 1
+        return gaps
+    # Filtered rows skip other events' ids, so look for gaps among all ids in the range
+    event, following = models.OutboxEvent, aliased(models.OutboxEvent)
+    last_id = rows[-1].id
+    gaps = [] if db.get(event, after_id + 1) is not None else [after_id + 1]
+    gaps += [
+        missing_id for (missing_id,) in db.query(event.id + 1).filter(
+            event.id > after_id, event.id < last_id,
+            ~exists().where(following.id == event.id + 1)
+        ).order_by(event.id)
+    ]
+    return gaps
+
+def tail_changes(after_id: int = 0, batch_size: int = CHANGE_FEED_BATCH_SIZE,
+                 aggregate: Optional[str] = None, show_id: Optional[int] = None,
+                 stop: Optional[threading.Event] = None, shard: int = PRIMARY_SHARD) -> Iterator[schemas.ChangeEvent]:
+    """Follow one shard's change feed from after_id, yielding events as they commit (in-process consumers)"""
+    stop = stop or threading.Event()
+    cursor = after_id
+    while not stop.is_set():
+        db = shard_router.session(shard)
+        try:
+            batch = read_changes(db, after_id=cursor, limit=batch_size, aggregate=aggregate, show_id=show_id)
+        finally:
+            db.close()
+        for event in batch.events:
+            yield event
+        cursor = batch.next_cursor
+        if len(batch.events) < batch_size:
+            stop.wait(CHANGE_FEED_POLL_SECONDS)
+
+# Global instance for the application
+gap_tracker = GapTracker()
@@ -0,0 +1,426 @@
+from concurrent.futures import Future, TimeoutError
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import queue
+import threading
+import time
+from fastapi import HTTPException
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+import app.crud as crud
+import app.models as models
+import app.schemas as schemas
+from app.sharding import shard_router
+from app.utils import tracing
+from app.utils.seat_allocator import build_free_runs, ranked_blocks
+from app.utils.seat_layout import LayoutSeat
+
+logger = logging.getLogger(__name__)
+
+FLASH_SALE_COMMIT_INTERVAL_MS = float(os.getenv("FLASH_SALE_COMMIT_INTERVAL_MS", "5"))
+FLASH_SALE_MAX_BATCH = int(os.getenv("FLASH_SALE_MAX_BATCH", "500"))
+FLASH_SALE_CLAIM_TIMEOUT_SECONDS = float(os.getenv("FLASH_SALE_CLAIM_TIMEOUT_SECONDS", "10"))
+SEAT_LOCK_MINUTES = 5
+
+class SeatState:
+    __slots__ = ("is_booked", "locked_by", "locked_until")
+
+    def __init__(self, is_booked: bool, locked_by: Optional[str], locked_until: Optional[datetime]):
+        self.is_booked = is_booked
+        self.locked_by = locked_by
+        self.locked_until = locked_until
+
+    def is_locked(self, now: datetime) -> bool:
+        return self.locked_until is not None and self.locked_until >= now
+
+class Claim:
+    def __init__(self, kind: str, seat_ids: List[int], user_session: Optional[str] = None, user_email: Optional[str] = None):
+        self.kind = kind  # lock, book, or release (seats freed outside the writer)
+        self.seat_ids = list(dict.fromkeys(seat_ids))
+        self.user_session = user_session
+        self.user_email = user_email
+        self.future: Future = Future()
+        # The writer thread records the queue wait and group commit under the caller's span
+        self.span = tracing.current_span.get()
+        self.submitted_ns = time.time_ns() if self.span is not None else 0
+
+class FlashSaleShow:
+    """
+    Single-writer claim processor for one show.
+    Winners are decided against in-memory seat state; each batch of decisions is
+    persisted in one transaction before any caller in the batch gets its answer.
+    """
+
+    def __init__(self, show_id: int, price: float, seats: Dict[int, SeatState]):
+        self.show_id = show_id
+        self.price = price
+        self.seats = seats
+        self.claims: "queue.Queue[Optional[Claim]]" = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=f"flash-sale-{show_id}", daemon=True)
+        self.claims_total = 0
+        self.commits_total = 0
+        # Guards stopped, so no claim can be queued behind the stop sentinel
+        self.submit_lock = threading.Lock()
+        self.stopped = False
+
+    def submit(self, claim: Claim) -> bool:
+        """Queue a claim; False once the show has stopped taking claims"""
+        with self.submit_lock:
+            if self.stopped:
+                return False
+            self.claims.put(claim)
+            return True
+
+    def stop(self):
+        """Stop taking claims; claims queued before this are still committed"""
+        with self.submit_lock:
+            self.stopped = True
+            self.claims.put(None)
+
+    def _collect(self, first: Claim) -> Tuple[List[Claim], bool]:
+        batch = [first]
+        # An idle show commits a lone claim right away; only linger for more when claims are queueing up
+        deadline = time.monotonic() + FLASH_SALE_COMMIT_INTERVAL_MS / 1000 if not self.claims.empty() else 0
+        while len(batch) < FLASH_SALE_MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            try:
+                claim = self.claims.get(timeout=remaining) if remaining > 0 else self.claims.get_nowait()
+            except queue.Empty:
+                break
+            if claim is None:
+                return batch, True
+            batch.append(claim)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self.claims.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            self._process(batch)
+
+    def _decide(self, batch: List[Claim], users: Dict[str, int], now: datetime) -> List[Tuple[Claim, bool]]:
+        decisions = []
+        for claim in batch:
+            states = [self.seats.get(seat_id) for seat_id in claim.seat_ids]
+            if claim.kind == "lock":
+                won = bool(states) and all(
+                    state is not None and not state.is_booked and not state.is_locked(now) for state in states
+                )
+            else:
+                # Same rule as crud.create_booking: a known user, seats not booked, and free or locked by this session
+                won = claim.user_email in users and bool(states) and all(
+                    state is not None and not state.is_booked
+                    and (not state.is_locked(now) or (claim.user_session is not None and state.locked_by == claim.user_session))
+                    for state in states
+                )
+            if won:
+                for state in states:
+                    if claim.kind == "lock":
+                        state.locked_by = claim.user_session
+                        state.locked_until = now + timedelta(minutes=SEAT_LOCK_MINUTES)
+                    else:
+                        state.is_booked = True
+                        state.locked_by = None
+                        state.locked_until = None
+            decisions.append((claim, won))
+        return decisions
+
+    def _persist(self, db: Session, decisions: List[Tuple[Claim, bool]], users: Dict[str, int],
+                 now: datetime) -> Tuple[Dict[Claim, object], List[int]]:
+        """Write the batch's winners in one transaction; returns the results and the seats found out of sync"""
+        results: Dict[Claim, object] = {}
+        stale: List[int] = []
+        events = []
+        expires_at = now + timedelta(minutes=SEAT_LOCK_MINUTES)
+
+        winners = [claim for claim, won in decisions if won]
+        if winners:
+            # Expired holds count as free seats; drop their rows for the whole batch up front
+            expired = db.execute(
+                delete(models.ShowSeat).where(
+                    models.ShowSeat.show_id == self.show_id,
+                    models.ShowSeat.seat_id.in_(sorted({seat_id for claim in winners for seat_id in claim.seat_ids})),
+                    models.ShowSeat.is_booked == False,
+                    models.ShowSeat.locked_until < now
+                ),
+                execution_options={"synchronize_session": False}
+            ).rowcount
+            crud.adjust_seat_counts(db, {self.show_id: (expired, -expired)})
+
+        bookings = []
+        for claim, won in decisions:
+            if not won:
+                results[claim] = None
+                continue
+            # The claim's rows must still be in the state the in-memory decision assumed (free, or held by
+            # this session); crud's conditional claims check that. A seat changed behind the writer's back
+            # fails its claim, which is rolled back to the savepoint, instead of being overwritten.
+            savepoint = db.begin_nested()
+            if claim.kind == "lock":
+                claimed = crud.hold_seats(db, self.show_id, claim.seat_ids, claim.user_session, now, expires_at)
+            else:
+                claimed = crud.book_seats(db, self.show_id, claim.seat_ids, claim.user_session, now)
+            if not claimed:
+                savepoint.rollback()
+                stale.extend(claim.seat_ids)
+                results[claim] = None
+                continue
+            savepoint.commit()
+
+            if claim.kind == "lock":
+                events.append(crud.outbox_event(
+                    "seat", self.show_id, "seats_locked",
+                    {"seat_ids": claim.seat_ids, "locked_by": claim.user_session, "expires_at": expires_at},
+                    show_id=self.show_id
+                ))
+                results[claim] = expires_at
+            else:
+                bookings.append((claim, models.Booking(
+                    user_id=users[claim.user_email],
+                    show_id=self.show_id,
+                    total_amount=len(claim.seat_ids) * self.price,
+                    status="pending"
+                )))
+
+        if bookings:
+            db.add_all([booking for _, booking in bookings])
+            db.flush()
+            db.execute(insert(models.BookingSeat), [
+                {"booking_id": booking.id, "seat_id": seat_id}
+                for claim, booking in bookings for seat_id in claim.seat_ids
+            ])
+            for claim, booking in bookings:
+                events.append(crud.outbox_event(
+                    "booking", booking.id, "booking_created",
+                    {"user_id": booking.user_id, "seat_ids": claim.seat_ids, "total_amount": booking.total_amount, "status": "pending"},
+                    show_id=self.show_id
+                ))
+                results[claim] = booking.id
+
+        crud.add_outbox_events(db, events)
+        db.commit()
+        return results, stale
+
+    def _reload(self, db: Session, seat_ids: List[int]):
+        """Reset in-memory state of seat_ids from their committed rows (no row is a free seat)"""
+        rows = {
+            row.seat_id: row for row in db.query(models.ShowSeat).filter(
+                models.ShowSeat.show_id == self.show_id, models.ShowSeat.seat_id.in_(sorted(set(seat_ids)))
+            )
+        }
+        for seat_id in seat_ids:
+            state, row = self.seats.get(seat_id), rows.get(seat_id)
+            if state is not None:
+                state.is_booked = row.is_booked if row else False
+                state.locked_by = row.locked_by if row else None
+                state.locked_until = row.locked_until if row else None
+        db.rollback()
+
+    def _release(self, seat_ids: List[int]):
+        # Seats whose rows were deleted outside the writer (the reaper freeing a cancelled booking's seats)
+        for seat_id in seat_ids:
+            state = self.seats.get(seat_id)
+            if state is not None and state.is_booked:
+                state.is_booked, state.locked_by, state.locked_until = False, None, None
+
+    def _process(self, batch: List[Claim]):
+        # Claims whose caller stopped waiting were cancelled; they are dropped before anything is decided
+        batch = [claim for claim in batch if claim.future.set_running_or_notify_cancel()]
+        for claim in batch:
+            if claim.kind == "release":
+                self._release(claim.seat_ids)
+        batch = [claim for claim in batch if claim.kind != "release"]
+        if not batch:
+            return
+
+        now = datetime.utcnow()
+        touched = {seat_id for claim in batch for seat_id in claim.seat_ids if seat_id in self.seats}
+        snapshot = {
+            seat_id: (self.seats[seat_id].is_booked, self.seats[seat_id].locked_by, self.seats[seat_id].locked_until)
+            for seat_id in touched
+        }
+
+        db = shard_router.session(shard_router.for_id(self.show_id))
+        try:
+            # Users are resolved before deciding, so a booking for an unknown user never takes seats
+            emails = {claim.user_email for claim in batch if claim.kind == "book"}
+            users = dict(
+                db.query(models.User.email, models.User.id).filter(models.User.email.in_(emails)).all()
+            ) if emails else {}
+            decisions = self._decide(batch, users, now)
+            results, stale = self._persist(db, decisions, users, now)
+            if stale:
+                logger.warning("Flash sale show %s: %d seats changed outside the writer; reloaded",
+                               self.show_id, len(set(stale)))
+                self._reload(db, stale)
+        except Exception as e:
+            db.rollback()
+            for seat_id, (is_booked, locked_by, locked_until) in snapshot.items():
+                state = self.seats[seat_id]
+                state.is_booked, state.locked_by, state.locked_until = is_booked, locked_by, locked_until
+            logger.error("Flash sale commit failed for show %s: %s", self.show_id, e)
+            for claim in batch:
+                if not claim.future.done():
+                    claim.future.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        self.claims_total += len(batch)
+        self.commits_total += 1
+        committed_ns = time.time_ns()
+        for claim in batch:
+            if claim.span is not None:
+                tracing.record_span(
+                    claim.span, "flash_sale.claim", claim.submitted_ns, committed_ns,
+                    **{"flash_sale.show_id": self.show_id, "flash_sale.batch_size": len(batch), "flash_sale.won": results[claim] is not None}
+                )
+            claim.future.set_result(results[claim])
+
+class FlashSaleManager:
+    """Registry of shows currently in flash-sale mode (per process)"""
+
+    def __init__(self):
+        self.shows: Dict[int, FlashSaleShow] = {}
+        self.lock = threading.Lock()
+
+    def is_active(self, show_id: int) -> bool:
+        return show_id in self.shows
+
+    def enable(self, db: Session, show_id: int) -> bool:
+        if self.is_active(show_id):
+            return True
+        # Seats are loaded outside the registry lock, so enabling one show never holds up the others
+        show = crud.get_show(db, show_id)
+        if show is None:
+            return False
+        crud.release_expired_locks(db)
+        holders = {state.seat_id: state.locked_by for state in crud.get_seat_states(db, show_id)}
+        seats = {
+            seat.id: SeatState(seat.is_booked, holders.get(seat.id) if seat.is_locked else None, seat.locked_until)
+            for seat in crud.get_seats_by_show(db, show_id)
+        }
+        with self.lock:
+            if show_id in self.shows:
+                return True
+            flash_show = FlashSaleShow(show_id, show.price, seats)
+            flash_show.thread.start()
+            self.shows[show_id] = flash_show
+        logger.info("Flash sale enabled for show %s (%d seats)", show_id, len(seats))
+        return True
+
+    def disable(self, show_id: int):
+        with self.lock:
+            flash_show = self.shows.pop(show_id, None)
+        if flash_show is not None:
+            flash_show.stop()
+            flash_show.thread.join(FLASH_SALE_CLAIM_TIMEOUT_SECONDS)
+
+    def release_seats(self, show_id: int, seat_ids: List[int]):
+        """Tell the show's writer that seats were freed in the database (does not wait)"""
+        flash_show = self.shows.get(show_id)
+        if flash_show is not None:
+            flash_show.submit(Claim("release", seat_ids))
+
+    @staticmethod
+    def _wait(claim: Claim):
+        try:
+            return claim.future.result(timeout=FLASH_SALE_CLAIM_TIMEOUT_SECONDS)
+        except TimeoutError:
+            if not claim.future.cancel():
+                # The writer already took the claim into a batch; that batch's commit is the answer
+                try:
+                    return claim.future.result(timeout=FLASH_SALE_CLAIM_TIMEOUT_SECONDS)
+                except TimeoutError:
+                    pass
+            raise HTTPException(status_code=503, detail="Flash-sale writer is busy, please retry",
+                                headers={"Retry-After": "1"})
+
+    def status(self, show_id: int) -> schemas.FlashSaleStatus:
+        flash_show = self.shows.get(show_id)
+        if flash_show is None:
+            return schemas.FlashSaleStatus(show_id=show_id, active=False)
+        now = datetime.utcnow()
+        return schemas.FlashSaleStatus(
+            show_id=show_id,
+            active=True,
+            queued_claims=flash_show.claims.qsize(),
+            claims_total=flash_show.claims_total,
+            commits_total=flash_show.commits_total,
+            seats_available=sum(
+                1 for state in flash_show.seats.values() if not state.is_booked and not state.is_locked(now)
+            )
+        )
+
+    def lock_seats(self, show_id: int, seat_ids: List[int], user_session: str) -> Optional[schemas.SeatLockResponse]:
+        """None when the show is not (or no longer) in flash-sale mode; the caller takes the database path"""
+        flash_show = self.shows.get(show_id)
+        claim = Claim("lock", seat_ids, user_session=user_session)
+        if flash_show is None or not flash_show.submit(claim):
+            return None
+        expires_at = self._wait(claim)
+        if expires_at is None:
+            return schemas.SeatLockResponse(
+                success=False,
+                locked_seats=[],
+                expires_at=datetime.utcnow() + timedelta(minutes=SEAT_LOCK_MINUTES),
+                message="Some seats are not available"
+            )
+        return schemas.SeatLockResponse(
+            success=True,
+            locked_seats=claim.seat_ids,
+            expires_at=expires_at,
+            message="Seats locked successfully"
+        )
+
+    def lock_best_available(self, db: Session, show_id: int, count: int,
+                            user_session: str) -> Optional[schemas.BestAvailableResponse]:
+        """Rank blocks against the in-memory seat state and claim them through the writer (None as lock_seats)"""
+        flash_show = self.shows.get(show_id)
+        if flash_show is None:
+            return None
+        now = datetime.utcnow()
+
+        def is_free(seat: LayoutSeat) -> bool:
+            state = flash_show.seats.get(seat.id)
+            return state is not None and not state.is_booked and not state.is_locked(now)
+
+        free_runs = build_free_runs(crud.show_layout(db, show_id).seats, is_free)
+        max_tries = crud.BEST_AVAILABLE_ATTEMPTS * crud.BEST_AVAILABLE_BLOCKS_PER_SCAN
+        for tried, block in enumerate(ranked_blocks(free_runs, count)):
+            if tried >= max_tries:
+                break
+            result = self.lock_seats(show_id, [seat.id for seat in block], user_session)
+            if result is None:
+                return None
+            if result.success:
+                return schemas.BestAvailableResponse(
+                    **result.model_dump(),
+                    seats=[schemas.AllocatedSeat(id=seat.id, row=seat.row, seat_number=seat.seat_number) for seat in block]
+                )
+
+        return schemas.BestAvailableResponse(
+            success=False,
+            locked_seats=[],
+            expires_at=datetime.utcnow() + timedelta(minutes=SEAT_LOCK_MINUTES),
+            message=f"No block of {count} adjacent seats is available"
+        )
+
+    def create_booking(self, db: Session, booking_data: schemas.BookingCreate) -> Optional[models.Booking]:
+        """Book through the show's writer, or crud.create_booking when the show is not in flash-sale mode"""
+        flash_show = self.shows.get(booking_data.show_id)
+        claim = Claim("book", booking_data.seat_ids, user_session=booking_data.user_session, user_email=booking_data.user_email)
+        if flash_show is None or not flash_show.submit(claim):
+            return crud.create_booking(db=db, booking_data=booking_data)
+        booking_id = self._wait(claim)
+        if booking_id is None:
+            return None
+        return crud.get_booking(db, booking_id)
+
+# Global instance for the application
+flash_sale_manager = FlashSaleManager()
@@ -0,0 +1,196 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import app.models as models
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+IDEMPOTENCY_POLL_SECONDS = 0.05  # first re-check of a key reserved by another request
+IDEMPOTENCY_PRUNE_EVERY = 500  # stored responses between DB prunes
+
+# (request_hash, status_code, response_body)
+StoredResponse = Tuple[str, int, dict]
+
+def _as_utc_naive(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def request_fingerprint(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+class IdempotencyGuard:
+    """Handle for one keyed request; either holds a replay or must store a result"""
+
+    def __init__(self, store: "IdempotencyStore", db: Session, key: Optional[str], request_hash: str):
+        self.store = store
+        self.db = db
+        self.key = key
+        self.request_hash = request_hash
+        self.replay: Optional[JSONResponse] = None
+        self.completed = False
+
+    def save(self, status_code: int, body: dict) -> dict:
+        """
+        Persist the response so duplicates of this key replay it; returns body for the handler to return,
+        since completing the key expires the session's ORM instances
+        """
+        if self.key is not None and self.replay is None:
+            self.store.complete(self.db, self.key, (self.request_hash, status_code, body))
+            self.completed = True
+        return body
+
+class IdempotencyStore:
+    """
+    Idempotency-Key store for retried POSTs.
+    A request reserves its key with a row in idempotency_keys before doing any work; the row is
+    the arbiter across worker processes. Duplicates wait for the reserved row to get a response
+    (or answer 409), and completed responses are also kept in an in-memory LRU.
+    """
+
+    def __init__(self, max_entries: int = IDEMPOTENCY_CACHE_SIZE, ttl_hours: int = IDEMPOTENCY_TTL_HOURS):
+        self.max_entries = max_entries
+        self.ttl = timedelta(hours=ttl_hours)
+        self.cache: "OrderedDict[str, Tuple[StoredResponse, datetime]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key: str) -> Optional[StoredResponse]:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        response, stored_at = entry
+        if stored_at + self.ttl < datetime.utcnow():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return response
+
+    def _remember(self, key: str, response: StoredResponse):
+        self.cache[key] = (response, datetime.utcnow())
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+    def _reserve(self, db: Session, key: str, request_hash: str) -> bool:
+        db.add(models.IdempotencyKey(key=key, request_hash=request_hash, created_at=datetime.utcnow()))
+        try:
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+
+    def begin(self, db: Session, key: str, request_hash: str) -> Optional[StoredResponse]:
+        """Return the stored response for key, or reserve the key for this request (None)"""
+        with self.lock:
+            response = self._cached(key)
+            if response is not None:
+                self.hits += 1
+                return response
+
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        delay = IDEMPOTENCY_POLL_SECONDS
+        while True:
+            if self._reserve(db, key, request_hash):
+                with self.lock:
+                    self.misses += 1
+                return None
+
+            row = db.query(models.IdempotencyKey).filter(models.IdempotencyKey.key == key).first()
+            if row is None:
+                continue  # the holder gave up between our insert and this read
+            if _as_utc_naive(row.created_at) < datetime.utcnow() - self.ttl:
+                # Expired but not yet pruned
+                db.query(models.IdempotencyKey).filter(models.IdempotencyKey.id == row.id).delete(synchronize_session=False)
+                db.commit()
+                continue
+            if row.status_code is not None:
+                response = (row.request_hash, row.status_code, json.loads(row.response_body))
+                with self.lock:
+                    self.hits += 1
+                    self._remember(key, response)
+                return response
+            if row.request_hash != request_hash:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was reused with a different request body")
+
+            # Reserved by a request still running, in this process or another one. A holder that
+            # crashed after its write committed leaves the reservation in place: its outcome is
+            # unknown, so the key is never run a second time.
+            db.rollback()
+            if time.monotonic() + delay > deadline:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    def complete(self, db: Session, key: str, response: StoredResponse):
+        request_hash, status_code, body = response
+        db.rollback()  # whatever the handler left open; its own writes are committed
+        db.query(models.IdempotencyKey).filter(
+            models.IdempotencyKey.key == key, models.IdempotencyKey.status_code.is_(None)
+        ).update({"status_code": status_code, "response_body": json.dumps(body, default=str)}, synchronize_session=False)
+        db.commit()
+
+        with self.lock:
+            self._remember(key, response)
+            self.writes += 1
+            prune = self.writes % IDEMPOTENCY_PRUNE_EVERY == 0
+        if prune:
+            self.prune(db)
+
+    def abandon(self, db: Session, key: str):
+        """Drop the reservation after the request failed, so a retry runs again"""
+        db.rollback()
+        db.query(models.IdempotencyKey).filter(
+            models.IdempotencyKey.key == key, models.IdempotencyKey.status_code.is_(None)
+        ).delete(synchronize_session=False)
+        db.commit()
+
+    def prune(self, db: Session) -> int:
+        """Delete stored responses and reservations older than the TTL"""
+        deleted = db.query(models.IdempotencyKey).filter(
+            models.IdempotencyKey.created_at < datetime.utcnow() - self.ttl
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+    @contextmanager
+    def guard(self, db: Session, scope: str, idempotency_key: Optional[str], payload: dict):
+        """Wrap a POST handler; sets guard.replay when the key was already served"""
+        request_hash = request_fingerprint(payload)
+        if not idempotency_key:
+            yield IdempotencyGuard(self, db, None, request_hash)
+            return
+
+        key = f"{scope}:{idempotency_key}"
+        guard = IdempotencyGuard(self, db, key, request_hash)
+        stored = self.begin(db, key, request_hash)
+        if stored is not None:
+            stored_hash, status_code, body = stored
+            if stored_hash != request_hash:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was reused with a different request body")
+            guard.replay = JSONResponse(status_code=status_code, content=body, headers={"Idempotent-Replayed": "true"})
+            yield guard
+            return
+
+        try:
+            yield guard
+        finally:
+            if not guard.completed:
+                self.abandon(db, key)
+
+# Global instance for the application
+idempotency_store = IdempotencyStore()
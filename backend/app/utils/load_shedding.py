@@ -0,0 +1,195 @@
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import re
+import time
+from app.database import DB_MAX_OVERFLOW, DB_POOL_SIZE
+from app.utils.metrics import metrics_registry, render_samples
+
+LOAD_SHEDDING_ENABLED = os.getenv("LOAD_SHEDDING_ENABLED", "true").lower() == "true"
+# class=concurrency/queue/wait budget in ms, per worker
+LOAD_SHED_CLASSES = os.getenv(
+    "LOAD_SHED_CLASSES",
+    "catalog=16/64/250,seat_lock=16/128/1000,booking=16/128/2000,payment=16/128/2000,auth=8/32/1000"
+)
+# Requests holding a DB connection at once; defaults to the pool's size plus overflow
+LOAD_SHED_DB_SLOTS = int(os.getenv("LOAD_SHED_DB_SLOTS", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+LOAD_SHED_DB_QUEUE = int(os.getenv("LOAD_SHED_DB_QUEUE", "256"))
+SERVICE_TIME_SMOOTHING = 0.1
+
+# Lower values are served first when DB slots free up: money-moving writes, then seat holds, then browsing
+PRIORITIES = {"booking": 0, "payment": 0, "seat_lock": 1, "auth": 1, "catalog": 2}
+
+# First match wins; anything unmatched (admin, change stream, waiting rooms, health) is not limited
+ROUTE_RULES: List[Tuple[str, "re.Pattern", str]] = [
+    ("POST", re.compile(r"^/api/seats/lock$"), "seat_lock"),
+    ("POST", re.compile(r"^/api/shows/\d+/seats/best-available$"), "seat_lock"),
+    ("POST", re.compile(r"^/api/baskets/lock$"), "seat_lock"),
+    ("POST", re.compile(r"^/api/bookings$"), "booking"),
+    ("POST", re.compile(r"^/api/baskets$"), "booking"),
+    ("GET", re.compile(r"^/api/(bookings|baskets)/\d+$"), "booking"),
+    ("GET", re.compile(r"^/api/users/\d+/bookings$"), "booking"),
+    ("POST", re.compile(r"^/api/payments/"), "payment"),
+    ("POST", re.compile(r"^/api/users/(register|login)$"), "auth"),
+    ("GET", re.compile(r"^/api/users/me$"), "auth"),
+    ("GET", re.compile(r"^/api/(movies|shows|theatres)(/|$)"), "catalog"),
+]
+
+class Limiter:
+    """
+    Async semaphore with a bounded wait queue ordered by (priority, arrival). A released
+    slot is handed straight to the best waiter. Only touched from the event loop.
+    """
+
+    def __init__(self, capacity: int, max_waiting: int):
+        self.capacity = capacity
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = 0
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self.arrivals = itertools.count()
+
+    async def acquire(self, priority: int, timeout: float) -> Optional[str]:
+        """None once a slot is held, otherwise why not: queue_full or timeout"""
+        if self.active < self.capacity and not self.waiting:
+            self.active += 1
+            return None
+        if self.waiting >= self.max_waiting:
+            return "queue_full"
+        if timeout <= 0:
+            return "timeout"
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.arrivals), future))
+        self.waiting += 1
+        try:
+            await asyncio.wait({future}, timeout=timeout)
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+        if future.done():
+            return None
+        self._abandon(future)
+        return "timeout"
+
+    def _abandon(self, future: asyncio.Future):
+        if future.done():
+            # The slot was handed over just as the caller gave up
+            self.release()
+        else:
+            future.cancel()  # left in the heap and skipped by release()
+            self.waiting -= 1
+
+    def release(self):
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.cancelled():
+                self.waiting -= 1
+                future.set_result(True)
+                return
+        self.active -= 1
+
+class RouteClass:
+    def __init__(self, name: str, concurrency: int, queue_size: int, budget_ms: float):
+        self.name = name
+        self.priority = PRIORITIES.get(name, 2)
+        self.limiter = Limiter(concurrency, queue_size)
+        self.budget = budget_ms / 1000
+        self.service_time = 0.05  # smoothed seconds per request, for Retry-After
+
+    def retry_after(self) -> int:
+        backlog = self.limiter.waiting + 1
+        return max(1, math.ceil(self.service_time * backlog / max(self.limiter.capacity, 1)))
+
+def parse_route_classes(value: str) -> Dict[str, RouteClass]:
+    classes = {}
+    for item in value.split(","):
+        name, _, limits = item.partition("=")
+        if name.strip() and limits.strip():
+            concurrency, queue_size, budget_ms = limits.split("/")
+            classes[name.strip()] = RouteClass(name.strip(), int(concurrency), int(queue_size), float(budget_ms))
+    return classes
+
+class LoadShedder:
+    """Per-route-class concurrency limits in front of a shared, priority-ordered pool of DB slots"""
+
+    def __init__(self, classes: Dict[str, RouteClass], db_slots: int, db_queue: int):
+        self.classes = classes
+        self.db_slots = Limiter(db_slots, db_queue)
+
+    def classify(self, method: str, path: str) -> Optional[RouteClass]:
+        for rule_method, pattern, name in ROUTE_RULES:
+            if method == rule_method and pattern.match(path):
+                return self.classes.get(name)
+        return None
+
+    async def admit(self, route_class: RouteClass) -> Optional[str]:
+        """Take a class slot, then a DB slot, within the class's wait budget"""
+        started = time.monotonic()
+        reason = await route_class.limiter.acquire(0, route_class.budget)
+        if reason is None:
+            try:
+                reason = await self.db_slots.acquire(route_class.priority, route_class.budget - (time.monotonic() - started))
+            except asyncio.CancelledError:
+                route_class.limiter.release()
+                raise
+            if reason is not None:
+                route_class.limiter.release()
+        metrics_registry.queue_wait.observe((route_class.name,), time.monotonic() - started)
+        return reason
+
+    def done(self, route_class: RouteClass, seconds: float):
+        self.db_slots.release()
+        route_class.limiter.release()
+        route_class.service_time += SERVICE_TIME_SMOOTHING * (seconds - route_class.service_time)
+
+    def metrics(self) -> List[str]:
+        classes = sorted(self.classes.values(), key=lambda route_class: route_class.name)
+        return (
+            render_samples("load_shed_in_flight", "Admitted requests per route class", "gauge",
+                           [((route_class.name,), route_class.limiter.active) for route_class in classes], ("route_class",))
+            + render_samples("load_shed_waiting", "Requests queued per route class", "gauge",
+                             [((route_class.name,), route_class.limiter.waiting) for route_class in classes], ("route_class",))
+            + render_samples("load_shed_db_slots", "Shared DB slots", "gauge",
+                             [(("in_use",), self.db_slots.active), (("waiting",), self.db_slots.waiting)], ("state",))
+        )
+
+class LoadSheddingMiddleware:
+    """ASGI middleware answering 503 + Retry-After instead of queueing past a route class's wait budget"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route_class = load_shedder.classify(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await load_shedder.admit(route_class)
+        if reason is not None:
+            metrics_registry.load_shed.inc((route_class.name, reason))
+            body = json.dumps({"detail": "Server is busy, please retry"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(route_class.retry_after()).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            load_shedder.done(route_class, time.monotonic() - started)
+
+# Global instance for the application
+load_shedder = LoadShedder(parse_route_classes(LOAD_SHED_CLASSES), LOAD_SHED_DB_SLOTS, LOAD_SHED_DB_QUEUE)
@@ -0,0 +1,162 @@
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from app.utils.tracing import current_span
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json or text
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() == "true"  # false writes synchronously in the calling thread
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# logger=rate pairs; records below WARNING from that logger (or its children) are kept with that probability
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "app.routes.movies=0.1")
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Attributes every LogRecord has; anything else on a record came from extra= and is emitted as a field
+# (uvicorn's color_message duplicates message with terminal escapes)
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "trace_id", "span_id", "color_message"
+}
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for item in value.split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+class SamplingFilter(logging.Filter):
+    """Keeps a share of sub-WARNING records per logger; warnings and errors always pass"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.resolved: Dict[str, float] = {}
+
+    def rate_for(self, name: str) -> float:
+        rate = self.resolved.get(name)
+        if rate is None:
+            # Longest configured prefix on a dotted boundary wins
+            rate = 1.0
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self.resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, trace ids and any extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+            entry["span_id"] = record.span_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Hands the unformatted record to the listener thread. The stock QueueHandler formats
+    the message in the calling thread so records can be pickled; within one process that
+    is unnecessary, so the request thread only pays for the record and a queue put.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The trace context lives in contextvars of the calling thread, so capture it here
+        active = current_span.get()
+        if active is not None:
+            record.trace_id = active.trace.trace_id
+            record.span_id = active.span_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block a request on a slow log sink
+            self.dropped += 1
+
+class LogPipeline:
+    """Root logging setup: optional sampling, then a queue drained by a background writer thread"""
+
+    def __init__(self):
+        self.listener: Optional[QueueListener] = None
+        self.handler: Optional[logging.Handler] = None
+
+    def configure(self, level: str = LOG_LEVEL, log_format: str = LOG_FORMAT, use_queue: bool = LOG_ASYNC,
+                  sample_rates: str = LOG_SAMPLE_RATES):
+        if self.handler is not None:
+            return
+        output = logging.StreamHandler(sys.stderr)
+        output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+        if use_queue:
+            log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+            handler: logging.Handler = LazyQueueHandler(log_queue)
+            self.listener = QueueListener(log_queue, output, respect_handler_level=True)
+            self.listener.start()
+            atexit.register(self.stop)
+        else:
+            handler = output
+        rates = parse_sample_rates(sample_rates)
+        if rates:
+            handler.addFilter(SamplingFilter(rates))
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level)
+        # uvicorn's default log config installs its own synchronous handlers; route those loggers through ours
+        for name in ("uvicorn", "uvicorn.access"):
+            server_logger = logging.getLogger(name)
+            if server_logger.handlers:
+                server_logger.handlers.clear()
+                server_logger.propagate = True
+        self.handler = handler
+
+    @property
+    def dropped(self) -> int:
+        return getattr(self.handler, "dropped", 0)
+
+    def stop(self):
+        """Drain queued records and stop the writer thread"""
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+
+# Global instance for the application
+log_pipeline = LogPipeline()
@@ -0,0 +1,208 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+DB_STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+LabelValues = Tuple[str, ...]
+
+def _labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values: Dict[LabelValues, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels: LabelValues = (), amount: float = 1.0):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is a bisect and a few additions under a lock"""
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float], label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = label_names
+        self.series: Dict[LabelValues, List[float]] = {}  # per-bucket counts, then +Inf count, then sum
+        self.lock = threading.Lock()
+
+    def observe(self, labels: LabelValues, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = {labels: list(series) for labels, series in self.series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket = _labels(self.label_names, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            bucket = _labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+def render_samples(name: str, help_text: str, kind: str, samples: Iterable[Tuple[LabelValues, float]],
+                   label_names: Tuple[str, ...] = ()) -> List[str]:
+    """Exposition lines for values read at scrape time from elsewhere (kind: gauge or counter)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(label_names, labels)} {value}" for labels, value in samples)
+    return lines
+
+class QueryStats:
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+# Set per request by MetricsMiddleware; copied into the threadpool that runs sync endpoints
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+current_request_scope: ContextVar[Optional[dict]] = ContextVar("current_request_scope", default=None)
+
+class MetricsRegistry:
+    """Process-wide metrics; recording is cheap and all formatting happens at scrape time"""
+
+    def __init__(self):
+        self.request_latency = Histogram(
+            "http_request_duration_seconds", "Request latency by route template",
+            REQUEST_LATENCY_BUCKETS, ("method", "route")
+        )
+        self.requests = Counter("http_requests_total", "Requests by route template and status", ("method", "route", "status"))
+        self.request_statements = Histogram(
+            "db_statements_per_request", "SQL statements executed per request",
+            DB_STATEMENT_BUCKETS, ("method", "route")
+        )
+        self.request_db_time = Histogram(
+            "db_time_per_request_seconds", "Time spent in SQL statements per request",
+            DB_TIME_BUCKETS, ("method", "route")
+        )
+        self.statements = Counter("db_statements_total", "SQL statements executed, including background workers")
+        self.statement_seconds = Counter("db_statement_seconds_total", "Time spent in SQL statements")
+        self.seat_locks = Counter("seat_lock_requests_total", "Seat lock requests by path and outcome", ("mode", "outcome"))
+        self.load_shed = Counter("load_shed_requests_total", "Requests rejected with 503 by route class and reason", ("route_class", "reason"))
+        self.queue_wait = Histogram(
+            "load_shed_queue_wait_seconds", "Time spent waiting for admission by route class",
+            REQUEST_LATENCY_BUCKETS, ("route_class",)
+        )
+        self.collectors: List[Callable[[], List[str]]] = []
+
+    def add_collector(self, collector: Callable[[], List[str]]):
+        """Register a callable producing gauge lines; only called when /metrics is scraped"""
+        self.collectors.append(collector)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: QueryStats):
+        self.request_latency.observe((method, route), seconds)
+        self.requests.inc((method, route, str(status)))
+        self.request_statements.observe((method, route), stats.statements)
+        self.request_db_time.observe((method, route), stats.seconds)
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.request_latency, self.requests, self.request_statements, self.request_db_time,
+                       self.statements, self.statement_seconds, self.seat_locks, self.load_shed, self.queue_wait):
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+def install_query_hooks(engine: Engine):
+    """Count statements and statement time per request and process-wide"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started_at"].pop()
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.seconds += elapsed
+        metrics_registry.statements.inc()
+        metrics_registry.statement_seconds.inc(amount=elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # after_cursor_execute does not fire for failed statements
+        started = exception_context.connection.info.get("query_started_at") if exception_context.connection is not None else None
+        if started:
+            started.pop()
+
+def pool_metrics(engines: Dict[int, Engine]) -> List[str]:
+    """Connection pool state of every shard's engine (shard 0 is the primary)"""
+    samples = []
+    for shard, engine in engines.items():
+        for name, attribute in (("size", "size"), ("checked_out", "checkedout"), ("checked_in", "checkedin"), ("overflow", "overflow")):
+            method = getattr(engine.pool, attribute, None)
+            if method is not None:
+                samples.append(((str(shard), name), float(method())))
+    return render_samples("db_pool_connections", "Connection pool state", "gauge", samples, ("shard", "state"))
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and DB cost per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        scope_token = current_request_scope.set(scope)
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_query_stats.reset(token)
+            current_request_scope.reset(scope_token)
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            metrics_registry.observe_request(scope["method"], route, status[0], elapsed, stats)
+
+# Global instance for the application
+metrics_registry = MetricsRegistry()
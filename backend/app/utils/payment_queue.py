@@ -0,0 +1,243 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+import uuid
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+import app.crud as crud
+import app.models as models
+import app.schemas as schemas
+from app.sharding import shard_router
+
+logger = logging.getLogger(__name__)
+
+ASYNC_PAYMENT_CALLBACKS = os.getenv("ASYNC_PAYMENT_CALLBACKS", "false").lower() == "true"
+PAYMENT_CALLBACK_WORKERS = int(os.getenv("PAYMENT_CALLBACK_WORKERS", "2"))
+PAYMENT_CALLBACK_BATCH_SIZE = int(os.getenv("PAYMENT_CALLBACK_BATCH_SIZE", "500"))
+PAYMENT_CALLBACK_POLL_SECONDS = float(os.getenv("PAYMENT_CALLBACK_POLL_SECONDS", "0.5"))
+PAYMENT_CALLBACK_CLAIM_TIMEOUT_SECONDS = int(os.getenv("PAYMENT_CALLBACK_CLAIM_TIMEOUT_SECONDS", "60"))
+
+def _as_utc_naive(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class PaymentCallbackQueue:
+    """
+    Durable work queue for gateway payment callbacks, backed by the payment_callbacks table.
+    Callbacks are acknowledged once stored; worker threads apply them in batches,
+    marking each batch done in the same transaction as its payment/booking updates.
+    """
+
+    def __init__(self, workers: int = PAYMENT_CALLBACK_WORKERS, batch_size: int = PAYMENT_CALLBACK_BATCH_SIZE):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.threads: List[threading.Thread] = []
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.enqueued_total = 0
+        self.duplicates_total = 0
+        self.processed_total = 0
+        self.not_found_total = 0
+        self.batches_total = 0
+
+    def enqueue(self, db: Session, transaction_id: str, status: str) -> bool:
+        """Store a callback; returns False if this transaction already has one"""
+        now = datetime.utcnow()
+        db.add(models.PaymentCallback(
+            transaction_id=transaction_id,
+            status=status,
+            state="queued",
+            enqueued_at=now
+        ))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            # A callback that found no payment did not apply anything; queue this one in its place
+            requeued = db.execute(
+                update(models.PaymentCallback)
+                .where(models.PaymentCallback.transaction_id == transaction_id, models.PaymentCallback.state == "not_found")
+                .values(status=status, state="queued", enqueued_at=now, claimed_by=None, claimed_at=None, processed_at=None),
+                execution_options={"synchronize_session": False}
+            ).rowcount
+            db.commit()
+            if not requeued:
+                with self.lock:
+                    self.duplicates_total += 1
+                return False
+
+        with self.lock:
+            self.enqueued_total += 1
+        self.wakeup.set()
+        return True
+
+    def _requeue_stale_claims(self, db: Session):
+        """Return batches claimed by a worker that died before committing"""
+        db.execute(
+            update(models.PaymentCallback)
+            .where(
+                models.PaymentCallback.state == "processing",
+                models.PaymentCallback.claimed_at < datetime.utcnow() - timedelta(seconds=PAYMENT_CALLBACK_CLAIM_TIMEOUT_SECONDS)
+            )
+            .values(state="queued", claimed_by=None, claimed_at=None),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+
+    def _claim_batch(self, db: Session) -> Tuple[str, List[models.PaymentCallback]]:
+        """Claim up to batch_size queued callbacks; returns the claim token and the rows"""
+        ids = [
+            callback_id for (callback_id,) in db.query(models.PaymentCallback.id)
+            .filter(models.PaymentCallback.state == "queued")
+            .order_by(models.PaymentCallback.id)
+            .limit(self.batch_size)
+            .all()
+        ]
+        if not ids:
+            db.rollback()
+            return "", []
+
+        # Conditional update so two workers never claim the same row
+        token = uuid.uuid4().hex
+        db.execute(
+            update(models.PaymentCallback)
+            .where(models.PaymentCallback.id.in_(ids), models.PaymentCallback.state == "queued")
+            .values(state="processing", claimed_by=token, claimed_at=datetime.utcnow()),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+        return token, db.query(models.PaymentCallback).filter(
+            models.PaymentCallback.claimed_by == token,
+            models.PaymentCallback.state == "processing"
+        ).order_by(models.PaymentCallback.id).all()
+
+    def process_batch(self, db: Session) -> int:
+        """Claim and apply one batch in a single commit; returns callbacks handled"""
+        token, callbacks = self._claim_batch(db)
+        if not callbacks:
+            return 0
+
+        confirmations = [
+            schemas.PaymentConfirm(transaction_id=callback.transaction_id, status=callback.status)
+            for callback in callbacks
+        ]
+        found = crud.apply_payment_confirmations(db, confirmations)
+
+        now = datetime.utcnow()
+        done_ids = [callback.id for callback in callbacks if callback.transaction_id in found]
+        missing_ids = [callback.id for callback in callbacks if callback.transaction_id not in found]
+        marked = 0
+        for state, ids in (("done", done_ids), ("not_found", missing_ids)):
+            if ids:
+                marked += db.execute(
+                    update(models.PaymentCallback)
+                    .where(
+                        models.PaymentCallback.id.in_(ids),
+                        models.PaymentCallback.claimed_by == token,
+                        models.PaymentCallback.state == "processing"
+                    )
+                    .values(state=state, processed_at=now),
+                    execution_options={"synchronize_session": False}
+                ).rowcount
+        if marked != len(callbacks):
+            # The claim went stale and the rows were requeued (or requeued and reclaimed): whoever
+            # holds them now applies them, so none of this batch's updates may commit
+            db.rollback()
+            logger.warning("Payment callback batch lost its claim on %d of %d callbacks; rolled back",
+                           len(callbacks) - marked, len(callbacks))
+            return 0
+        db.commit()
+
+        with self.lock:
+            self.processed_total += len(done_ids)
+            self.not_found_total += len(missing_ids)
+            self.batches_total += 1
+        return len(callbacks)
+
+    def drain(self, db: Session) -> int:
+        """Process everything queued in the calling thread (scripts and tests)"""
+        handled = 0
+        while True:
+            count = self.process_batch(db)
+            if count == 0:
+                return handled
+            handled += count
+
+    def _worker(self):
+        # Callbacks are queued on the shard owning their payment; each worker serves every shard
+        sessions = [shard_router.session(shard) for shard in shard_router.shards]
+        last_requeue = 0.0
+        try:
+            while not self.stopping.is_set():
+                requeue = time.monotonic() - last_requeue > PAYMENT_CALLBACK_CLAIM_TIMEOUT_SECONDS / 2
+                handled = 0
+                for db in sessions:
+                    try:
+                        if requeue:
+                            self._requeue_stale_claims(db)
+                        handled += self.process_batch(db)
+                    except SQLAlchemyError as e:
+                        logger.error("Payment callback batch failed: %s", e)
+                        db.rollback()
+                if requeue:
+                    last_requeue = time.monotonic()
+                if handled == 0:
+                    self.wakeup.wait(PAYMENT_CALLBACK_POLL_SECONDS)
+                    self.wakeup.clear()
+        finally:
+            for db in sessions:
+                db.close()
+
+    def start(self):
+        if self.threads:
+            return
+        self.stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"payment-callback-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info("Started %d payment callback workers", self.workers)
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        self.stopping.set()
+        self.wakeup.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def metrics(self, db: Session) -> schemas.PaymentQueueMetrics:
+        depth, oldest = db.query(
+            func.count(models.PaymentCallback.id),
+            func.min(models.PaymentCallback.enqueued_at)
+        ).filter(models.PaymentCallback.state == "queued").one()
+        processing = db.query(func.count(models.PaymentCallback.id)).filter(
+            models.PaymentCallback.state == "processing"
+        ).scalar()
+
+        lag_seconds = 0.0
+        if oldest is not None:
+            if isinstance(oldest, str):
+                oldest = datetime.fromisoformat(oldest)
+            lag_seconds = max(0.0, (datetime.utcnow() - _as_utc_naive(oldest)).total_seconds())
+
+        with self.lock:
+            return schemas.PaymentQueueMetrics(
+                depth=depth,
+                processing=processing,
+                lag_seconds=lag_seconds,
+                workers=len(self.threads),
+                enqueued_total=self.enqueued_total,
+                duplicates_total=self.duplicates_total,
+                processed_total=self.processed_total,
+                not_found_total=self.not_found_total,
+                batches_total=self.batches_total
+            )
+
+# Global instance for the application
+payment_callback_queue = PaymentCallbackQueue()
@@ -0,0 +1,58 @@
+from typing import Generic, List, Optional, TypeVar
+import logging
+import threading
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.sharding import shard_router
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SIZE = 100  # reports kept per job
+
+R = TypeVar("R")
+
+class PeriodicJob(Generic[R]):
+    """
+    Background thread running run_once on every shard each interval_seconds.
+    Subclasses implement run_once(db) and pass its report to record().
+    """
+
+    name = "periodic-job"  # thread name, also used in log messages
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.thread: Optional[threading.Thread] = None
+        self.stopping = threading.Event()
+        self.history: List[R] = []
+
+    def run_once(self, db: Session) -> R:
+        raise NotImplementedError
+
+    def record(self, report: R) -> R:
+        self.history = (self.history + [report])[-HISTORY_SIZE:]
+        return report
+
+    def _loop(self):
+        while not self.stopping.wait(self.interval_seconds):
+            for shard in shard_router.shards:
+                db = shard_router.session(shard)
+                try:
+                    self.run_once(db)
+                except SQLAlchemyError as e:
+                    logger.error("%s run failed on shard %s: %s", self.name, shard, e)
+                    db.rollback()
+                finally:
+                    db.close()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+import logging
+import os
+import time
+from sqlalchemy.orm import Session
+import app.crud as crud
+import app.schemas as schemas
+from app.utils.flash_sale import flash_sale_manager
+from app.utils.periodic_job import PeriodicJob
+from app.utils.seat_lock import seat_lock_manager
+
+logger = logging.getLogger(__name__)
+
+REAPER_ENABLED = os.getenv("REAPER_ENABLED", "true").lower() == "true"
+REAPER_INTERVAL_SECONDS = int(os.getenv("REAPER_INTERVAL_SECONDS", "60"))
+REAPER_MAX_BATCHES = int(os.getenv("REAPER_MAX_BATCHES", "50"))  # per step, per run
+
+class BookingReaper(PeriodicJob[schemas.ReaperReport]):
+    """
+    Periodically cancels abandoned pending bookings and frees seats held by cancelled ones.
+    Work is done in bounded batches so a single run never holds long transactions.
+    """
+
+    name = "booking-reaper"
+
+    def __init__(self, interval_seconds: int = REAPER_INTERVAL_SECONDS,
+                 pending_timeout_minutes: int = crud.BOOKING_PENDING_TIMEOUT_MINUTES,
+                 batch_size: int = crud.REAPER_BATCH_SIZE, max_batches: int = REAPER_MAX_BATCHES):
+        super().__init__(interval_seconds)
+        self.pending_timeout = timedelta(minutes=pending_timeout_minutes)
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+
+    def run_once(self, db: Session) -> schemas.ReaperReport:
+        started_at = datetime.utcnow()
+        start = time.perf_counter()
+        batches = 0
+
+        expired = 0
+        cutoff = started_at - self.pending_timeout
+        for _ in range(self.max_batches):
+            count = crud.expire_pending_bookings(db, older_than=cutoff, batch_size=self.batch_size)
+            if count == 0:
+                break
+            expired += count
+            batches += 1
+
+        reclaimed = 0
+        shows = set()
+        for _ in range(self.max_batches):
+            released = crud.release_cancelled_booking_seats(db, batch_size=self.batch_size)
+            if not released:
+                break
+            for show_id, seat_ids in released.items():
+                seat_lock_manager.release_seats(show_id, seat_ids)
+                flash_sale_manager.release_seats(show_id, seat_ids)
+                reclaimed += len(seat_ids)
+                shows.add(show_id)
+            batches += 1
+
+        report = schemas.ReaperReport(
+            started_at=started_at,
+            duration_ms=(time.perf_counter() - start) * 1000,
+            expired_bookings=expired,
+            seats_reclaimed=reclaimed,
+            shows_affected=len(shows),
+            batches=batches
+        )
+        self.record(report)
+        if expired or reclaimed:
+            logger.info("Reaper expired %d bookings and reclaimed %d seats across %d shows", expired, reclaimed, len(shows))
+        return report
+
+# Global instance for the application
+booking_reaper = BookingReaper()
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+import os
+import threading
+import time
+from sqlalchemy.orm import Session
+import app.crud as crud
+import app.schemas as schemas
+
+SCHEDULE_CACHE_SECONDS = float(os.getenv("SCHEDULE_CACHE_SECONDS", "30"))  # how stale availability counts may get
+SCHEDULE_CACHE_SIZE = int(os.getenv("SCHEDULE_CACHE_SIZE", "5000"))  # theatre-days kept per process
+SCHEDULE_MAX_DAYS = 31
+
+# (theatre_id, show_date)
+ScheduleKey = Tuple[int, date]
+
+def group_schedule(rows) -> Dict[date, List[schemas.ScheduleMovie]]:
+    """Group rows of crud.get_theatre_schedule_rows (already ordered) by date, then movie"""
+    days: Dict[date, List[schemas.ScheduleMovie]] = {}
+    for (show_date, show_id, show_time, price, available, held, seat_count,
+         movie_id, title, duration, rating, poster_url) in rows:
+        movies = days.setdefault(show_date, [])
+        if not movies or movies[-1].movie_id != movie_id:
+            movies.append(schemas.ScheduleMovie(
+                movie_id=movie_id, title=title, duration=duration, rating=rating, poster_url=poster_url,
+                available_count=0, shows=[]
+            ))
+        movies[-1].available_count += available or 0
+        movies[-1].shows.append(schemas.ScheduleShow(
+            show_id=show_id, show_time=show_time, price=price, total_seats=seat_count or 0,
+            available_count=available or 0, held_count=held or 0
+        ))
+    return days
+
+class TheatreScheduleCache:
+    """
+    Per-process cache of theatre schedules, one entry per theatre-day. Days missing from the
+    cache are loaded together by one query; entries expire after SCHEDULE_CACHE_SECONDS so
+    availability counts stay close to the seat counters.
+    """
+
+    def __init__(self, ttl_seconds: float = SCHEDULE_CACHE_SECONDS, max_entries: int = SCHEDULE_CACHE_SIZE):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[ScheduleKey, Tuple[List[schemas.ScheduleMovie], float]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0  # bumped by invalidate(), so a load that raced it is not stored
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key: ScheduleKey, now: float):
+        entry = self.entries.get(key)
+        if entry is None or entry[1] + self.ttl < now:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, db: Session, theatre_id: int, from_date: date, to_date: date) -> schemas.TheatreSchedule:
+        dates = [from_date + timedelta(days=offset) for offset in range((to_date - from_date).days + 1)]
+        now = time.monotonic()
+        with self.lock:
+            days = {day: self._cached((theatre_id, day), now) for day in dates}
+            generation = self.generation
+            missing = [day for day, movies in days.items() if movies is None]
+            self.hits += len(dates) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            loaded = group_schedule(crud.get_theatre_schedule_rows(db, theatre_id, missing[0], missing[-1]))
+            with self.lock:
+                for day in missing:
+                    days[day] = loaded.get(day, [])
+                    if generation == self.generation:
+                        self.entries[(theatre_id, day)] = (days[day], now)
+                        self.entries.move_to_end((theatre_id, day))
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+
+        return schemas.TheatreSchedule(
+            theatre_id=theatre_id,
+            from_date=from_date,
+            to_date=to_date,
+            days=[schemas.ScheduleDay(show_date=day, movies=days[day]) for day in dates if days[day]]
+        )
+
+    def invalidate(self, theatre_id: int, show_date: date):
+        with self.lock:
+            self.entries.pop((theatre_id, show_date), None)
+            self.generation += 1
+
+# Global instance for the application
+schedule_cache = TheatreScheduleCache()
@@ -0,0 +1,57 @@
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Tuple
+import app.schemas as schemas
+
+# Rows are ranked by distance from a sweet spot a little behind the middle of the hall
+PREFERRED_ROW_POSITION = 0.6
+ROW_WEIGHT = 1.0
+CENTER_WEIGHT = 1.0
+
+# Seats are anything with id, row and seat_number (schemas.Seat, LayoutSeat), in layout order
+FreeRuns = Dict[str, Tuple[List[schemas.Seat], List[Tuple[int, int]]]]
+
+def seat_is_free(now: datetime) -> Callable[[schemas.Seat], bool]:
+    return lambda seat: not seat.is_booked and (not seat.is_locked or seat.locked_until is None or seat.locked_until < now)
+
+def build_free_runs(seats: List[schemas.Seat], is_free: Callable[[schemas.Seat], bool]) -> FreeRuns:
+    """Per row (front to back): seats left to right, plus (start index, length) of every run of adjacent free seats"""
+    rows: Dict[str, List[schemas.Seat]] = {}
+    for seat in seats:
+        rows.setdefault(seat.row, []).append(seat)
+
+    index = {}
+    for row, row_seats in rows.items():
+        runs = []
+        start = None
+        for position, seat in enumerate(row_seats):
+            if is_free(seat):
+                if start is None:
+                    start = position
+            elif start is not None:
+                runs.append((start, position - start))
+                start = None
+        if start is not None:
+            runs.append((start, len(row_seats) - start))
+        index[row] = (row_seats, runs)
+    return index
+
+def ranked_blocks(free_runs: FreeRuns, count: int) -> Iterator[List[schemas.Seat]]:
+    """Every block of count adjacent free seats, best (most central) first"""
+    row_names = list(free_runs)
+    preferred_row = PREFERRED_ROW_POSITION * max(len(row_names) - 1, 1)
+    candidates = []
+    for row_index, row in enumerate(row_names):
+        row_seats, runs = free_runs[row]
+        row_center = (len(row_seats) - 1) / 2
+        row_score = ROW_WEIGHT * abs(row_index - preferred_row) / max(len(row_names), 1)
+        for start, length in runs:
+            for offset in range(length - count + 1):
+                first = start + offset
+                block_center = first + (count - 1) / 2
+                center_score = CENTER_WEIGHT * abs(block_center - row_center) / max(len(row_seats), 1)
+                candidates.append((row_score + center_score, row_index, first))
+
+    candidates.sort()
+    for _, row_index, first in candidates:
+        row_seats = free_runs[row_names[row_index]][0]
+        yield row_seats[first:first + count]
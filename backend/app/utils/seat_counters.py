@@ -0,0 +1,53 @@
+from datetime import datetime
+import logging
+import os
+import time
+from sqlalchemy.orm import Session
+import app.crud as crud
+import app.schemas as schemas
+from app.utils.periodic_job import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_ENABLED = os.getenv("RECONCILE_ENABLED", "true").lower() == "true"
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("RECONCILE_INTERVAL_SECONDS", "300"))
+
+class SeatCountReconciler(PeriodicJob[schemas.SeatCountReconcileReport]):
+    """
+    Periodically recounts each show's available and held seats from its show_seats rows and
+    repairs counters that drifted (e.g. rows edited by hand), one batch of shows per transaction.
+    """
+
+    name = "seat-count-reconciler"
+
+    def __init__(self, interval_seconds: int = RECONCILE_INTERVAL_SECONDS, batch_size: int = crud.RECONCILE_BATCH_SIZE):
+        super().__init__(interval_seconds)
+        self.batch_size = batch_size
+
+    def run_once(self, db: Session) -> schemas.SeatCountReconcileReport:
+        started_at = datetime.utcnow()
+        start = time.perf_counter()
+
+        checked = repaired = 0
+        last_id = 0
+        while True:
+            batch = crud.reconcile_seat_counts(db, after_id=last_id, batch_size=self.batch_size)
+            if batch["last_id"] is None:
+                break
+            last_id = batch["last_id"]
+            checked += batch["checked"]
+            repaired += batch["repaired"]
+
+        report = schemas.SeatCountReconcileReport(
+            started_at=started_at,
+            duration_ms=(time.perf_counter() - start) * 1000,
+            shows_checked=checked,
+            shows_repaired=repaired
+        )
+        self.record(report)
+        if repaired:
+            logger.warning("Repaired drifted seat counters on %d of %d shows", repaired, checked)
+        return report
+
+# Global instance for the application
+seat_count_reconciler = SeatCountReconciler()
@@ -0,0 +1,96 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import json
+import string
+from sqlalchemy.orm import Session
+import app.models as models
+
+DEFAULT_SEATS_PER_ROW = 20
+DEFAULT_CATEGORY = "standard"
+
+class LayoutSeat(NamedTuple):
+    id: int  # 1-based position in the layout, front row first
+    row: str
+    seat_number: str
+    category: str
+
+def row_label(index: int) -> str:
+    """A..Z, then AA, AB, ..."""
+    label = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        label = string.ascii_uppercase[remainder] + label
+    return label
+
+def default_layout_rows(total_seats: int, seats_per_row: int = DEFAULT_SEATS_PER_ROW) -> List[dict]:
+    """Rows of seats_per_row seats (the last one shorter) holding total_seats seats"""
+    rows = []
+    for index, first in enumerate(range(0, max(total_seats, 0), seats_per_row)):
+        count = min(seats_per_row, total_seats - first)
+        rows.append({"row": row_label(index), "category": DEFAULT_CATEGORY, "seats": [str(n) for n in range(1, count + 1)]})
+    return rows
+
+def layout_json(rows: List[dict]) -> str:
+    """Canonical encoding, so identical seat plans compare equal and share a layout row"""
+    return json.dumps(rows, separators=(",", ":"))
+
+def seat_order(seat_number: str):
+    return (0, int(seat_number), "") if seat_number.isdigit() else (1, 0, seat_number)
+
+def layout_rows_from_seats(seats: Iterable[Tuple[str, str]]) -> List[dict]:
+    """Layout rows for a set of (row, seat_number) pairs: rows by label, seats numerically"""
+    by_row: Dict[str, List[str]] = {}
+    for row, seat_number in seats:
+        by_row.setdefault(row, []).append(seat_number)
+    return [
+        {"row": row, "category": DEFAULT_CATEGORY, "seats": sorted(by_row[row], key=seat_order)}
+        for row in sorted(by_row, key=lambda label: (len(label), label))
+    ]
+
+class SeatLayout:
+    """Parsed, immutable seat plan of a theatre layout"""
+
+    def __init__(self, layout_id: int, rows: List[dict]):
+        self.id = layout_id
+        positions = ((row, seat_number) for row in rows for seat_number in row["seats"])
+        self.seats: List[LayoutSeat] = [
+            LayoutSeat(position, row["row"], seat_number, row.get("category", DEFAULT_CATEGORY))
+            for position, (row, seat_number) in enumerate(positions, start=1)
+        ]
+
+    @property
+    def seat_count(self) -> int:
+        return len(self.seats)
+
+    def has_all(self, seat_ids: Iterable[int]) -> bool:
+        return all(1 <= seat_id <= len(self.seats) for seat_id in seat_ids)
+
+    def label(self, seat_id: int) -> Tuple[str, str]:
+        if not self.has_all([seat_id]):
+            return "", str(seat_id)
+        seat = self.seats[seat_id - 1]
+        return seat.row, seat.seat_number
+
+class SeatLayoutCache:
+    """Layouts never change once created, so each is read and parsed once per process"""
+
+    def __init__(self):
+        self.layouts: Dict[int, SeatLayout] = {}
+
+    def get(self, db: Session, layout_id: Optional[int]) -> Optional[SeatLayout]:
+        if layout_id is None:
+            return None
+        layout = self.layouts.get(layout_id)
+        if layout is None:
+            rows = db.query(models.TheatreLayout.rows).filter(models.TheatreLayout.id == layout_id).scalar()
+            if rows is None:
+                return None
+            layout = self.layouts[layout_id] = SeatLayout(layout_id, json.loads(rows))
+        return layout
+
+    def label(self, db: Session, layout_id: Optional[int], seat_id: int) -> Tuple[str, str]:
+        layout = self.get(db, layout_id)
+        return layout.label(seat_id) if layout is not None else ("", str(seat_id))
+
+# Global instance for the application
+seat_layouts = SeatLayoutCache()
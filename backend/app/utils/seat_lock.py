@@ -12,6 +12,8 @@ class InMemorySeatLock:
     def __init__(self):
         self.locks: Dict[str, datetime] = {}  # seat_id -> expiry_time
         self.lock = threading.Lock()
+        self.granted = 0
+        self.conflicts = 0
     
     def lock_seats(self, show_id: int, seat_ids: List[int], user_session: str, lock_duration_minutes: int = 5) -> bool:
         """Lock seats for a user session"""
@@ -23,6 +25,7 @@ class InMemorySeatLock:
             for seat_id in seat_ids:
                 lock_key = f"{show_id}:{seat_id}"
                 if lock_key in self.locks and self.locks[lock_key] > current_time:
+                    self.conflicts += 1
                     return False  # Seat is already locked
             
             # Lock all seats
@@ -30,6 +33,7 @@ class InMemorySeatLock:
                 lock_key = f"{show_id}:{seat_id}"
                 self.locks[lock_key] = expiry_time
             
+            self.granted += 1
             return True
     
     def is_seat_locked(self, show_id: int, seat_id: int) -> bool:
@@ -0,0 +1,180 @@
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import app.schemas as schemas
+from app.utils.metrics import current_request_scope
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))  # negative disables the log
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1"))
+SLOW_QUERY_MAX_STATEMENTS = int(os.getenv("SLOW_QUERY_MAX_STATEMENTS", "200"))
+SLOW_QUERY_MAX_ORIGINS = 10
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("select", "update", "delete", "with")
+
+# Set while running EXPLAIN so its own statements are not timed
+_explaining: ContextVar[bool] = ContextVar("slow_query_explaining", default=False)
+
+def normalize_sql(statement: str) -> str:
+    """Literal values and placeholder lists collapsed, so variants of one query group together"""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+def parameter_shape(parameters, executemany: bool) -> str:
+    """Types of the bound parameters, without their values"""
+    if executemany:
+        rows = list(parameters) if parameters is not None else []
+        return f"{len(rows)} x {parameter_shape(rows[0], False)}" if rows else "0 rows"
+    if not parameters:
+        return "none"
+    values = parameters.values() if isinstance(parameters, dict) else parameters
+    counts = Counter(type(value).__name__ for value in values)
+    return ", ".join(f"{name} x{count}" if count > 1 else name for name, count in sorted(counts.items()))
+
+def statement_origin() -> str:
+    """Route template plus the innermost app function (crud or utility) that issued the statement"""
+    scope = current_request_scope.get()
+    route = getattr(scope.get("route"), "path", None) if scope is not None else None
+    caller = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.") and module not in ("app.utils.slow_query", "app.utils.metrics", "app.utils.tracing", "app.database"):
+            caller = f"{module}.{frame.f_code.co_name}"
+            break
+        frame = frame.f_back
+    if route and scope is not None:
+        route = f"{scope['method']} {route}"
+    return " ".join(part for part in (route or "background", caller and f"({caller})") if part)
+
+class SlowQuery:
+    __slots__ = ("statement", "count", "total_ms", "max_ms", "last_seen", "parameter_shape", "origins", "plan")
+
+    def __init__(self, statement: str):
+        self.statement = statement
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_seen: Optional[datetime] = None
+        self.parameter_shape = ""
+        self.origins: Counter = Counter()
+        self.plan: Optional[List[str]] = None
+
+class SlowQueryLog:
+    """Slow statements grouped by normalized SQL; the cheapest groups are evicted when full"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS, explain_sample_rate: float = SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+                 max_statements: int = SLOW_QUERY_MAX_STATEMENTS):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.max_statements = max_statements
+        self.entries: Dict[str, SlowQuery] = {}
+        self.lock = threading.Lock()
+
+    def record(self, conn, statement: str, parameters, executemany: bool, elapsed_ms: float):
+        normalized = normalize_sql(statement)
+        shape = parameter_shape(parameters, executemany)
+        origin = statement_origin()
+        logger.warning("Slow query (%.1f ms) from %s: %s [%s]", elapsed_ms, origin, normalized, shape)
+
+        with self.lock:
+            entry = self.entries.get(normalized)
+            if entry is None:
+                if len(self.entries) >= self.max_statements:
+                    cheapest = min(self.entries.values(), key=lambda candidate: candidate.total_ms)
+                    del self.entries[cheapest.statement]
+                entry = self.entries[normalized] = SlowQuery(normalized)
+            entry.count += 1
+            entry.total_ms += elapsed_ms
+            entry.max_ms = max(entry.max_ms, elapsed_ms)
+            entry.last_seen = datetime.utcnow()
+            entry.parameter_shape = shape
+            if origin in entry.origins or len(entry.origins) < SLOW_QUERY_MAX_ORIGINS:
+                entry.origins[origin] += 1
+            explain = (
+                not executemany
+                and normalized.lower().startswith(_EXPLAINABLE)
+                and (entry.plan is None or random.random() < self.explain_sample_rate)
+                and self.explain_sample_rate > 0
+            )
+
+        if explain:
+            plan = self.explain(conn.engine, statement, parameters)
+            with self.lock:
+                entry.plan = plan
+
+    def explain(self, engine: Engine, statement: str, parameters) -> List[str]:
+        """Plan the statement on a separate connection so the request's transaction is never disturbed"""
+        prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+        token = _explaining.set(True)
+        try:
+            with engine.connect() as connection:
+                rows = connection.exec_driver_sql(prefix + statement, parameters or ()).all()
+            return [" ".join(str(value) for value in row) for row in rows]
+        except Exception as e:
+            return [f"EXPLAIN failed: {e}"]
+        finally:
+            _explaining.reset(token)
+
+    def top(self, limit: int) -> List[schemas.SlowQuery]:
+        with self.lock:
+            entries = sorted(self.entries.values(), key=lambda entry: entry.total_ms, reverse=True)[:limit]
+            return [
+                schemas.SlowQuery(
+                    statement=entry.statement,
+                    count=entry.count,
+                    total_ms=entry.total_ms,
+                    mean_ms=entry.total_ms / entry.count,
+                    max_ms=entry.max_ms,
+                    last_seen=entry.last_seen,
+                    parameter_shape=entry.parameter_shape,
+                    origins=dict(entry.origins.most_common()),
+                    plan=entry.plan
+                )
+                for entry in entries
+            ]
+
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+
+def install_slow_query_log(engine: Engine):
+    if slow_query_log.threshold_ms < 0:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["slow_query_started_at"].pop()) * 1000
+        if elapsed_ms >= slow_query_log.threshold_ms and not _explaining.get():
+            slow_query_log.record(conn, statement, parameters, executemany, elapsed_ms)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        started = connection.info.get("slow_query_started_at") if connection is not None else None
+        if started:
+            started.pop()
+
+# Global instance for the application
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,89 @@
+from typing import Dict, Optional
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Imported first by app.main, so this approximates when the app's own imports began
+IMPORT_STARTED = time.time()
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+def worker_slot() -> int:
+    """serve.py worker slot of this process (0 for a process started any other way)"""
+    return int(os.getenv("WEB_WORKER_SLOT", "0"))
+
+def worker_count() -> int:
+    """Worker processes serving the app (1 unless started by serve.py with several workers)"""
+    return int(os.getenv("WEB_WORKER_COUNT", "1"))
+
+def process_start_time() -> Optional[float]:
+    """Wall-clock start of this process from /proc (Linux only, clock-tick resolution)"""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces; fields resume after its closing parenthesis
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+class StartupTimer:
+    """Milestones of a worker's cold start, in ms since the process (or the app import) began"""
+
+    def __init__(self):
+        self.started = process_start_time() or IMPORT_STARTED
+        self.marks: Dict[str, float] = {"imports_started": IMPORT_STARTED}
+        self.first_request_seen = False
+
+    def mark(self, name: str):
+        self.marks.setdefault(name, time.time())
+
+    def report(self) -> Dict[str, float]:
+        return {name: round((at - self.started) * 1000, 1) for name, at in sorted(self.marks.items(), key=lambda item: item[1])}
+
+def warm_up(engine):
+    """Fill the connection pool, load the lazily imported auth libraries and prime the statement cache"""
+    from sqlalchemy import text
+    import app.crud as crud
+    from app.database import SessionLocal
+
+    size = getattr(engine.pool, "size", lambda: 1)()
+    connections = []
+    try:
+        for _ in range(size):
+            connection = engine.connect()
+            connection.execute(text("SELECT 1"))
+            connections.append(connection)
+    finally:
+        for connection in connections:
+            connection.close()
+
+    crud.password_context().handler("bcrypt").get_backend()
+    import jose.jwt  # noqa: F401
+
+    db = SessionLocal()
+    try:
+        # Compiles the hottest read queries into SQLAlchemy's statement cache
+        crud.get_movies(db, limit=1)
+        crud.get_seats_by_show(db, 0)
+    finally:
+        db.close()
+
+class StartupTimingMiddleware:
+    """Records when the first request finished (one flag check per request afterwards)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+        if not startup_timer.first_request_seen and scope["type"] == "http":
+            startup_timer.first_request_seen = True
+            startup_timer.mark("first_request")
+            logger.info("First request served %.1f ms after process start", startup_timer.report()["first_request"])
+
+# Global instance for the application
+startup_timer = StartupTimer()
@@ -0,0 +1,324 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import partial, wraps
+from typing import Callable, Dict, List, Optional, Tuple
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))  # share of requests traced; 0 disables
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "traces.jsonl")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "movie-booking-api")
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "2000"))  # per trace
+TRACE_EXPORT_QUEUE_SIZE = 1000
+SQL_STATEMENT_MAX_LENGTH = 1000
+# version-trace_id-parent_id-flags, lowercase hex (https://www.w3.org/TR/trace-context/#traceparent-header)
+TRACEPARENT_PATTERN = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$")
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "dropped")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List["Span"] = []
+        self.dropped = 0
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error", "is_root")
+
+    def __init__(self, trace: Trace, name: str, kind: int, parent_id: Optional[str], is_root: bool = False):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, object] = {}
+        self.error: Optional[str] = None
+        self.is_root = is_root
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        if self.is_root:
+            span_exporter.submit(self.trace)
+
+# The innermost open span of a sampled request; None means "not traced" and costs one lookup
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def parse_traceparent(traceparent: str) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent_id, sampled) of a valid W3C traceparent, None for anything else"""
+    match = TRACEPARENT_PATTERN.match(traceparent.strip())
+    if match is None:
+        return None
+    version, trace_id, parent_id, flags, rest = match.groups()
+    # Version ff is forbidden, all-zero ids are invalid, and version 00 has exactly four fields
+    if version == "ff" or (version == "00" and rest) or trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+def start_trace(name: str, kind: int = SERVER, traceparent: Optional[str] = None) -> Optional[Span]:
+    """
+    Root span for this process, or None. Tracing is off unless TRACE_SAMPLE_RATE > 0; when on, a valid
+    W3C traceparent decides sampling and supplies the trace id, and other requests sample at the rate.
+    """
+    if TRACE_SAMPLE_RATE <= 0:
+        return None
+    parsed = parse_traceparent(traceparent) if traceparent else None
+    if parsed is not None:
+        trace_id, parent_id, sampled = parsed
+        if not sampled:
+            return None  # caller decided not to sample
+    else:
+        if random.random() >= TRACE_SAMPLE_RATE:
+            return None
+        trace_id, parent_id = os.urandom(16).hex(), None
+    trace = Trace(trace_id)
+    root = Span(trace, name, kind, parent_id, is_root=True)
+    trace.spans.append(root)
+    return root
+
+def start_span(name: str, kind: int = INTERNAL, parent: Optional[Span] = None) -> Optional[Span]:
+    parent = parent or current_span.get()
+    if parent is None:
+        return None
+    trace = parent.trace
+    if len(trace.spans) >= TRACE_MAX_SPANS:
+        trace.dropped += 1
+        return None
+    span = Span(trace, name, kind, parent.span_id)
+    trace.spans.append(span)
+    return span
+
+@contextmanager
+def span(name: str, kind: int = INTERNAL, parent: Optional[Span] = None, **attributes):
+    """Child span of the current one for the duration of the block; a no-op when the request is not traced"""
+    child = start_span(name, kind, parent)
+    if child is None:
+        yield None
+        return
+    child.attributes.update(attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.error = repr(e)
+        raise
+    finally:
+        current_span.reset(token)
+        child.end()
+
+def bind_context(fn: Callable) -> Callable:
+    """Carry the caller's trace context into a thread pool or worker thread"""
+    return partial(copy_context().run, fn)
+
+def record_span(parent: Optional[Span], name: str, start_ns: int, end_ns: int, **attributes):
+    """Add an already-finished span, e.g. for work done on another thread on the parent's behalf"""
+    child = start_span(name, INTERNAL, parent)
+    if child is not None:
+        child.start_ns = start_ns
+        child.end_ns = end_ns
+        child.attributes.update(attributes)
+
+def traced(fn: Callable, name: Optional[str] = None) -> Callable:
+    name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if current_span.get() is None:
+            return fn(*args, **kwargs)
+        with span(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def trace_functions(namespace: dict, prefix: str):
+    """Wrap every public function defined in a module's namespace (call at the end of the module)"""
+    module = namespace["__name__"]
+    for name, value in list(namespace.items()):
+        if inspect.isfunction(value) and value.__module__ == module and not name.startswith("_"):
+            namespace[name] = traced(value, f"{prefix}.{name}")
+
+def install_sql_spans(engine: Engine):
+    """A client span per SQL statement of a traced request"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        child = start_span(statement.split(None, 1)[0].upper() if statement else "SQL", CLIENT)
+        if child is not None:
+            child.attributes["db.system"] = engine.dialect.name
+            child.attributes["db.statement"] = statement[:SQL_STATEMENT_MAX_LENGTH]
+            if executemany:
+                child.attributes["db.executemany"] = True
+        conn.info.setdefault("trace_spans", []).append(child)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        child = conn.info["trace_spans"].pop()
+        if child is not None:
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                child.attributes["db.rowcount"] = cursor.rowcount
+            child.end()
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        spans = connection.info.get("trace_spans") if connection is not None else None
+        if spans:
+            child = spans.pop()
+            if child is not None:
+                child.error = repr(exception_context.original_exception)
+                child.end()
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def to_otlp(trace: Trace) -> dict:
+    """One trace as an OTLP/JSON ExportTraceServiceRequest"""
+    spans = []
+    for item in trace.spans:
+        entry = {
+            "traceId": trace.trace_id,
+            "spanId": item.span_id,
+            "name": item.name,
+            "kind": item.kind,
+            "startTimeUnixNano": str(item.start_ns),
+            "endTimeUnixNano": str(item.end_ns or item.start_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in item.attributes.items()],
+            "status": {"code": 2, "message": item.error} if item.error else {"code": 1},
+        }
+        if item.parent_id:
+            entry["parentSpanId"] = item.parent_id
+        spans.append(entry)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "app.utils.tracing"}, "spans": spans}]
+        }]
+    }
+
+class SpanExporter:
+    """Appends finished traces to TRACE_EXPORT_PATH as OTLP/JSON lines from a background thread"""
+
+    def __init__(self, path: str = TRACE_EXPORT_PATH):
+        self.path = path
+        self.traces: "queue.Queue[Optional[Trace]]" = queue.Queue(maxsize=TRACE_EXPORT_QUEUE_SIZE)
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    def submit(self, trace: Trace):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self.thread.start()
+        try:
+            self.traces.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            trace = self.traces.get()
+            if trace is None:
+                return
+            batch = [trace]
+            while len(batch) < 100:
+                try:
+                    trace = self.traces.get_nowait()
+                except queue.Empty:
+                    break
+                if trace is None:
+                    self._write(batch)
+                    return
+                batch.append(trace)
+            self._write(batch)
+
+    def _write(self, batch: List[Trace]):
+        try:
+            with open(self.path, "a") as f:
+                for trace in batch:
+                    f.write(json.dumps(to_otlp(trace), separators=(",", ":")) + "\n")
+            self.exported += len(batch)
+        except OSError as e:
+            logger.error("Trace export to %s failed: %s", self.path, e)
+
+    def flush(self, timeout: float = 5.0):
+        """Write queued traces and stop the exporter thread (it restarts on the next trace)"""
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.traces.put(None)
+            thread.join(timeout)
+
+class TracingMiddleware:
+    """ASGI middleware opening the root span of each sampled request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope.get("headers", ()):
+            if name == b"traceparent":
+                incoming = value.decode("latin-1")
+                break
+        root = start_trace(f"{scope['method']} {scope['path']}", SERVER, incoming)
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        token = current_span.set(root)
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as e:
+            root.error = repr(e)
+            raise
+        finally:
+            current_span.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                root.name = f"{scope['method']} {route}"
+                root.attributes["http.route"] = route
+            root.attributes["http.method"] = scope["method"]
+            root.attributes["http.target"] = scope["path"]
+            root.attributes["http.status_code"] = status[0]
+            if status[0] >= 500 and root.error is None:
+                root.error = f"HTTP {status[0]}"
+            if root.trace.dropped:
+                root.attributes["trace.dropped_spans"] = root.trace.dropped
+            root.end()
+
+# Global instance for the application
+span_exporter = SpanExporter()
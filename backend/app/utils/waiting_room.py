@@ -0,0 +1,179 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import os
+import threading
+import time
+import uuid
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.orm import Session
+import app.crud as crud
+import app.schemas as schemas
+from app.sharding import PRIMARY_SHARD, shard_router
+
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+WAITING_ROOM_ADMISSION_MINUTES = int(os.getenv("WAITING_ROOM_ADMISSION_MINUTES", "15"))
+WAITING_ROOM_TICKET_HOURS = int(os.getenv("WAITING_ROOM_TICKET_HOURS", "6"))
+
+# Gated routes read the caller's access token with this; it is only checked while a room is active
+optional_bearer = HTTPBearer(auto_error=False)
+
+class WaitingRoom:
+    """Admits queued users in join order at a fixed rate, after an initial burst"""
+
+    def __init__(self, scope: str, target_id: int, admit_per_second: float, burst: int):
+        self.scope = scope
+        self.target_id = target_id
+        self.key = f"{scope}:{target_id}"
+        self.room_id = uuid.uuid4().hex[:12]  # invalidates tokens from earlier rooms on the same target
+        self.admit_per_second = admit_per_second
+        self.burst = burst
+        self.opened_at = time.monotonic()
+        self.joined = 0
+        self.lock = threading.Lock()
+
+    def join(self) -> int:
+        with self.lock:
+            self.joined += 1
+            return self.joined
+
+    def admitted_through(self) -> int:
+        """Highest queue position currently allowed in"""
+        return self.burst + int((time.monotonic() - self.opened_at) * self.admit_per_second)
+
+class WaitingRoomManager:
+    """Waiting rooms by show or movie; all position checks are served from memory (per process)"""
+
+    def __init__(self):
+        self.rooms: Dict[str, WaitingRoom] = {}
+        self.show_movies: Dict[int, int] = {}  # show_id -> movie_id, for movie-wide rooms
+        self.lock = threading.Lock()
+
+    def open(self, scope: str, target_id: int, admit_per_second: float, burst: int) -> WaitingRoom:
+        room = WaitingRoom(scope, target_id, admit_per_second, burst)
+        with self.lock:
+            self.rooms[room.key] = room
+        return room
+
+    def close(self, scope: str, target_id: int) -> bool:
+        with self.lock:
+            return self.rooms.pop(f"{scope}:{target_id}", None) is not None
+
+    def get(self, scope: str, target_id: int) -> Optional[WaitingRoom]:
+        return self.rooms.get(f"{scope}:{target_id}")
+
+    def room_for_show(self, db: Session, show_id: int) -> Optional[WaitingRoom]:
+        if not self.rooms:
+            return None
+        room = self.rooms.get(f"show:{show_id}")
+        if room is not None or not any(key.startswith("movie:") for key in self.rooms):
+            return room
+        movie_id = self.show_movies.get(show_id)
+        if movie_id is None:
+            show = crud.get_show(db, show_id)
+            if show is None:
+                return None
+            movie_id = self.show_movies[show_id] = show.movie_id
+        return self.rooms.get(f"movie:{movie_id}")
+
+    def _token(self, room: WaitingRoom, token_type: str, expires: timedelta, position: int, user_id: int) -> str:
+        from jose import jwt  # deferred: python-jose pulls in cryptography
+        return jwt.encode({
+            "room": room.key,
+            "rid": room.room_id,
+            "typ": token_type,
+            "pos": position,
+            "uid": user_id,  # tokens only work for the user who queued
+            "exp": datetime.utcnow() + expires
+        }, SECRET_KEY, algorithm=ALGORITHM)
+
+    def _decode(self, token: str, token_type: str) -> Optional[dict]:
+        from jose import JWTError, jwt
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            return None
+        if claims.get("typ") != token_type:
+            return None
+        room = self.rooms.get(claims.get("room"))
+        if room is None or room.room_id != claims.get("rid"):
+            return None
+        return claims
+
+    def _user_id(self, credentials: Optional[HTTPAuthorizationCredentials]) -> Optional[int]:
+        """Id of the user an access token was issued to, or None"""
+        from jose import JWTError, jwt
+        if credentials is None:
+            return None
+        try:
+            email = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except JWTError:
+            return None
+        if email is None:
+            return None
+        db = shard_router.session(PRIMARY_SHARD)
+        try:
+            user = crud.get_user_by_email(db, email=email)
+            return user.id if user else None
+        finally:
+            db.close()
+
+    def join(self, room: WaitingRoom, user_id: int) -> schemas.WaitingRoomTicket:
+        position = room.join()
+        return schemas.WaitingRoomTicket(
+            room=room.key,
+            position=position,
+            queue_token=self._token(room, "queue", timedelta(hours=WAITING_ROOM_TICKET_HOURS), position, user_id)
+        )
+
+    def position(self, queue_token: str) -> Optional[schemas.WaitingRoomPosition]:
+        claims = self._decode(queue_token, "queue")
+        if claims is None:
+            return None
+        room = self.rooms.get(claims["room"])
+        if room is None:
+            return None  # closed since the token was checked
+        admitted_through = room.admitted_through()
+        ahead = max(0, claims["pos"] - admitted_through)
+        admitted = ahead == 0
+        return schemas.WaitingRoomPosition(
+            room=room.key,
+            position=claims["pos"],
+            admitted_through=admitted_through,
+            ahead=ahead,
+            estimated_wait_seconds=ahead / room.admit_per_second if room.admit_per_second > 0 else None,
+            admitted=admitted,
+            admission_token=self._token(
+                room, "admission", timedelta(minutes=WAITING_ROOM_ADMISSION_MINUTES), claims["pos"], claims["uid"]
+            ) if admitted else None
+        )
+
+    def require_admission(self, db: Session, show_id: int, admission_token: Optional[str],
+                          credentials: Optional[HTTPAuthorizationCredentials]):
+        """Raise 403 unless the show has no active room or the token admits the calling user into it"""
+        room = self.room_for_show(db, show_id)
+        if room is None:
+            return
+        claims = self._decode(admission_token, "admission") if admission_token else None
+        if claims is None or claims["room"] != room.key:
+            raise HTTPException(
+                status_code=403,
+                detail=f"Waiting room active for {room.key}; join it and retry with an X-Admission-Token"
+            )
+        if claims.get("uid") is None or claims["uid"] != self._user_id(credentials):
+            raise HTTPException(status_code=403, detail="Admission token was issued to another user")
+
+    def status(self, room: WaitingRoom) -> schemas.WaitingRoomStatus:
+        return schemas.WaitingRoomStatus(
+            room=room.key,
+            scope=room.scope,
+            target_id=room.target_id,
+            admit_per_second=room.admit_per_second,
+            burst=room.burst,
+            joined=room.joined,
+            admitted_through=room.admitted_through()
+        )
+
+# Global instance for the application
+waiting_room_manager = WaitingRoomManager()
@@ -0,0 +1,109 @@
+"""
+Contention benchmark: seat-lock throughput on one hot show,
+regular per-request transactions versus flash-sale mode.
+
+    python benchmarks/flash_sale_contention.py --threads 8 16 32 --claims 2000
+
+Uses DATABASE_URL if set, otherwise a throwaway SQLite file.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/flash_sale_bench.db"
+
+from datetime import date, time as show_time, timedelta
+from fastapi import HTTPException
+from sqlalchemy import delete
+from app.database import SessionLocal, engine
+from app import crud, models, schemas
+from app.utils.flash_sale import flash_sale_manager
+
+def create_show() -> int:
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        movie = crud.create_movie(db, schemas.MovieCreate(
+            title="Benchmark Blockbuster", duration=150, genre="Action", rating="PG-13", release_date=date.today()
+        ))
+        theatre = crud.create_theatre(db, schemas.TheatreCreate(name="Benchmark Plaza", city="Benchmark", address="1 Bench St"))
+        show = crud.create_show(db, schemas.ShowCreate(
+            movie_id=movie.id, theatre_id=theatre.id, show_date=date.today() + timedelta(days=1),
+            show_time=show_time(20, 0), price=12.5
+        ))
+        return show.id
+    finally:
+        db.close()
+
+def reset_seats(show_id: int):
+    db = SessionLocal()
+    try:
+        db.execute(delete(models.ShowSeat).where(models.ShowSeat.show_id == show_id))
+        db.commit()
+        return [seat.id for seat in crud.get_seats_by_show(db, show_id)]
+    finally:
+        db.close()
+
+def make_claims(seat_ids, count, seed):
+    rng = random.Random(seed)
+    return [rng.sample(seat_ids, rng.randint(1, 4)) for _ in range(count)]
+
+def run(show_id, claims, threads, flash_sale):
+    def claim(args):
+        index, seats = args
+        if flash_sale:
+            try:
+                return flash_sale_manager.lock_seats(show_id, seats, f"bench-{index}").success
+            except HTTPException:
+                return None  # writer busy past the claim timeout
+        db = SessionLocal()
+        try:
+            return crud.lock_seats(db, show_id, seats, f"bench-{index}").success
+        except Exception:
+            db.rollback()
+            return None
+        finally:
+            db.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        outcomes = list(pool.map(claim, enumerate(claims)))
+    elapsed = time.perf_counter() - start
+    return {
+        "claims_per_s": len(claims) / elapsed,
+        "won": sum(1 for outcome in outcomes if outcome),
+        "errors": sum(1 for outcome in outcomes if outcome is None),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--claims", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    show_id = create_show()
+    print(f"{'mode':<12}{'threads':>8}{'claims/s':>12}{'won':>8}{'errors':>8}")
+    for threads in args.threads:
+        for flash_sale in (False, True):
+            seat_ids = reset_seats(show_id)
+            claims = make_claims(seat_ids, args.claims, args.seed)
+            if flash_sale:
+                with SessionLocal() as db:
+                    flash_sale_manager.enable(db, show_id)
+            result = run(show_id, claims, threads, flash_sale)
+            if flash_sale:
+                flash_sale_manager.disable(show_id)
+            mode = "flash-sale" if flash_sale else "regular"
+            print(f"{mode:<12}{threads:>8}{result['claims_per_s']:>12.0f}{result['won']:>8}{result['errors']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+End-to-end load test of the booking funnel:
+list movies -> movie shows -> seat map -> lock -> book -> initiate payment -> confirm payment.
+
+    python benchmarks/load_test.py --users 50 --duration 30 --buyers 0.3 --hot-shows 2 --hot-share 0.8
+    python benchmarks/load_test.py --base-url http://localhost:8000 --users 200
+
+Without --base-url the app is driven in-process over an ASGI transport, using DATABASE_URL
+if set and otherwise a throwaway SQLite file. An empty database gets a small catalog first.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STEPS = ["movies", "shows", "seats", "lock", "book", "initiate", "confirm"]
+PASSWORD = "password123"
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.journeys = Counter()
+
+    def record(self, step: str, seconds: float):
+        self.latencies[step].append(seconds)
+
+    def error(self, step: str, kind: str):
+        self.errors[(step, kind)] += 1
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def timed(stats: Stats, step: str, request):
+    start = time.perf_counter()
+    try:
+        response = await request
+    except Exception as e:
+        stats.record(step, time.perf_counter() - start)
+        stats.error(step, type(e).__name__)
+        return None
+    stats.record(step, time.perf_counter() - start)
+    if response.status_code >= 400:
+        # A 400 from booking means the seats were taken in between: contention, not a failure
+        kind = "conflict" if step == "book" and response.status_code == 400 else f"http_{response.status_code}"
+        stats.error(step, kind)
+    return response
+
+def ok(response) -> bool:
+    return response is not None and response.status_code < 400
+
+async def seed_catalog(client: httpx.AsyncClient, shows: int):
+    movie = (await client.post("/api/movies", json={
+        "title": "Load Test Feature", "duration": 120, "genre": "Action", "rating": "PG-13",
+        "release_date": date.today().isoformat()
+    })).json()
+    for index in range(shows):
+        theatre = (await client.post("/api/theatres", json={
+            "name": f"Load Test Cinema {index + 1}", "city": "Loadville", "address": f"{index + 1} Load St"
+        })).json()
+        await client.post("/api/shows", json={
+            "movie_id": movie["id"], "theatre_id": theatre["id"],
+            "show_date": (date.today() + timedelta(days=1)).isoformat(), "show_time": "20:00:00", "price": 12.5
+        })
+
+async def discover_shows(client: httpx.AsyncClient, max_movies: int):
+    shows = []
+    for movie in (await client.get("/api/movies", params={"limit": max_movies})).json():
+        shows.extend((movie["id"], show["id"]) for show in (await client.get(f"/api/movies/{movie['id']}/shows")).json())
+    return shows
+
+async def ensure_accounts(client: httpx.AsyncClient, count: int, run_id: str):
+    emails = []
+    for index in range(count):
+        email = f"loadtest-{run_id}-{index}@example.com"
+        response = await client.post("/api/users/register", json={
+            "email": email, "first_name": "Load", "last_name": f"Tester{index}", "password": PASSWORD
+        })
+        response.raise_for_status()
+        emails.append(email)
+    return emails
+
+async def journey(client, stats: Stats, args, rng: random.Random, targets, hot, emails, user_id: int):
+    movie_id, show_id = rng.choice(hot) if hot and rng.random() < args.hot_share else rng.choice(targets)
+    buyer = rng.random() < args.buyers
+
+    async def think():
+        if args.think_ms:
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+
+    if not ok(await timed(stats, "movies", client.get("/api/movies"))):
+        return "failed"
+    await think()
+    if not ok(await timed(stats, "shows", client.get(f"/api/movies/{movie_id}/shows"))):
+        return "failed"
+    await think()
+    seats = await timed(stats, "seats", client.get(f"/api/shows/{show_id}/seats"))
+    if not ok(seats):
+        return "failed"
+    if not buyer:
+        return "browsed"
+
+    free = [seat["id"] for seat in seats.json() if not seat["is_booked"] and not seat["is_locked"]]
+    wanted = rng.randint(1, args.max_seats)
+    if len(free) < wanted:
+        stats.error("seats", "sold_out")
+        return "sold_out"
+    seat_ids = rng.sample(free, wanted)
+    await think()
+
+    session = f"load-{user_id}-{rng.getrandbits(32):08x}"
+    lock = await timed(stats, "lock", client.post("/api/seats/lock", json={
+        "show_id": show_id, "seat_ids": seat_ids, "user_session": session
+    }))
+    if not ok(lock):
+        return "failed"
+    if not lock.json()["success"]:
+        stats.error("lock", "conflict")
+        return "conflict"
+
+    booking = await timed(stats, "book", client.post("/api/bookings", json={
+        "show_id": show_id, "seat_ids": seat_ids, "user_email": rng.choice(emails), "user_session": session
+    }))
+    if not ok(booking):
+        return "conflict" if booking is not None and booking.status_code == 400 else "failed"
+    booking = booking.json()
+
+    payment = await timed(stats, "initiate", client.post("/api/payments/initiate", json={
+        "booking_id": booking["id"], "amount": booking["total_amount"]
+    }))
+    if not ok(payment):
+        return "failed"
+    await think()
+
+    status = "success" if rng.random() >= args.payment_failure_rate else "failed"
+    if not ok(await timed(stats, "confirm", client.post("/api/payments/confirm", json={
+        "transaction_id": payment.json()["transaction_id"], "status": status
+    }))):
+        return "failed"
+    return "booked"
+
+async def run(args):
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+        app = None
+    else:
+        if not os.getenv("DATABASE_URL"):
+            os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/load_test.db"
+        from app.main import app
+        from app.sharding import migrate_shards
+        migrate_shards()
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver", timeout=args.timeout)
+
+    try:
+        targets = await discover_shows(client, args.catalog_movies)
+        if not targets:
+            await seed_catalog(client, args.seed_shows)
+            targets = await discover_shows(client, args.catalog_movies)
+        run_id = f"{int(time.time())}-{random.getrandbits(16):04x}"
+        emails = await ensure_accounts(client, args.accounts, run_id)
+        hot = targets[:args.hot_shows]
+
+        stats = Stats()
+        deadline = time.perf_counter() + args.duration
+        remaining = [args.journeys] if args.journeys else None
+
+        async def virtual_user(user_id: int):
+            rng = random.Random(f"{args.seed}:{user_id}")
+            while time.perf_counter() < deadline:
+                if remaining is not None:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                outcome = await journey(client, stats, args, rng, targets, hot, emails, user_id)
+                stats.journeys[outcome] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(user_id) for user_id in range(args.users)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await client.aclose()
+        if app is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    return report(stats, elapsed, args)
+
+def report(stats: Stats, elapsed: float, args) -> dict:
+    requests = sum(len(values) for values in stats.latencies.values())
+    journeys = sum(stats.journeys.values())
+    print(f"\n{journeys} journeys, {requests} requests in {elapsed:.1f}s "
+          f"({journeys / elapsed:.1f} journeys/s, {requests / elapsed:.1f} req/s, {args.users} virtual users)")
+    print(f"outcomes: {dict(stats.journeys)}\n")
+    print(f"{'step':<10}{'count':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    steps = {}
+    for step in STEPS:
+        values = stats.latencies.get(step)
+        if not values:
+            continue
+        steps[step] = {
+            "count": len(values),
+            "per_second": len(values) / elapsed,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "max_ms": max(values) * 1000,
+        }
+        row = steps[step]
+        print(f"{step:<10}{row['count']:>8}{row['per_second']:>9.1f}{row['p50_ms']:>9.1f}"
+              f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+
+    if stats.errors:
+        print(f"\n{'step':<10}{'error':<20}{'count':>8}")
+        for (step, kind), count in sorted(stats.errors.items()):
+            print(f"{step:<10}{kind:<20}{count:>8}")
+
+    return {
+        "elapsed_s": elapsed,
+        "virtual_users": args.users,
+        "journeys": dict(stats.journeys),
+        "requests_per_second": requests / elapsed,
+        "steps": steps,
+        "errors": [{"step": step, "kind": kind, "count": count} for (step, kind), count in sorted(stats.errors.items())],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="drive a running server instead of the in-process app")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run")
+    parser.add_argument("--journeys", type=int, default=0, help="stop after this many journeys (0: duration only)")
+    parser.add_argument("--buyers", type=float, default=0.3, help="share of journeys that go on to book")
+    parser.add_argument("--max-seats", type=int, default=4)
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between funnel steps")
+    parser.add_argument("--hot-shows", type=int, default=1, help="number of hot shows")
+    parser.add_argument("--hot-share", type=float, default=0.5, help="share of journeys aimed at the hot shows")
+    parser.add_argument("--payment-failure-rate", type=float, default=0.1)
+    parser.add_argument("--accounts", type=int, default=5, help="test accounts to register for bookings")
+    parser.add_argument("--catalog-movies", type=int, default=20, help="movies whose shows are targeted")
+    parser.add_argument("--seed-shows", type=int, default=10, help="shows to create when the catalog is empty")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Worker cold-start report: import time per module and time from process start to the
+first served request, measured in fresh interpreter processes.
+
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --runs 10 --target-ms 300 --top 25
+
+Each run starts a new process that imports app.main, runs the lifespan startup and
+serves GET /health over an in-process ASGI transport. Uses DATABASE_URL, or a throwaway
+SQLite file migrated once up front. Exits with status 1 when the median time to first
+request exceeds --target-ms.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def child():
+    """One cold start; prints phase timings as JSON"""
+    started = time.time()
+    sys.path.insert(0, BACKEND)
+    import asyncio
+
+    from app.main import app
+    from app.utils.startup import startup_timer
+    imported = time.time()
+
+    async def first_request():
+        import httpx
+        async with app.router.lifespan_context(app):
+            ready = time.time()
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+                response = await client.get("/health")
+                response.raise_for_status()
+            return ready, time.time()
+
+    ready, served = asyncio.run(first_request())
+    process_started = startup_timer.started
+    print(json.dumps({
+        "interpreter_ms": (started - process_started) * 1000,
+        "import_ms": (imported - started) * 1000,
+        "lifespan_ms": (ready - imported) * 1000,
+        "first_request_ms": (served - ready) * 1000,
+        "total_ms": (served - process_started) * 1000,
+    }))
+
+def import_profile(env: dict):
+    """Self and cumulative import time per module from -X importtime, in ms"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to measure")
+    parser.add_argument("--target-ms", type=float, default=300.0, help="budget for process start to first request")
+    parser.add_argument("--top", type=int, default=15, help="slowest app modules and packages to list")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    env = dict(os.environ, LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"))
+    if not env.get("DATABASE_URL"):
+        env["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/startup.db"
+    subprocess.run([sys.executable, "migrate.py"], cwd=BACKEND, env=env, check=True, capture_output=True)
+
+    modules = import_profile(env)
+    packages = defaultdict(float)
+    for name, (self_ms, _) in modules.items():
+        packages[name.split(".")[0]] += self_ms
+    print("Import time by top-level package (self time, ms)")
+    for name, total in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<32}{total:>10.1f}")
+    print("App modules (self / cumulative ms)")
+    app_modules = sorted(((name, times) for name, times in modules.items() if name.startswith("app")), key=lambda item: -item[1][0])
+    for name, (self_ms, cumulative_ms) in app_modules[:args.top]:
+        print(f"  {name:<32}{self_ms:>10.1f}{cumulative_ms:>10.1f}")
+
+    runs = []
+    for _ in range(args.runs):
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], cwd=BACKEND, env=env,
+                                capture_output=True, text=True, check=True)
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    print(f"Cold start over {args.runs} runs (median ms)")
+    for phase in ("interpreter_ms", "import_ms", "lifespan_ms", "first_request_ms", "total_ms"):
+        print(f"  {phase[:-3]:<32}{statistics.median(run[phase] for run in runs):>10.1f}")
+
+    total = statistics.median(run["total_ms"] for run in runs)
+    within = total <= args.target_ms
+    print(f"Time to first request {total:.0f} ms vs target {args.target_ms:.0f} ms: {'OK' if within else 'OVER'}")
+    sys.exit(0 if within else 1)
+
+if __name__ == "__main__":
+    main()
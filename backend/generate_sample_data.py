@@ -8,9 +8,11 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from app.database import SessionLocal, engine
+from typing import Dict
 from app import models, schemas, crud
+from app.sharding import PRIMARY_SHARD, migrate_shards, shard_router
 from datetime import date, time, datetime, timedelta
 import random
 from faker import Faker
@@ -21,7 +23,7 @@ fake = Faker()
 def create_tables():
     """Create all database tables"""
     print("Creating database tables...")
-    models.Base.metadata.create_all(bind=engine)
+    migrate_shards()
     print("✅ Database tables created successfully!")
 
 def generate_movies(db: Session, count: int = 100):
@@ -109,7 +111,7 @@ def generate_movies(db: Session, count: int = 100):
     print(f"✅ Generated {len(created_movies)} movies")
     return created_movies
 
-def generate_theatres(db: Session, count: int = 60):
+def generate_theatres(sessions: Dict[int, Session], count: int = 60):
     """Generate sample theatres across many cities"""
     print(f"Generating {count} theatres...")
     
@@ -157,7 +159,7 @@ def generate_theatres(db: Session, count: int = 60):
             total_seats=random.choice([80, 100, 120, 150, 200, 250, 300])
         )
         
-        theatre = crud.create_theatre(db, theatre_data)
+        theatre = crud.create_theatre(sessions[shard_router.for_city(city)], theatre_data)
         created_theatres.append(theatre)
         
         if (i + 1) % 10 == 0:
@@ -166,7 +168,7 @@ def generate_theatres(db: Session, count: int = 60):
     print(f"✅ Generated {len(created_theatres)} theatres")
     return created_theatres
 
-def generate_shows(db: Session, movies, theatres, count: int = 500):
+def generate_shows(sessions: Dict[int, Session], movies, theatres, count: int = 500):
     """Generate sample shows with better distribution"""
     print(f"Generating {count} shows...")
     
@@ -216,7 +218,10 @@ def generate_shows(db: Session, movies, theatres, count: int = 500):
             price=round(base_price, 2)
         )
         
-        show = crud.create_show(db, show_data)
+        # Shows live with their theatre; the shard gets a copy of the movie
+        show_db = sessions[shard_router.for_id(theatre.id)]
+        shard_router.copy_reference(show_db, models.Movie, movie.id)
+        show = crud.create_show(show_db, show_data)
         created_shows.append(show)
         
         if (i + 1) % 50 == 0:
@@ -247,7 +252,7 @@ def generate_users(db: Session, count: int = 200):
     print(f"✅ Generated {len(created_users)} users")
     return created_users
 
-def generate_bookings(db: Session, users, shows, count: int = 300):
+def generate_bookings(sessions: Dict[int, Session], users, shows, count: int = 300):
     """Generate sample bookings"""
     print(f"Generating {count} bookings...")
     
@@ -255,12 +260,11 @@ def generate_bookings(db: Session, users, shows, count: int = 300):
     for i in range(count):
         user = random.choice(users)
         show = random.choice(shows)
+        db = sessions[shard_router.for_id(show.id)]
+        shard_router.copy_user(db, user.email)
         
         # Get available seats for this show
-        available_seats = db.query(models.Seat).filter(
-            models.Seat.show_id == show.id,
-            models.Seat.is_booked == False
-        ).all()
+        available_seats = [seat for seat in crud.get_seats_by_show(db, show.id) if not seat.is_booked]
         
         if not available_seats:
             continue
@@ -314,7 +318,9 @@ def main():
     try:
         create_tables()
         
-        db = SessionLocal()
+        # One session per city shard; movies and users live on the primary
+        sessions = {shard: shard_router.session(shard) for shard in shard_router.shards}
+        db = sessions[PRIMARY_SHARD]
         
         try:
             # Check if data already exists
@@ -331,10 +337,10 @@ def main():
             
             # Generate data with larger counts
             movies = generate_movies(db, count=120)
-            theatres = generate_theatres(db, count=80)
-            shows = generate_shows(db, movies, theatres, count=600)
+            theatres = generate_theatres(sessions, count=80)
+            shows = generate_shows(sessions, movies, theatres, count=600)
             users = generate_users(db, count=250)
-            bookings = generate_bookings(db, users, shows, count=400)
+            bookings = generate_bookings(sessions, users, shows, count=400)
             
             print("\n" + "=" * 70)
             print("🎉 Enhanced sample data generation completed successfully!")
@@ -345,10 +351,15 @@ def main():
             print(f"  • {len(users)} users")
             print(f"  • {len(bookings)} bookings")
             
-            # Count total seats
-            total_seats = db.query(models.Seat).count()
-            booked_seats = db.query(models.Seat).filter(models.Seat.is_booked == True).count()
-            print(f"  • {total_seats} total seats created")
+            # Count total seats (from each show's layout; only sold and held seats are stored)
+            total_seats = sum(session.query(func.sum(models.TheatreLayout.seat_count)).join(
+                models.Show, models.Show.layout_id == models.TheatreLayout.id
+            ).scalar() or 0 for session in sessions.values())
+            booked_seats = sum(
+                session.query(models.ShowSeat).filter(models.ShowSeat.is_booked == True).count()
+                for session in sessions.values()
+            )
+            print(f"  • {total_seats} total seats")
             print(f"  • {booked_seats} seats booked ({round(booked_seats/total_seats*100, 1)}% occupancy)")
             
             # Show city distribution
@@ -368,10 +379,12 @@ def main():
             
         except Exception as e:
             print(f"❌ Error generating sample data: {e}")
-            db.rollback()
+            for session in sessions.values():
+                session.rollback()
             raise e
         finally:
-            db.close()
+            for session in sessions.values():
+                session.close()
             
     except Exception as e:
         print(f"❌ Setup failed: {e}")
@@ -0,0 +1,282 @@
+"""
+Generate large, deterministic datasets for scale and load testing
+Rows are generated in batches and written with bulk inserts (COPY on PostgreSQL),
+bypassing the per-row commits and per-user bcrypt of generate_sample_data.py.
+
+    python generate_scale_data.py --shows 100000 --users 1000000 --workers 8 --seed 7
+
+The same seed, start date and starting table state always produce the same rows.
+With city shards configured (SHARD_URLS / SHARD_CITIES), theatres go to their city's shard,
+shows are spread over shards in proportion to their theatres, and every shard gets reference
+copies of the generated movies and users.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import csv
+import io
+import random
+import time as timer
+from datetime import date, time, timedelta
+from multiprocessing import Pool
+from typing import Dict, List
+from sqlalchemy import func, text
+from app import models, crud
+from app.sharding import PRIMARY_SHARD, migrate_shards, shard_router
+from app.utils.seat_layout import default_layout_rows
+
+SEATS_PER_SHOW = 100  # every theatre gets the default layout: rows A-E of 20 seats
+# Raw DBAPI writes skip SQLAlchemy's type adapters, so dates and times are bound as
+# strings in SQLAlchemy's SQLite storage format (which PostgreSQL also accepts)
+SHOW_TIMES = [t.strftime("%H:%M:%S.%f") for t in
+              (time(9, 0), time(12, 0), time(14, 15), time(16, 30), time(18, 0), time(19, 30), time(21, 0), time(22, 30))]
+GENRES = ["Action", "Comedy", "Drama", "Horror", "Sci-Fi", "Romance", "Thriller", "Animation"]
+RATINGS = ["G", "PG", "PG-13", "R"]
+CITIES = ["Mumbai", "Delhi", "Bangalore", "Hyderabad", "Chennai", "Pune", "Kolkata",
+          "New York", "Los Angeles", "Chicago", "Houston", "Seattle", "Boston", "Austin"]
+FIRST_NAMES = ["Asha", "Ravi", "Maya", "Arjun", "Emma", "Liam", "Olivia", "Noah", "Priya", "Kiran"]
+LAST_NAMES = ["Shah", "Rao", "Iyer", "Smith", "Johnson", "Brown", "Patel", "Garcia", "Khan", "Lee"]
+PAYMENT_METHODS = ["card", "paypal", "applepay", "googlepay", "upi", "netbanking"]
+TEST_PASSWORD = "password123"
+
+class BulkWriter:
+    """Tuple-row bulk loader: COPY on PostgreSQL, executemany elsewhere"""
+
+    def __init__(self, bind):
+        self.engine = bind
+        self.is_postgres = bind.dialect.name == "postgresql"
+        self.placeholder = "?" if bind.dialect.paramstyle == "qmark" else "%s"
+
+    def write(self, table: str, columns, rows):
+        if not rows:
+            return
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            if self.is_postgres:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            else:
+                placeholders = ", ".join([self.placeholder] * len(columns))
+                cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+            raw.commit()
+        finally:
+            raw.close()
+
+def next_id(db, model, floor: int = 1) -> int:
+    return max((db.query(func.max(model.id)).scalar() or 0) + 1, floor)
+
+def partition_rng(seed: int, name: str, partition: int) -> random.Random:
+    return random.Random(f"{seed}:{name}:{partition}")
+
+def generate_catalog(writers: Dict[int, BulkWriter], args, offsets) -> Dict[int, List[int]]:
+    """Movies and theatres: small tables, written from the parent process; returns theatre ids by shard"""
+    rng = partition_rng(args.seed, "catalog", 0)
+    first_movie = offsets[PRIMARY_SHARD]["movie"]
+    movies = [
+        (first_movie + i, f"Scale Test Movie {first_movie + i}", "Generated for scale testing",
+         rng.randint(90, 180), rng.choice(GENRES), rng.choice(RATINGS), None,
+         (args.start_date - timedelta(days=rng.randint(0, 1800))).isoformat())
+        for i in range(args.movies)
+    ]
+    # Primary rows and the shards' reference copies share ids
+    for writer in writers.values():
+        writer.write("movies", ["id", "title", "description", "duration", "genre", "rating", "poster_url", "release_date"], movies)
+
+    theatres: Dict[int, list] = {}
+    for _ in range(args.theatres):
+        city = rng.choice(CITIES)
+        shard = shard_router.for_city(city)
+        rows = theatres.setdefault(shard, [])
+        theatre_id = offsets[shard]["theatre"] + len(rows)
+        rows.append((theatre_id, f"Scale Cinema {theatre_id}", city, f"{rng.randint(1, 999)} Test Street",
+                     SEATS_PER_SHOW, offsets[shard]["layout"]))
+    for shard, rows in theatres.items():
+        writers[shard].write("theatres", ["id", "name", "city", "address", "total_seats", "layout_id"], rows)
+    return {shard: [row[0] for row in rows] for shard, rows in sorted(theatres.items())}
+
+def generate_users(writers: Dict[int, BulkWriter], args, offsets):
+    """Users share one precomputed bcrypt hash; shards get reference copies without it"""
+    hashed_password = crud.hash_password(TEST_PASSWORD)
+    rng = partition_rng(args.seed, "users", 0)
+    first = offsets[PRIMARY_SHARD]["user"]
+    for start in range(0, args.users, args.batch_size):
+        rows = [
+            (first + i, f"scaleuser{first + i}@example.com", rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), hashed_password)
+            for i in range(start, min(start + args.batch_size, args.users))
+        ]
+        for shard, writer in writers.items():
+            writer.write("users", ["id", "email", "first_name", "last_name", "hashed_password"],
+                         rows if shard == PRIMARY_SHARD else [row[:-1] + ("",) for row in rows])
+
+def generate_partition(task):
+    """Shows, sold seat rows, bookings, booking seats and payments for one contiguous range of a shard's shows"""
+    partition, shard, first_show, show_count, theatre_ids, args, all_offsets = task
+    offsets = all_offsets[shard]
+    writer = BulkWriter(shard_router.engines[shard])
+    transaction_prefix = shard_router.transaction_prefix(shard)
+    rng = partition_rng(args.seed, "shows", partition)
+
+    shows, seats, bookings, booking_seats, payments = [], [], [], [], []
+    counts = {"shows": 0, "seats": 0, "bookings": 0, "booked_seats": 0}
+
+    def flush(force=False):
+        if force or len(booking_seats) >= args.batch_size:
+            writer.write("shows", ["id", "movie_id", "theatre_id", "show_date", "show_time", "price", "layout_id",
+                                   "available_count", "held_count"], shows)
+            writer.write("show_seats", ["show_id", "seat_id", "is_booked"], seats)
+            writer.write("bookings", ["id", "user_id", "show_id", "total_amount", "status", "payment_id"], bookings)
+            writer.write("booking_seats", ["id", "booking_id", "seat_id"], booking_seats)
+            writer.write("payments", ["id", "booking_id", "amount", "status", "payment_method", "transaction_id"], payments)
+            for rows in (shows, seats, bookings, booking_seats, payments):
+                rows.clear()
+
+    for show_id in range(first_show, first_show + show_count):
+        price = round(rng.uniform(5.0, 30.0), 2)
+        show = (
+            show_id,
+            all_offsets[PRIMARY_SHARD]["movie"] + rng.randrange(args.movies),
+            theatre_ids[rng.randrange(len(theatre_ids))],
+            (args.start_date + timedelta(days=rng.randrange(args.days))).isoformat(),
+            rng.choice(SHOW_TIMES),
+            price,
+            offsets["layout"]
+        )
+
+        # Booking and booking seat ids are derived from the show id, so partitions never collide
+        first_seat = offsets["booking_seat"] + (show_id - offsets["show"]) * SEATS_PER_SHOW
+        booked = set()
+        free = list(range(SEATS_PER_SHOW))
+        rng.shuffle(free)
+        target = int(SEATS_PER_SHOW * rng.uniform(0, args.max_occupancy))
+        booking_index = 0
+        while free and len(booked) < target:
+            size = min(rng.choices([1, 2, 3, 4, 5, 6], weights=[20, 35, 25, 15, 3, 2])[0], len(free))
+            taken = [free.pop() for _ in range(size)]
+            booking_id = offsets["booking"] + (show_id - offsets["show"]) * SEATS_PER_SHOW + booking_index
+            booking_index += 1
+            user_id = all_offsets[PRIMARY_SHARD]["user"] + rng.randrange(args.users)
+            transaction_id = f"{transaction_prefix}scale-{args.seed}-{booking_id}"
+            confirmed = rng.random() < 0.9
+            bookings.append((booking_id, user_id, show_id, size * price, "confirmed" if confirmed else "cancelled", transaction_id))
+            payments.append((booking_id, booking_id, size * price, "success" if confirmed else "failed",
+                             rng.choice(PAYMENT_METHODS), transaction_id))
+            for index in taken:
+                booking_seats.append((first_seat + index, booking_id, index + 1))
+                if confirmed:
+                    booked.add(index)
+            counts["bookings"] += 1
+
+        # Only sold seats get a row; the rest of the layout is free
+        seats.extend((show_id, index + 1, True) for index in sorted(booked))
+        shows.append(show + (SEATS_PER_SHOW - len(booked), 0))
+        counts["shows"] += 1
+        counts["seats"] += SEATS_PER_SHOW
+        counts["booked_seats"] += len(booked)
+        flush()
+
+    flush(force=True)
+    return counts
+
+def init_worker():
+    # Connections inherited from the parent must not be shared across processes
+    for shard_engine in shard_router.engines.values():
+        shard_engine.dispose(close=False)
+
+def reset_sequences():
+    """Explicit ids bypass PostgreSQL sequences; move them past the generated rows"""
+    for shard_engine in shard_router.engines.values():
+        if shard_engine.dialect.name != "postgresql":
+            continue
+        with shard_engine.begin() as connection:
+            for table in ("movies", "theatres", "users", "shows", "bookings", "booking_seats", "payments"):
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 1))"
+                ))
+    # Tables a shard got no rows for were just reset to 1; put them back at the start of the shard's range
+    shard_router.reserve_id_ranges()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=500)
+    parser.add_argument("--theatres", type=int, default=200)
+    parser.add_argument("--shows", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=45, help="spread shows over this many days")
+    parser.add_argument("--max-occupancy", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--start-date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--partition-shows", type=int, default=1000, help="shows per worker task")
+    parser.add_argument("--batch-size", type=int, default=50000, help="rows per bulk insert")
+    args = parser.parse_args()
+
+    if any(shard_engine.dialect.name == "sqlite" for shard_engine in shard_router.engines.values()) and args.workers > 1:
+        print("SQLite allows a single writer; using --workers 1")
+        args.workers = 1
+
+    migrate_shards()
+    offsets = {}
+    for shard in shard_router.shards:
+        db = shard_router.session(shard)
+        try:
+            # Ids continue after existing rows, within the shard's id range
+            floor = shard * shard_router.id_span + 1
+            offsets[shard] = {
+                "movie": next_id(db, models.Movie, floor),
+                "theatre": next_id(db, models.Theatre, floor),
+                "user": next_id(db, models.User, floor),
+                "show": next_id(db, models.Show, floor),
+                "booking_seat": next_id(db, models.BookingSeat, floor),
+                "booking": max(next_id(db, models.Booking, floor), next_id(db, models.Payment, floor)),
+                "layout": crud.get_or_create_layout(db, default_layout_rows(SEATS_PER_SHOW)).id,
+            }
+            db.commit()
+        finally:
+            db.close()
+
+    writers = {shard: BulkWriter(shard_engine) for shard, shard_engine in shard_router.engines.items()}
+    started = timer.perf_counter()
+    theatre_ids = generate_catalog(writers, args, offsets)
+    generate_users(writers, args, offsets)
+    print(f"Catalog and {args.users} users written in {timer.perf_counter() - started:.1f}s")
+
+    # Shows are spread over shards in proportion to their theatres
+    tasks = []
+    shows_left = args.shows
+    for index, (shard, ids) in enumerate(theatre_ids.items()):
+        count = shows_left if index == len(theatre_ids) - 1 else args.shows * len(ids) // args.theatres
+        shows_left -= count
+        tasks.extend(
+            (len(tasks) + partition, shard, offsets[shard]["show"] + first, min(args.partition_shows, count - first), ids, args, offsets)
+            for partition, first in enumerate(range(0, count, args.partition_shows))
+        )
+    totals = {"shows": 0, "seats": 0, "bookings": 0, "booked_seats": 0}
+    if args.workers > 1:
+        for shard_engine in shard_router.engines.values():
+            shard_engine.dispose()
+        with Pool(args.workers, initializer=init_worker) as pool:
+            results = pool.imap_unordered(generate_partition, tasks)
+            for counts in results:
+                for key in totals:
+                    totals[key] += counts[key]
+    else:
+        for task in tasks:
+            counts = generate_partition(task)
+            for key in totals:
+                totals[key] += counts[key]
+
+    reset_sequences()
+    elapsed = timer.perf_counter() - started
+    rows = totals["booked_seats"] + 2 * totals["bookings"] + args.users
+    print(f"Generated {totals['shows']} shows, {totals['seats']} seats, {totals['bookings']} bookings "
+          f"({totals['booked_seats']} seats booked) in {elapsed:.1f}s (~{rows / elapsed:,.0f} rows/s)")
+    print(f"Test users: scaleuser<N>@example.com / {TEST_PASSWORD}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Apply database migrations to the primary and every shard (run once per deploy, before starting the API workers)
+
+    python migrate.py            # apply everything pending
+    python migrate.py --status   # show applied and pending versions
+    python migrate.py --to 3     # stop after version 3
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.migrations import MIGRATIONS, current_version, pending_migrations
+from app.sharding import migrate_shards, shard_router
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="list migrations without applying them")
+    parser.add_argument("--to", type=int, default=None, help="highest version to apply")
+    args = parser.parse_args()
+
+    if args.status:
+        for shard, engine in shard_router.engines.items():
+            with engine.connect() as connection:
+                version = current_version(connection)
+            pending = {item.version for item in pending_migrations(engine)}
+            if len(shard_router.engines) > 1:
+                print(f"Shard {shard}: {shard_router.describe()[shard]}")
+            for item in MIGRATIONS:
+                print(f"{item.version:>4}  {'pending' if item.version in pending else 'applied':<8} {item.description}")
+            print(f"Database is at version {version}")
+        return
+
+    for shard, applied in migrate_shards(args.to).items():
+        label = f"shard {shard}: " if len(shard_router.engines) > 1 else ""
+        for item in applied:
+            print(f"{label}Applied {item.version}: {item.description}")
+        if not applied:
+            print(f"{label}Database is up to date")
+
+if __name__ == "__main__":
+    main()
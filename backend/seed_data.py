@@ -4,17 +4,19 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from sqlalchemy.orm import Session
-from app.database import SessionLocal, engine
 from app import models, schemas, crud
+from app.sharding import PRIMARY_SHARD, migrate_shards, shard_router
 from datetime import date, time, datetime
 
 def seed_database():
     """Seed the database with sample data"""
     
-    # Create tables
-    models.Base.metadata.create_all(bind=engine)
+    # Create tables on the primary and every city shard
+    migrate_shards()
     
-    db = SessionLocal()
+    # One session per shard; movies and users live on the primary
+    sessions = {shard: shard_router.session(shard) for shard in shard_router.shards}
+    db = sessions[PRIMARY_SHARD]
     
     try:
         # Create sample movies
@@ -78,7 +80,7 @@ def seed_database():
         
         created_theatres = []
         for theatre_data in theatres_data:
-            theatre = crud.create_theatre(db, schemas.TheatreCreate(**theatre_data))
+            theatre = crud.create_theatre(sessions[shard_router.for_city(theatre_data["city"])], schemas.TheatreCreate(**theatre_data))
             created_theatres.append(theatre)
             print(f"Created theatre: {theatre.name}")
         
@@ -115,7 +117,9 @@ def seed_database():
         ]
         
         for show_data in shows_data:
-            show = crud.create_show(db, schemas.ShowCreate(**show_data))
+            show_db = sessions[shard_router.for_id(show_data["theatre_id"])]
+            shard_router.copy_reference(show_db, models.Movie, show_data["movie_id"])
+            show = crud.create_show(show_db, schemas.ShowCreate(**show_data))
             print(f"Created show: {show.movie.title} at {show.theatre.name}")
         
         # Create a sample user
@@ -133,9 +137,11 @@ def seed_database():
         
     except Exception as e:
         print(f"Error seeding database: {e}")
-        db.rollback()
+        for session in sessions.values():
+            session.rollback()
     finally:
-        db.close()
+        for session in sessions.values():
+            session.close()
 
 if __name__ == "__main__":
     seed_database()
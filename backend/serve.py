@@ -0,0 +1,203 @@
+"""
+Production server: a master process pre-forks uvicorn workers that share one port.
+
+    python serve.py                          # one worker per core on 0.0.0.0:8000
+    python serve.py --workers 8 --port 8080 --migrate
+
+Each worker binds its own SO_REUSEPORT socket, so the kernel spreads connections across
+workers. A worker only calls listen() after its lifespan startup (schema check, pool and
+cache warm-up) has finished, so no connection waits on a cold worker. Where SO_REUSEPORT is
+unavailable, the master binds one socket and the workers inherit it.
+
+SIGTERM/SIGINT drain gracefully: workers stop accepting, finish in-flight requests for up
+to --graceful-timeout seconds and run their shutdown hooks. The master then kills any
+worker still running. Workers exit after --max-requests requests (plus jitter, so they do
+not all recycle together) and the master starts a replacement. uvloop and httptools are
+used when installed. For development with auto-reload, use run.py.
+
+Background jobs (booking reaper, payment callback workers, archiver, seat counter reconciler)
+run only in worker slot 0. Flash-sale mode and waiting rooms keep their state in one process's
+memory, so they can only be turned on with --workers 1.
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger("serve")
+
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "8000"))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1)))
+WEB_BACKLOG = int(os.getenv("WEB_BACKLOG", "2048"))
+KEEPALIVE_TIMEOUT = int(os.getenv("KEEPALIVE_TIMEOUT", "5"))  # seconds an idle keep-alive connection is kept
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "1000"))  # open connections per worker before 503s
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", "10000"))  # 0 disables recycling
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "1000"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+RESPAWN_BACKOFF_SECONDS = 1.0  # delay before replacing a worker that died right after starting
+MIN_WORKER_UPTIME_SECONDS = 5.0
+
+def bind_socket(host: str, port: int, reuse_port: bool) -> socket.socket:
+    """Bound but not listening; asyncio calls listen() when the worker starts serving"""
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+def event_loop_and_parser():
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    return loop, http
+
+def run_worker(args, shared_socket):
+    import uvicorn
+
+    sock = shared_socket or bind_socket(args.host, args.port, reuse_port=True)
+    loop, http = event_loop_and_parser()
+    max_requests = args.max_requests + random.randint(0, args.max_requests_jitter) if args.max_requests else None
+    config = uvicorn.Config(
+        "app.main:app",
+        loop=loop,
+        http=http,
+        lifespan="on",
+        backlog=args.backlog,
+        timeout_keep_alive=args.keepalive_timeout,
+        limit_concurrency=args.concurrency,
+        limit_max_requests=max_requests,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        access_log=args.access_log,
+        log_config=None,  # app.main routes uvicorn's loggers through the app's log pipeline
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+class Master:
+    def __init__(self, args):
+        self.args = args
+        self.workers = {}  # pid -> (slot, started)
+        self.stopping = False
+        self.stop_deadline = None
+        self.shared_socket = None
+        self.port_guard = None
+
+    def spawn(self, slot: int):
+        pid = os.fork()
+        if pid == 0:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, signal.SIG_DFL)
+            # Read by the app (app.utils.startup) to elect the background-job worker
+            os.environ["WEB_WORKER_SLOT"] = str(slot)
+            os.environ["WEB_WORKER_COUNT"] = str(self.args.workers)
+            code = 0
+            try:
+                run_worker(self.args, self.shared_socket)
+            except BaseException:
+                logger.exception("Worker %s crashed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = (slot, time.monotonic())
+
+    def stop(self, signum, frame):
+        if self.stopping:
+            return
+        logger.info("Received %s, draining %d workers", signal.Signals(signum).name, len(self.workers))
+        self.stopping = True
+        self.stop_deadline = time.monotonic() + self.args.graceful_timeout + 5
+        for pid in self.workers:
+            self.signal_worker(pid, signal.SIGTERM)
+
+    def signal_worker(self, pid: int, sig: int):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def run(self):
+        args = self.args
+        reuse_port = hasattr(socket, "SO_REUSEPORT") and not args.no_reuse_port
+        if reuse_port:
+            # Held (never listening) for the master's lifetime: fails fast if the port is taken
+            self.port_guard = bind_socket(args.host, args.port, reuse_port=True)
+        else:
+            self.shared_socket = bind_socket(args.host, args.port, reuse_port=False)
+
+        loop, http = event_loop_and_parser()
+        logger.info("Starting %d workers on %s:%d (%s, loop=%s, http=%s)", args.workers, args.host, args.port,
+                    "SO_REUSEPORT" if reuse_port else "shared socket", loop, http)
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for slot in range(args.workers):
+            self.spawn(slot)
+
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if self.stopping and time.monotonic() > self.stop_deadline:
+                    logger.warning("Killing %d workers still running after the graceful timeout", len(self.workers))
+                    for worker in self.workers:
+                        self.signal_worker(worker, signal.SIGKILL)
+                    self.stop_deadline = float("inf")
+                time.sleep(0.1)
+                continue
+            slot, started = self.workers.pop(pid)
+            if self.stopping:
+                continue
+            uptime = time.monotonic() - started
+            code = os.waitstatus_to_exitcode(status)
+            if code == 0:
+                logger.info("Worker %d exited after %.0f s (request limit reached), replacing it", pid, uptime)
+            else:
+                logger.warning("Worker %d exited with status %d after %.1f s, replacing it", pid, code, uptime)
+                if uptime < MIN_WORKER_UPTIME_SECONDS:
+                    time.sleep(RESPAWN_BACKOFF_SECONDS)
+            self.spawn(slot)
+        logger.info("All workers stopped")
+
+def migrate_database():
+    """Apply pending migrations to the primary and every shard once, before any worker starts"""
+    from app.sharding import migrate_shards, shard_router
+    for shard, applied in migrate_shards().items():
+        for item in applied:
+            logger.info("Applied migration %s on shard %s: %s", item.version, shard, item.description)
+    # Workers are forked from this process; do not let them inherit open connections
+    for engine in shard_router.engines.values():
+        engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=WEB_HOST)
+    parser.add_argument("--port", type=int, default=WEB_PORT)
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS, help="worker processes (default: core count)")
+    parser.add_argument("--backlog", type=int, default=WEB_BACKLOG, help="listen backlog per socket")
+    parser.add_argument("--keepalive-timeout", type=int, default=KEEPALIVE_TIMEOUT)
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="connections per worker before 503")
+    parser.add_argument("--max-requests", type=int, default=WORKER_MAX_REQUESTS, help="recycle a worker after N requests")
+    parser.add_argument("--max-requests-jitter", type=int, default=WORKER_MAX_REQUESTS_JITTER)
+    parser.add_argument("--graceful-timeout", type=int, default=GRACEFUL_TIMEOUT, help="seconds to drain on SIGTERM")
+    parser.add_argument("--access-log", action="store_true", help="log every request (see LOG_SAMPLE_RATES)")
+    parser.add_argument("--no-reuse-port", action="store_true", help="share one socket instead of SO_REUSEPORT")
+    parser.add_argument("--migrate", action="store_true", help="apply pending migrations before starting workers")
+    parser.add_argument("--no-warmup", action="store_true", help="skip per-worker pool and cache warm-up")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.no_warmup:
+        os.environ["WARMUP_ON_STARTUP"] = "false"
+    if args.migrate:
+        migrate_database()
+    Master(args).run()
+
+if __name__ == "__main__":
+    main()
@@ -6,23 +6,23 @@ Run this after setting up your .env file to initialize the database
 
 import os
 import sys
-from app.database import engine, Base
 from app.models import *  # Import all models
 import app.crud as crud
 from app.schemas import MovieCreate, TheatreCreate, ShowCreate
-from sqlalchemy.orm import sessionmaker
+from app.sharding import PRIMARY_SHARD, migrate_shards, shard_router
 from datetime import date, time
 
 def create_tables():
     """Create all database tables"""
     print("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
+    migrate_shards()
     print("✅ Database tables created successfully!")
 
 def seed_sample_data():
     """Add sample movies, theatres, and shows"""
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
+    # One session per city shard; movies live on the primary
+    sessions = {shard: shard_router.session(shard) for shard in shard_router.shards}
+    db = sessions[PRIMARY_SHARD]
     
     try:
         print("Adding sample data...")
@@ -80,7 +80,7 @@ def seed_sample_data():
         
         created_theatres = []
         for theatre_data in theatres:
-            theatre = crud.create_theatre(db, theatre_data)
+            theatre = crud.create_theatre(sessions[shard_router.for_city(theatre_data.city)], theatre_data)
             created_theatres.append(theatre)
             print(f"  ✅ Added theatre: {theatre.name} in {theatre.city}")
         
@@ -105,16 +105,20 @@ def seed_sample_data():
         ]
         
         for show_data in shows:
-            show = crud.create_show(db, show_data)
+            show_db = sessions[shard_router.for_id(show_data.theatre_id)]
+            shard_router.copy_reference(show_db, Movie, show_data.movie_id)
+            show = crud.create_show(show_db, show_data)
             print(f"  ✅ Added show: {show.movie.title} at {show.theatre.name}")
         
         print("✅ Sample data added successfully!")
         
     except Exception as e:
         print(f"❌ Error adding sample data: {e}")
-        db.rollback()
+        for session in sessions.values():
+            session.rollback()
     finally:
-        db.close()
+        for session in sessions.values():
+            session.close()
 
 def main():
     print("🎬 Movie Booking API Setup")